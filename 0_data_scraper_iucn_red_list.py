@@ -8,42 +8,43 @@ Email: yequanliang@iiasa.ac.at
 """
 
 import requests
-from concurrent.futures import ThreadPoolExecutor
-
-import datetime
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import argparse
+import bisect
+import contextlib
+import gzip
+import hashlib
+import io
+import json
 import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
 from pathlib import Path
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
 import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup
+import pyarrow as pa
+import pyarrow.parquet as pq
+import zstandard
 import time
 import ast
 
 # Read the variable
 data_home = Path("./data")
 current_version = "v.6.2025"
-
-timestamp = datetime.datetime.now()
-file_timestamp = timestamp.ctime()
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,  # Set the logging level
-    format="%(asctime)s - %(levelname)s - %(message)s",  # Specify the log message format
-    datefmt="%Y-%m-%d %H:%M:%S",  # Specify the date format
-    handlers=[
-        logging.StreamHandler(),  # Log to console
-        logging.FileHandler("app.log"),  # Log to a file
-    ],
-)
-
-logging.info("Configure project")
 current_project = "bio_threat"
 
-logging.info("Configure paths")
 path_data_raw = data_home / "raw_data" / current_project / current_version
-if not path_data_raw.exists():
-    path_data_raw.mkdir(parents=True, exist_ok=True)
+path_data_output = path_data_raw / "red_list_assessment_details"
+path_data_assessments = path_data_raw / "red_list_assessments.parquet"
+path_data_archive = path_data_raw / "raw_responses"
+path_data_changesets = path_data_raw / "changesets"
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0",
@@ -52,6 +53,478 @@ HEADERS = {
     "Referer": f"https://www.iucnredlist.org",
 }
 
+# The site serving both the search backend and the species API, which can be
+# set to a local stand-in such as benchmarks/mock_iucn_server.py
+IUCN_URL = os.environ.get("IUCN_URL", "https://www.iucnredlist.org")
+
+# The request budget of each host, shared by all workers of the crawl
+REQUESTS_PER_SECOND = 2.0
+
+
+class TokenBucket:
+    """A thread-safe token bucket limiting the request rate to one host.
+
+    Parameters
+    ----------
+    rate: float
+        The number of tokens (requests) refilled per second
+    capacity: float
+        The maximum number of tokens, i.e. the allowed burst size
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.target_rate = rate
+        self.capacity = capacity if capacity else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                self._refill()
+                pause = self._paused_until - time.monotonic()
+                if pause <= 0 and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(pause, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def throttle(self, retry_after: float = None):
+        """Halve the rate after the host asked to slow down.
+
+        Parameters
+        ----------
+        retry_after: float
+            The seconds all requests to the host should pause
+        """
+        with self._lock:
+            self._refill()
+            self.rate = max(self.rate / 2, self.target_rate / 64)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + retry_after
+                )
+
+    def recover(self):
+        """Step the rate back towards the target rate after a success."""
+        if self.rate < self.target_rate:
+            with self._lock:
+                self.rate = min(self.target_rate, self.rate + self.target_rate / 100)
+
+
+_host_buckets = {}
+_host_buckets_lock = threading.Lock()
+
+
+def get_host_bucket(url: str):
+    """Get the token bucket shared by all requests to the host of the url.
+
+    Parameters
+    ----------
+    url: str
+        The url to be requested
+
+    Returns
+    -------
+    bucket: TokenBucket
+    """
+    host = urlparse(url).netloc
+    with _host_buckets_lock:
+        if host not in _host_buckets:
+            _host_buckets[host] = TokenBucket(REQUESTS_PER_SECOND)
+        return _host_buckets[host]
+
+
+def set_rate_limit(requests_per_second: float):
+    """Set the requests-per-second budget of every host.
+
+    Parameters
+    ----------
+    requests_per_second: float
+        The number of requests allowed per second and host
+    """
+    global REQUESTS_PER_SECOND
+    REQUESTS_PER_SECOND = requests_per_second
+    with _host_buckets_lock:
+        for bucket in _host_buckets.values():
+            with bucket._lock:
+                bucket._refill()
+                bucket.rate = requests_per_second
+                bucket.target_rate = requests_per_second
+                bucket.capacity = max(requests_per_second, 1.0)
+
+
+# The upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Metrics:
+    """Counters, stage timers and request latency histograms of a run.
+
+    The hot paths only update the counters under a lock, and the summary
+    (with the throughput of species and requests) is logged and written as
+    a JSON file every `interval` seconds by `start_reporter`, instead of
+    logging lines per species and request.
+
+    Parameters
+    ----------
+    latency_buckets: tuple
+        The upper bounds in seconds of the latency histogram buckets
+    """
+
+    def __init__(self, latency_buckets: tuple = LATENCY_BUCKETS):
+        self.latency_buckets = latency_buckets
+        self.counters = {}
+        self.stages = {}
+        self.latency = {}
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reporter = None
+
+    def count(self, name: str, value: int = 1):
+        """Add the value to the counter of the name."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, endpoint: str, seconds: float):
+        """Add a request duration to the latency histogram of the endpoint."""
+        bucket = bisect.bisect_left(self.latency_buckets, seconds)
+        with self._lock:
+            histogram = self.latency.setdefault(
+                endpoint,
+                {
+                    "count": 0,
+                    "sum": 0.0,
+                    "buckets": [0] * (len(self.latency_buckets) + 1),
+                },
+            )
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            histogram["buckets"][bucket] += 1
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Time a stage of the run, e.g. `with metrics.stage("crawl"):`."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + (
+                    time.monotonic() - start
+                )
+
+    def _quantile(self, histogram: dict, q: float):
+        """Get the upper bound of the bucket holding the q quantile."""
+        rank = q * histogram["count"]
+        cumulative = 0
+        upper_bounds = self.latency_buckets + (float("inf"),)
+        for upper, n in zip(upper_bounds, histogram["buckets"]):
+            cumulative += n
+            if cumulative >= rank:
+                return upper
+        return float("inf")
+
+    def summary(self):
+        """Get the counters, stage times, latencies and throughput as a dict."""
+        with self._lock:
+            elapsed = time.monotonic() - self.started
+            counters = dict(self.counters)
+            latency = {
+                endpoint: {
+                    "count": histogram["count"],
+                    "mean_s": histogram["sum"] / histogram["count"],
+                    "p50_s": self._quantile(histogram, 0.5),
+                    "p95_s": self._quantile(histogram, 0.95),
+                    "buckets": dict(
+                        zip(
+                            [f"le_{upper:g}" for upper in self.latency_buckets]
+                            + ["le_inf"],
+                            histogram["buckets"],
+                        )
+                    ),
+                }
+                for endpoint, histogram in self.latency.items()
+            }
+            stages = dict(self.stages)
+        requests_ = counters.get("requests", 0)
+        cache_lookups = counters.get("cache_hits", 0) + counters.get("cache_misses", 0)
+        return {
+            "elapsed_s": elapsed,
+            "counters": counters,
+            "stages_s": stages,
+            "latency": latency,
+            "species_per_s": counters.get("species_done", 0) / elapsed,
+            "requests_per_s": requests_ / elapsed,
+            "cache_hit_rate": (
+                counters.get("cache_hits", 0) / cache_lookups if cache_lookups else None
+            ),
+        }
+
+    def report(self, path: Path = None):
+        """Log a one-line summary, and write the full summary to the path."""
+        summary = self.summary()
+        counters = summary["counters"]
+        logging.info(
+            f"{counters.get('species_done', 0)} species done "
+            f"({summary['species_per_s']:.2f}/s), "
+            f"{counters.get('species_failed', 0)} failed, "
+            f"{counters.get('requests', 0)} requests "
+            f"({summary['requests_per_s']:.2f}/s), "
+            f"{counters.get('retries', 0)} retries, "
+            f"{counters.get('throttled', 0)} throttled, "
+            f"{counters.get('cache_hits', 0)} cache hits"
+        )
+        if path is not None:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+            os.replace(tmp_path, path)
+        return summary
+
+    def start_reporter(self, interval: float = 60, path: Path = None):
+        """Report the summary every `interval` seconds in a background thread."""
+
+        def run():
+            while not self._stop.wait(interval):
+                self.report(path)
+
+        self._stop.clear()
+        self._reporter = threading.Thread(target=run, daemon=True)
+        self._reporter.start()
+
+    def stop_reporter(self, path: Path = None):
+        """Stop the background reporter and report the final summary."""
+        self._stop.set()
+        if self._reporter is not None:
+            self._reporter.join()
+            self._reporter = None
+        return self.report(path)
+
+
+def get_metrics_path(stage: str):
+    """Get the metrics file of a stage, so a run keeps the metrics of the others."""
+    return path_data_raw / f"crawl_metrics_{stage}.json"
+
+
+metrics = Metrics()
+
+# The share of species and assessments logged one by one, 0 logs none
+ITEM_LOG_RATE = 0.0
+
+
+def log_item(message: str):
+    """Log a per-species or per-assessment message for a sample of the items."""
+    if ITEM_LOG_RATE and random.random() < ITEM_LOG_RATE:
+        logging.info(message)
+
+
+def get_endpoint_name(url: str):
+    """Get the name of the endpoint of a url, e.g. species or _msearch."""
+    path = urlparse(url).path
+    if path.startswith("/api/v4/species/"):
+        return "species"
+    return path.rstrip("/").rsplit("/", 1)[-1]
+
+
+# Retries of failed requests, on top of the waits asked by the host (429)
+MAX_RETRIES = 5
+MAX_THROTTLED = 50
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+POOL_SIZE = 4
+
+_thread_local = threading.local()
+
+
+def get_session():
+    """Get the keep-alive HTTP session of the current worker thread."""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _thread_local.session = session
+    return session
+
+
+def parse_retry_after(retry_after: str):
+    """Get the seconds to wait from a Retry-After header, None if missing."""
+    if not retry_after:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_date = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_date.timestamp() - time.time(), 0.0)
+
+
+def fetch(method: str, url: str, timeout: float = 10, **kwargs):
+    """Send a request through the pooled session of the worker.
+
+    The request waits for its host's token bucket. Connection errors and
+    5xx responses are retried up to MAX_RETRIES times with jittered
+    exponential backoff. A 429, or a 503 with Retry-After, slows down the
+    whole host and is retried without using the retry budget.
+
+    Parameters
+    ----------
+    method: str
+        The HTTP method
+    url: str
+        The url to request
+    timeout: float
+        The seconds to wait for the response
+    **kwargs:
+        Passed to `requests.Session.request`
+
+    Returns
+    -------
+    response: requests.Response or None
+        The last response, None if the host could not be reached
+    """
+    bucket = get_host_bucket(url)
+    session = get_session()
+    endpoint = get_endpoint_name(url)
+    attempts = 0
+    throttled = 0
+    while True:
+        bucket.acquire()
+        metrics.count("requests")
+        start = time.monotonic()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except requests.RequestException as error:
+            response, reason = None, repr(error)
+        else:
+            metrics.observe(endpoint, time.monotonic() - start)
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if response.status_code == 429 or (
+                response.status_code == 503 and retry_after is not None
+            ):
+                throttled += 1
+                metrics.count("throttled")
+                if throttled > MAX_THROTTLED:
+                    metrics.count("request_failures")
+                    logging.error(f"Still throttled after {throttled} tries: {url}")
+                    return response
+                if throttled == 1:
+                    logging.warning(f"Throttled by {urlparse(url).netloc}, slow down")
+                bucket.throttle(
+                    retry_after if retry_after is not None else BACKOFF_BASE
+                )
+                continue
+            if response.status_code < 500:
+                bucket.recover()
+                return response
+            reason = f"HTTP {response.status_code}"
+
+        attempts += 1
+        if attempts > MAX_RETRIES:
+            metrics.count("request_failures")
+            logging.error(f"Failed {method} {url} after {attempts} attempts: {reason}")
+            return response
+        metrics.count("retries")
+        time.sleep(
+            random.uniform(0.5, 1.5) * min(BACKOFF_MAX, BACKOFF_BASE * 2**attempts)
+        )
+
+
+def describe_failure(response):
+    """Get a short reason of a failed request for the logs."""
+    if response is None:
+        return "no response"
+    return f"HTTP {response.status_code}: {response.text[:200]}"
+
+
+def get_species_query(species_name: str):
+    """Get the search query matching the scientific or common name of species.
+
+    Parameters
+    ----------
+    species_name: str
+       The name of species
+
+    Returns
+    -------
+    query: dict
+    """
+    return {
+        "bool": {
+            "must": [
+                {
+                    "multi_match": {
+                        "query": species_name,
+                        "type": "phrase_prefix",
+                        "fields": ["scientificName^10", "commonName"],
+                        "lenient": True,
+                    }
+                }
+            ],
+            "filter": {
+                "bool": {
+                    "filter": [
+                        {"terms": {"scopes.code": ["1"]}},
+                        {"terms": {"taxonLevel": ["Species"]}},
+                    ]
+                }
+            },
+        }
+    }
+
+
+def select_species_hit(page_info: list, species_name: str):
+    """Get the ids of the species from the search hits.
+
+    When several species are found, the hit with exactly the same
+    scientific name is kept.
+
+    Parameters
+    ----------
+    page_info: list
+        The search hits
+    species_name: str
+       The name of species
+
+    Returns
+    -------
+    species_id: str
+    species_sis_id: str
+    """
+    if not page_info:
+        return None, None
+
+    if len(page_info) > 1:
+        for page_info_ in list(page_info):
+            species_name_sci = page_info_.get("fields", {}).get("scientificName", [])
+            if species_name_sci and species_name_sci[0] == species_name:
+                page_info = [page_info_]
+
+    species_id = page_info[0]["_id"]
+    species_sis_id = page_info[0]["fields"]["sisTaxonId"][0]
+    return species_id, species_sis_id
+
 
 def get_species_id(species_name: str):
     """Get the id information used in the API of the species.
@@ -64,71 +537,362 @@ def get_species_id(species_name: str):
     Returns
     -------
     species_id: str
+        None if the search has no hit
     species_sis_id: str
+
+    Raises
+    ------
+    RuntimeError
+        If the search failed, so the species can be retried later
     """
-    logging.info("Set the search url")
-    search_url = (
-        "https://www.iucnredlist.org/dosearch/assessments/_search?size=1&_source=false"
-    )
+    search_url = f"{IUCN_URL}/dosearch/assessments/_search?size=1&_source=false"
     payload = {
         "stored_fields": ["sisTaxonId"],
-        "query": {
-            "bool": {
-                "must": [
-                    {
-                        "multi_match": {
-                            "query": species_name,
-                            "type": "phrase_prefix",
-                            "fields": ["scientificName^10", "commonName"],
-                            "lenient": True,
-                        }
-                    }
-                ],
-                "filter": {
-                    "bool": {
-                        "filter": [
-                            {"terms": {"scopes.code": ["1"]}},
-                            {"terms": {"taxonLevel": ["Species"]}},
-                        ]
-                    }
-                },
-            }
-        },
+        "query": get_species_query(species_name),
     }
 
-    logging.info("Call the species page")
-    time.sleep(1)
-    species_page_req = requests.post(
-        search_url, headers=HEADERS, json=payload, timeout=10
-    )
+    species_page_req = fetch("POST", search_url, json=payload)
 
-    if species_page_req.status_code == 200:
+    if species_page_req is None or species_page_req.status_code != 200:
+        raise RuntimeError(
+            f"search failed, due to {describe_failure(species_page_req)}"
+        )
+    try:
         page_info = species_page_req.json()["hits"]["hits"]
-    else:
-        logging.raiseExceptions(
-            f"No page for {species_name}, due to {species_page_req.text}"
+    except (ValueError, KeyError, TypeError) as error:
+        raise RuntimeError(f"unreadable search response: {error!r}") from None
+
+    species_id, species_sis_id = select_species_hit(page_info, species_name)
+    if species_id is None:
+        log_item(f"No information for {species_name}")
+    return species_id, species_sis_id
+
+
+def load_species_id_table(table_path: Path):
+    """Load the persisted name -> (species id, sis id) table.
+
+    Parameters
+    ----------
+    table_path: Path
+        The csv file of the table
+
+    Returns
+    -------
+    species_id_table: dict
+        Names not found by the search are kept with (None, None), and the
+        last row of a name appended more than once is kept
+    """
+    if not table_path.exists():
+        return {}
+    table = pd.read_csv(table_path, dtype=str, keep_default_na=False)
+    return {
+        row.scientific_name: (row.species_id or None, row.species_sis_id or None)
+        for row in table.itertuples(index=False)
+    }
+
+
+def get_species_id_frame(species_id_table: dict):
+    """Get the name -> (species id, sis id) table as a data frame of strings.
+
+    The ids are kept as strings, so the sis ids of a table with names not
+    found are not turned into floats.
+    """
+    return pd.DataFrame(
+        [
+            (species_name, *(None if value is None else str(value) for value in ids))
+            for species_name, ids in species_id_table.items()
+        ],
+        columns=["scientific_name", "species_id", "species_sis_id"],
+        dtype=object,
+    )
+
+
+def save_species_id_table(species_id_table: dict, table_path: Path):
+    """Save the name -> (species id, sis id) table as csv."""
+    table = get_species_id_frame(species_id_table)
+    table_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = table_path.with_suffix(".tmp")
+    table.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, table_path)
+
+
+def append_species_id_table(species_id_table: dict, table_path: Path):
+    """Append the rows of name -> (species id, sis id) to the csv table."""
+    table = get_species_id_frame(species_id_table)
+    table_path.parent.mkdir(parents=True, exist_ok=True)
+    table.to_csv(table_path, mode="a", header=not table_path.exists(), index=False)
+
+
+def resolve_species_ids(
+    species_names: list,
+    table_path: Path = None,
+    batch_size: int = 200,
+    hits_per_name: int = 10,
+):
+    """Resolve the ids of many species with one multi-search request per batch.
+
+    Names already in the persisted table are not searched again, and the
+    rows of every batch are appended to the table, so an interrupted
+    resolution resumes where it stopped. Names whose batch failed are left
+    out of the table.
+
+    Parameters
+    ----------
+    species_names: list
+        The names of species
+    table_path: Path
+        The csv file of the persisted table
+    batch_size: int
+        The number of names searched per request
+    hits_per_name: int
+        The number of hits kept per name for the scientific name matching
+
+    Returns
+    -------
+    species_id_table: dict
+        name -> (species_id, species_sis_id)
+    """
+    table_path = table_path if table_path else path_data_raw / "species_id_table.csv"
+    species_id_table = load_species_id_table(table_path)
+    names_todo = list(
+        dict.fromkeys(name for name in species_names if name not in species_id_table)
+    )
+    logging.info(
+        f"{len(species_id_table)} species ids loaded, {len(names_todo)} to resolve"
+    )
+
+    search_url = f"{IUCN_URL}/dosearch/assessments/_msearch"
+    headers = {"Content-Type": "application/x-ndjson"}
+    for batch_start in range(0, len(names_todo), batch_size):
+        batch_names = names_todo[batch_start : batch_start + batch_size]
+        lines = []
+        for species_name in batch_names:
+            lines.append(json.dumps({}))
+            lines.append(
+                json.dumps(
+                    {
+                        "size": hits_per_name,
+                        "_source": False,
+                        "stored_fields": ["sisTaxonId", "scientificName"],
+                        "query": get_species_query(species_name),
+                    }
+                )
+            )
+
+        batch_req = fetch(
+            "POST",
+            search_url,
+            headers=headers,
+            data="\n".join(lines) + "\n",
+            timeout=60,
         )
-        return None, None
+        if batch_req is None or batch_req.status_code != 200:
+            logging.error(
+                f"Failed to resolve a batch of {len(batch_names)} species, "
+                f"due to {describe_failure(batch_req)}"
+            )
+            continue
+        try:
+            responses = batch_req.json()["responses"]
+        except (ValueError, KeyError, TypeError) as error:
+            logging.error(
+                f"Failed to resolve a batch of {len(batch_names)} species, "
+                f"due to an unreadable response: {error!r}"
+            )
+            continue
+
+        batch_table = {}
+        for species_name, response in zip(batch_names, responses):
+            if "error" in response:
+                logging.error(f"Failed to resolve {species_name}: {response['error']}")
+                continue
+            batch_table[species_name] = select_species_hit(
+                response["hits"]["hits"], species_name
+            )
 
-    if page_info:
-        logging.info("Omit species with different scientific name(s)")
-        if len(page_info) > 1:
-            for page_info_ in page_info:
-                species_name_sci = page_info_["fields"]["scientificName"][0]
-                if species_name_sci == species_name:
-                    page_info = [page_info_]
-                    del page_info_
-                else:
+        append_species_id_table(batch_table, table_path)
+        species_id_table.update(batch_table)
+
+    return species_id_table
+
+
+def store_manifest_species_ids(manifest, table_path: Path = None):
+    """Append the ids in the manifest but not in the persisted table.
+
+    They are the ids of the species whose batch failed, resolved one by one
+    during the crawl, so a refresh compares them with the new release
+    instead of taking the species as updated.
+
+    Parameters
+    ----------
+    manifest: CrawlManifest
+        The manifest recording the crawl state
+    table_path: Path
+        The csv file of the persisted table
+    """
+    table_path = table_path if table_path else path_data_raw / "species_id_table.csv"
+    species_id_table = load_species_id_table(table_path)
+    missing_ids = {
+        species_name: species_ids
+        for species_name, species_ids in manifest.species_ids().items()
+        if species_name not in species_id_table
+    }
+    if missing_ids:
+        logging.info(f"Store {len(missing_ids)} species ids resolved one by one")
+        append_species_id_table(missing_ids, table_path)
+
+
+class ResponseCache:
+    """A persistent, content-addressed cache of API responses.
+
+    Each response is stored as a gzipped JSON file named by the sha256 hash
+    of its key (e.g. "species/12345"). Published assessments never change,
+    so entries are only removed by eviction: files not used for `max_age`
+    seconds, and the least recently used files once the cache grows over
+    `max_bytes`. The size of the cache is counted by one scan of the folder,
+    at the first eviction, then kept up to date by every write, so the
+    folder is only scanned again once the size limit is reached.
+
+    Parameters
+    ----------
+    path: Path
+        The folder of the cache
+    max_bytes: int
+        The size limit of the cache, default is 5 GB
+    max_age: float
+        The seconds an unused entry is kept, default is forever
+    low_water: float
+        The fraction of `max_bytes` the eviction shrinks the cache to, so a
+        full cache is not scanned again at the next write
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = 5 * 1024**3,
+        max_age: float = None,
+        low_water: float = 0.9,
+    ):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.low_water = low_water
+        self._size = None
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+
+    def _file(self, key: str):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.path / digest[:2] / f"{digest}.json.gz"
+
+    def get(self, key: str):
+        """Get the cached response of the key, None if it is not cached."""
+        cache_file = self._file(key)
+        try:
+            with gzip.open(cache_file, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(cache_file)  # mark the entry as recently used
+        except (OSError, ValueError):
+            return None
+        return data
+
+    def put(self, key: str, data):
+        """Store the response of the key."""
+        if self._size is None:
+            self.evict()
+        cache_file = self._file(key)
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=cache_file.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f, gzip.open(f, "wt", encoding="utf-8") as gz:
+            json.dump(data, gz)
+        added_bytes = os.path.getsize(tmp_name)
+        try:
+            added_bytes -= cache_file.stat().st_size
+        except OSError:
+            pass
+        os.replace(tmp_name, cache_file)
+
+        with self._lock:
+            # the size is still unknown while the first scan runs in another thread
+            if self._size is not None:
+                self._size += added_bytes
+            run_eviction = self._size is not None and self._size > self.max_bytes
+        if run_eviction:
+            self.evict()
+
+    def evict(self):
+        """Remove expired entries, then the least recently used ones over size.
+
+        Once the cache is over `max_bytes`, entries are removed until it is
+        under `low_water` of it. An eviction already running in another
+        thread is not started again.
+        """
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            entries = []
+            for cache_file in self.path.glob("*/*.json.gz"):
+                try:
+                    stat = cache_file.stat()
+                except OSError:
                     continue
+                entries.append((stat.st_mtime, stat.st_size, cache_file))
+
+            now = time.time()
+            entries.sort()
+            total_bytes = sum(size for _, size, _ in entries)
+            target_bytes = (
+                self.max_bytes * self.low_water
+                if total_bytes > self.max_bytes
+                else self.max_bytes
+            )
+            for mtime, size, cache_file in entries:
+                expired = self.max_age is not None and now - mtime > self.max_age
+                if not expired and total_bytes <= target_bytes:
+                    break
+                cache_file.unlink(missing_ok=True)
+                total_bytes -= size
+            with self._lock:
+                self._size = total_bytes
+        finally:
+            self._evict_lock.release()
 
-        logging.info("Get basic information of species")
-        species_id = page_info[0]["_id"]
-        species_sis_id = page_info[0]["fields"]["sisTaxonId"][0]
 
-        return species_id, species_sis_id
-    else:
-        logging.info(f"No information for {species_name}")
-        return None, None
+response_cache = ResponseCache(path_data_raw / "response_cache")
+
+
+def get_species_info(species_id: int):
+    """Get the API response of an assessment, from the cache when possible.
+
+    Parameters
+    ----------
+    species_id: int
+        The id of the assessment
+
+    Returns
+    -------
+    species_info: dict or None
+    """
+    cache_key = f"species/{species_id}"
+    species_info = response_cache.get(cache_key)
+    if species_info is not None:
+        metrics.count("cache_hits")
+        return species_info
+    metrics.count("cache_misses")
+
+    url = f"{IUCN_URL}/api/v4/species/{species_id}"
+    species_req = fetch("GET", url)
+
+    if species_req is None or species_req.status_code != 200:
+        logging.error(
+            f"No page for species id {species_id}, "
+            f"due to {describe_failure(species_req)}"
+        )
+        return None
+
+    species_info = species_req.json()
+    response_cache.put(cache_key, species_info)
+    return species_info
 
 
 def get_species_endpoint(species_id: int):
@@ -144,28 +908,16 @@ def get_species_endpoint(species_id: int):
     -------
     species_endpoints: dict
     """
-    logging.info("Set API url for the species")
-    url = f"https://www.iucnredlist.org/api/v4/species/{species_id}"
-
-    logging.info("Call the API")
-    # time.sleep(0.5)
-    species_info = requests.get(url, headers=HEADERS, timeout=10)
-
-    if species_info.status_code == 200:
-        species_info = species_info.json()
-    else:
-        logging.raiseExceptions(
-            f"No page for {species_name}, due to {species_info.text}"
-        )
+    species_info = get_species_info(species_id)
+    if species_info is None:
         return {}
 
     species_endpoint_info = {}
-    logging.info("Get the latest assessment information")
+    # The latest assessment, then the previous ones
     assess_date = species_info["citation"]["footer"][:4]
     species_endpoint_info[assess_date] = species_id
     del assess_date
 
-    logging.info("Get the previous assessment information")
     if species_info["previousAssessments"]:
         for previous_info in species_info["previousAssessments"]:
             previous_species_id = previous_info["id"]
@@ -173,38 +925,25 @@ def get_species_endpoint(species_id: int):
             species_endpoint_info[previous_assess_date] = previous_species_id
             del previous_species_id, previous_assess_date
 
-    logging.info("Get all endpoints")
     return species_endpoint_info
 
 
-def get_species_assessment(species_id: int):
-    """Get detailed assessment information of the species
+def parse_species_assessment(species_id: int, species_info: dict):
+    """Get the fields of one assessment from its API response.
 
     Parameters
     ----------
     species_id: int
-        The id of species
+        The id of the assessment
+    species_info: dict
+        The API response of the assessment
 
     Returns
     -------
-    species_threats_details: dict
+    species_type: str
+    species_assessment: dict
+        One row of the assessment dataset, without the species columns
     """
-    logging.info("Set API url for the species")
-    url = f"https://www.iucnredlist.org/api/v4/species/{species_id}"
-
-    logging.info("Call the API")
-    time.sleep(1)
-    species_info = requests.get(url, headers=HEADERS, timeout=10)
-
-    if species_info.status_code == 200:
-        species_info = species_info.json()
-    else:
-        logging.raiseExceptions(
-            f"No page for {species_name}, due to {species_info.text}"
-        )
-        return {}
-
-    logging.info("Get the latest assessment information")
     species_type = (
         species_info["taxon"]["taxonomy"]["className"]
         if species_info["taxon"]["taxonomy"]["kingdomName"] != "Plantae"
@@ -217,7 +956,7 @@ def get_species_assessment(species_id: int):
     if species_info["systems"]:
         habitat_1 = species_info["systems"][0]["description"]["en"]
     else:
-        habitat_1 = []
+        habitat_1 = None
     if species_info["habitats"]:
         habitat_2 = [
             habitat_info["description"]["en"]
@@ -231,15 +970,67 @@ def get_species_assessment(species_id: int):
     else:
         threat_detail = []
 
-    logging.info(f"Got all threats information for species with id {species_id}")
+    log_item(f"Got all threats information for species with id {species_id}")
+    species_assessment = {
+        "year": int(assess_date),
+        "species_id": int(species_id),
+        "red_list_category": threat_category,
+        "red_list_category_code": threat_category_code,
+        "population_trend": population_trend,
+        "habitat1": habitat_1,
+        "habitat2": habitat_2,
+        "threats": threat_detail,
+    }
+
+    return species_type, species_assessment
+
+
+def get_species_record(species_id: int):
+    """Get one assessment as a row of the assessment dataset.
+
+    Parameters
+    ----------
+    species_id: int
+        The id of species
+
+    Returns
+    -------
+    species_type: str
+    species_assessment: dict
+    """
+    species_info = get_species_info(species_id)
+    if species_info is None:
+        return None, {}
+    return parse_species_assessment(species_id, species_info)
+
+
+def get_species_assessment(species_id: int):
+    """Get detailed assessment information of the species
+
+    Parameters
+    ----------
+    species_id: int
+        The id of species
+
+    Returns
+    -------
+    species_threats_details: dict
+    """
+    species_type, species_assessment = get_species_record(species_id)
+    if not species_assessment:
+        return None, {}
+
+    assess_date = species_assessment["year"]
     species_threats_details = {
         f"{assess_date}_species_id": species_id,
-        f"{assess_date}_red_list_category": threat_category,
-        f"{assess_date}_red_list_category_code": threat_category_code,
-        f"{assess_date}_population_trend": population_trend,
-        f"{assess_date}_habitat1": habitat_1,
-        f"{assess_date}_habitat2": habitat_2,
-        f"{assess_date}_threats": threat_detail,
+        f"{assess_date}_red_list_category": species_assessment["red_list_category"],
+        f"{assess_date}_red_list_category_code": species_assessment[
+            "red_list_category_code"
+        ],
+        f"{assess_date}_population_trend": species_assessment["population_trend"],
+        f"{assess_date}_habitat1": species_assessment["habitat1"] or [],
+        f"{assess_date}_habitat2": species_assessment["habitat2"],
+        f"{assess_date}_threats": species_assessment["threats"],
     }
 
     return species_type, species_threats_details
@@ -258,7 +1049,6 @@ def get_threat_details(threat_info: list):
     species_threats_all
     """
     species_threats_all = []
-    logging.info("Get all threats")
     for threat_level1 in threat_info:
         threat1_name = threat_level1["description"]["en"]
         if threat_level1["children"]:
@@ -278,77 +1068,1071 @@ def get_threat_details(threat_info: list):
             species_threats_all.append(threat1_name)
             del threat1_name
 
-    logging.info("Get all threats")
     return species_threats_all
 
 
-def process_species(species_item: tuple):
-    """
-    To get the id of each species
+class CrawlManifest:
+    """A SQLite manifest recording the crawl state of every species.
 
-    Parameters:
-        species_item: tuple
-            Include the species name
+    The state of a species moves from "pending" to "resolved",
+    "endpoints_fetched", "assessments_fetched" and finally "written", or
+    ends as "not_found" when the search has no hit. A species failing at
+    any step is marked "failed" with the reason, and is retried once its
+    exponential backoff is over.
+
+    Parameters
+    ----------
+    db_path: Path
+        The SQLite file of the manifest
+    backoff_base: float
+        The seconds to wait before the first retry, doubled on every failure
+    backoff_max: float
+        The maximum seconds to wait before a retry
     """
-    logging.info("Configure the name of species")
-    species_name = species_item[1]
 
-    logging.info("Get the species id and sis id for the species")
-    species_id, species_sis_id = get_species_id(species_name=species_name)
-    if species_id:
-        logging.info("Get endpoint of all previous assessment for the species")
-        species_endpoint_all = get_species_endpoint(species_id)
+    FINISHED_STATES = ("written", "not_found")
+
+    def __init__(
+        self, db_path: Path, backoff_base: float = 60, backoff_max: float = 3600
+    ):
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS species (
+                    scientific_name TEXT PRIMARY KEY,
+                    list_index INTEGER,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    species_id TEXT,
+                    species_sis_id TEXT,
+                    n_assessments INTEGER,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    retry_at REAL NOT NULL DEFAULT 0,
+                    updated_at REAL
+                )
+                """
+            )
 
-        logging.info(
-            "Get all the endpoints of species. Starting get species assessment details"
-        )
-        species_assessment_details = {
-            "scientific_name": species_name,
-            "species_sis_id": species_sis_id,
-        }
-        for species_assessment_year in species_endpoint_all.keys():
-            species_id_ = int(species_endpoint_all[species_assessment_year])
+    def add_species(self, name_list: list):
+        """Register the (index, species name) tuples not in the manifest yet."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO species (scientific_name, list_index, updated_at)"
+                " VALUES (?, ?, ?)",
+                [(species_name, i, now) for i, species_name in name_list],
+            )
 
-            logging.info(
-                f"Get all the assessment information of species with id {species_id_}"
+    def set_resolved(self, species_id_table: dict):
+        """Store the resolved ids of the species not finished yet."""
+        now = time.time()
+        rows = [
+            (
+                species_id,
+                species_sis_id,
+                "resolved" if species_id else "not_found",
+                now,
+                species_name,
+            )
+            for species_name, (species_id, species_sis_id) in species_id_table.items()
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE species SET species_id = ?, species_sis_id = ?, state = ?,"
+                " updated_at = ? WHERE scientific_name = ? AND state = 'pending'",
+                rows,
             )
-            species_type, species_assessment = get_species_assessment(species_id_)
-            species_assessment_details["type"] = species_type
-            species_assessment_details = species_assessment_details | species_assessment
-
-        species_assessment_details_ = pd.DataFrame([species_assessment_details])
-        species_assessment_details_.to_csv(
-            path_data_raw
-            / "red_list_assessment_detials_new"
-            / f"species_{species_name.replace(' ','_')}_assessment_detials.csv",
-            index=False,
-        )
 
+    def mark(self, species_name: str, state: str, **fields):
+        """Set the state, and optionally other columns, of the species."""
+        columns = {"state": state, "updated_at": time.time()} | fields
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE species SET {assignments} WHERE scientific_name = ?",
+                [*columns.values(), species_name],
+            )
 
-def omit_duplicate_elements(data: dict, keyword: str):
-    keyword_keys = [key_ for key_ in data.keys() if keyword in key_]
-    data_keyword = list(set(data[key_] for key_ in keyword_keys if data[key_] != "[]"))
-    if len(data_keyword) == 1:
-        unique_element = data_keyword[0]
-    elif len(data_keyword) > 1:
-        unique_element = set()
-        for item in data_keyword:
-            try:
-                parsed = ast.literal_eval(item)
-                if isinstance(parsed, list):
-                    unique_element.update(parsed)
-            except:
-                pass
+    def fail(self, species_name: str, reason: str):
+        """Mark the species as failed and schedule its retry with backoff."""
+        now = time.time()
+        with self._lock, self._conn:
+            (attempts,) = self._conn.execute(
+                "SELECT attempts FROM species WHERE scientific_name = ?",
+                (species_name,),
+            ).fetchone()
+            delay = min(self.backoff_base * 2**attempts, self.backoff_max)
+            self._conn.execute(
+                "UPDATE species SET state = 'failed', attempts = attempts + 1,"
+                " last_error = ?, retry_at = ?, updated_at = ?"
+                " WHERE scientific_name = ?",
+                (reason, now + delay, now, species_name),
+            )
+
+    def unfinished(self, max_attempts: int = 5):
+        """Get the species to crawl now.
+
+        Returns
+        -------
+        name_list: list
+            (index, species name[, species id, sis id]) tuples of species
+            not finished, and of failed species whose backoff is over
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT list_index, scientific_name, species_id, species_sis_id"
+                " FROM species WHERE state NOT IN (?, ?)"
+                " AND (state != 'failed' OR (retry_at <= ? AND attempts < ?))"
+                " ORDER BY list_index",
+                (*self.FINISHED_STATES, time.time(), max_attempts),
+            ).fetchall()
+        return [
+            (i, species_name, species_id, species_sis_id)
+            if species_id
+            else (i, species_name)
+            for i, species_name, species_id, species_sis_id in rows
+        ]
+
+    def species_ids(self):
+        """Get the name -> (species id, sis id) of the species resolved so far.
+
+        Species not found by the search are kept with (None, None).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT scientific_name, species_id, species_sis_id FROM species"
+                " WHERE species_id IS NOT NULL OR state = 'not_found'"
+            ).fetchall()
+        return {
+            species_name: (species_id, species_sis_id)
+            for species_name, species_id, species_sis_id in rows
+        }
+
+    def next_retry_at(self, max_attempts: int = 5):
+        """Get the time of the next retry of a failed species, None if no retry."""
+        with self._lock:
+            (retry_at,) = self._conn.execute(
+                "SELECT MIN(retry_at) FROM species WHERE state = 'failed'"
+                " AND attempts < ?",
+                (max_attempts,),
+            ).fetchone()
+        return retry_at
+
+    def summary(self):
+        """Get the number of species per state."""
+        with self._lock:
+            return dict(
+                self._conn.execute(
+                    "SELECT state, COUNT(*) FROM species GROUP BY state"
+                ).fetchall()
+            )
+
+
+ASSESSMENT_SCHEMA = pa.schema(
+    [
+        ("scientific_name", pa.string()),
+        ("species_sis_id", pa.string()),
+        ("type", pa.string()),
+        ("year", pa.int32()),
+        ("species_id", pa.int64()),
+        ("red_list_category", pa.string()),
+        ("red_list_category_code", pa.string()),
+        ("population_trend", pa.string()),
+        ("habitat1", pa.string()),
+        ("habitat2", pa.list_(pa.string())),
+        ("threats", pa.list_(pa.string())),
+        ("written_at", pa.float64()),
+    ]
+)
+
+
+class AssessmentDatasetWriter:
+    """Append the assessments of species to a sharded Parquet dataset.
+
+    The dataset has one row per species and assessment. Rows are buffered
+    and written as a new shard file of `rows_per_shard` rows, so the dataset
+    is only ever appended to. With a manifest, species are marked "written"
+    once their shard is on disk.
+
+    Parameters
+    ----------
+    path: Path
+        The folder of the dataset
+    rows_per_shard: int
+        The number of rows per shard file
+    row_group_size: int
+        The number of rows per Parquet row group
+    manifest: CrawlManifest
+        The manifest recording the crawl state
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        rows_per_shard: int = 50000,
+        row_group_size: int = 10000,
+        manifest=None,
+    ):
+        self.path = Path(path)
+        self.rows_per_shard = rows_per_shard
+        self.row_group_size = row_group_size
+        self.manifest = manifest
+        self._rows = []
+        self._species_names = []
+        self._shard = 0
+        self._lock = threading.Lock()
+
+    def write(self, species_name: str, rows: list):
+        """Add the assessment rows of one species."""
+        with self._lock:
+            self._rows.extend(rows)
+            self._species_names.append(species_name)
+            if len(self._rows) >= self.rows_per_shard:
+                self._flush()
+
+    def flush(self):
+        """Write the buffered rows as a new shard."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        written_at = time.time()
+        for row in self._rows:
+            row["written_at"] = written_at
+        table = pa.Table.from_pylist(self._rows, schema=ASSESSMENT_SCHEMA)
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        shard_name = f"part-{int(written_at * 1000)}-{os.getpid()}-{self._shard:05d}"
+        tmp_file = self.path / f".{shard_name}.tmp"  # hidden from dataset reads
+        pq.write_table(table, tmp_file, row_group_size=self.row_group_size)
+        os.replace(tmp_file, self.path / f"{shard_name}.parquet")
+        self._shard += 1
+
+        if self.manifest is not None:
+            for species_name in self._species_names:
+                self.manifest.mark(species_name, "written", last_error=None)
+        self._rows = []
+        self._species_names = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_assessment_dataset(path: Path = None, columns: list = None):
+    """Read the assessment dataset in a single scan.
+
+    A species written more than once, e.g. after an interrupted run, only
+    keeps the rows of its last write. Within one write, a repeated year
+    keeps its last assessment, like the year-keyed columns always did. A
+    species whose last write is a tombstone, a row without year written
+    when it left the red list, is left out.
+
+    Parameters
+    ----------
+    path: Path
+        The folder of the dataset
+    columns: list
+        The columns to read, default is all of them
+
+    Returns
+    -------
+    assessments: pd.DataFrame
+    """
+    path = path if path else path_data_assessments
+    if not any(Path(path).glob("*.parquet")):
+        return pd.DataFrame(columns=columns if columns else ASSESSMENT_SCHEMA.names)
+
+    read_columns = None
+    if columns:
+        read_columns = list(
+            dict.fromkeys(list(columns) + ["scientific_name", "year", "written_at"])
+        )
+    assessments = pq.read_table(
+        path, columns=read_columns, schema=ASSESSMENT_SCHEMA
+    ).to_pandas()
+
+    last_written = assessments.groupby("scientific_name")["written_at"].transform("max")
+    assessments = assessments[assessments["written_at"] == last_written]
+    if assessments["year"].isna().any():
+        assessments = assessments[assessments["year"].notna()]
+        assessments = assessments.astype({"year": "int32"})
+    assessments = assessments.drop_duplicates(["scientific_name", "year"], keep="last")
+    if columns:
+        assessments = assessments[columns]
+    return assessments.reset_index(drop=True)
 
-        unique_element = list(unique_element)
-    else:
-        unique_element = []
-    return unique_element, keyword_keys
 
+def get_tombstone_row(species_name: str):
+    """Get the dataset row removing a species from the red list."""
+    return {"scientific_name": species_name, "year": None}
 
-def process_period_assessment_results(data: dict, keyword: str, split_year: int = None):
+
+def assessments_from_records(records: list):
+    """Get the assessment rows from species records with year keys.
+
+    It converts the species csv files written by former crawls, where
+    list values are stored as their string representation.
+
+    Parameters
+    ----------
+    records: list
+        The records of species, e.g. a species csv read as dict
+
+    Returns
+    -------
+    assessments: pd.DataFrame
     """
-    To combine assessment details for two splited periods
+    list_fields = ["habitat2", "threats"]
+    rows = []
+    for record in records:
+        species_rows = {}
+        for key_, value in record.items():
+            if not key_[:4].isdigit():
+                continue
+            year, field = int(key_[:4]), key_[5:]
+            if field in list_fields:
+                value = ast.literal_eval(value) if isinstance(value, str) else []
+            elif field == "habitat1" and (value == "[]" or pd.isna(value)):
+                value = None
+            species_rows.setdefault(year, {})[field] = value
+        for year, species_assessment in species_rows.items():
+            rows.append(
+                {
+                    "scientific_name": record["scientific_name"],
+                    "species_sis_id": str(record["species_sis_id"]),
+                    "type": record["type"],
+                    "year": year,
+                }
+                | species_assessment
+            )
+    columns = [name for name in ASSESSMENT_SCHEMA.names if name != "written_at"]
+    return pd.DataFrame(rows, columns=columns)
+
+
+class RawResponseArchive:
+    """An archive of the raw API responses of every crawled species.
+
+    Each worker thread appends to its own shard, a file of JSON lines
+    compressed as a sequence of zstd frames. One line holds the responses
+    of all assessments of one species, so the fields can be extracted
+    again offline with `extract_archive`. Lines are buffered and written
+    as one frame every `records_per_frame` species, so a shard cut by a
+    crash stays readable up to its last complete frame.
+
+    Parameters
+    ----------
+    path: Path
+        The folder of the archive
+    records_per_frame: int
+        The number of species per zstd frame
+    level: int
+        The zstd compression level
+    """
+
+    def __init__(self, path: Path, records_per_frame: int = 100, level: int = 10):
+        self.path = Path(path)
+        self.records_per_frame = records_per_frame
+        self.level = level
+        self._run_id = f"{int(time.time())}-{os.getpid()}"
+        self._shards = {}
+        self._shard_count = 0
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        thread_id = threading.get_ident()
+        with self._lock:
+            shard = self._shards.get(thread_id)
+            if shard is None:
+                self.path.mkdir(parents=True, exist_ok=True)
+                shard_name = f"shard-{self._run_id}-{self._shard_count:03d}.jsonl.zst"
+                shard = {"file": open(self.path / shard_name, "ab"), "lines": []}
+                self._shards[thread_id] = shard
+                self._shard_count += 1
+        return shard
+
+    def write(self, species_name: str, species_sis_id, responses: list):
+        """Archive the responses of all assessments of one species.
+
+        Parameters
+        ----------
+        species_name: str
+            The name of species
+        species_sis_id:
+            The sis id of species
+        responses: list
+            (assessment id, API response) of every assessment, latest first
+        """
+        self._append(
+            {
+                "scientific_name": species_name,
+                "species_sis_id": str(species_sis_id),
+                "archived_at": time.time(),
+                "assessments": [
+                    {"species_id": int(species_id), "response": species_info}
+                    for species_id, species_info in responses
+                ],
+            }
+        )
+
+    def write_removal(self, species_name: str):
+        """Archive that the species is no longer on the red list.
+
+        The record has no assessment, so `extract_archive` turns it into
+        the tombstone of the species, as long as it is its last record.
+        """
+        self._append(
+            {
+                "scientific_name": species_name,
+                "species_sis_id": None,
+                "archived_at": time.time(),
+                "removed": True,
+                "assessments": [],
+            }
+        )
+
+    def _append(self, record: dict):
+        shard = self._shard()
+        shard["lines"].append(json.dumps(record))
+        if len(shard["lines"]) >= self.records_per_frame:
+            self._write_frame(shard)
+
+    def _write_frame(self, shard: dict):
+        if not shard["lines"]:
+            return
+        data = ("\n".join(shard["lines"]) + "\n").encode("utf-8")
+        shard["file"].write(zstandard.ZstdCompressor(level=self.level).compress(data))
+        shard["file"].flush()
+        shard["lines"] = []
+
+    def close(self):
+        """Write the buffered species of all shards and close them.
+
+        The archive can still be written after, e.g. in the next crawl round
+        whose worker threads open new shards.
+        """
+        with self._lock:
+            for shard in self._shards.values():
+                self._write_frame(shard)
+                shard["file"].close()
+            self._shards = {}
+
+
+def iter_archive_records(shard_file: Path):
+    """Read the species records of one archive shard.
+
+    Parameters
+    ----------
+    shard_file: Path
+        The zstd-compressed JSON lines file
+
+    Returns
+    -------
+    records: generator of dict
+    """
+    with open(shard_file, "rb") as f:
+        reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+        for line in io.TextIOWrapper(reader, encoding="utf-8"):
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logging.warning(f"Skip a truncated record in {shard_file.name}")
+
+
+def get_species_rows(species_name: str, species_sis_id, responses: list):
+    """Get the assessment dataset rows of one species from its API responses.
+
+    Parameters
+    ----------
+    species_name: str
+        The name of species
+    species_sis_id:
+        The sis id of species
+    responses: list
+        (assessment id, API response) of every assessment, latest first
+
+    Returns
+    -------
+    species_rows: list
+    """
+    species_rows = []
+    for species_id, species_info in responses:
+        species_type, species_assessment = parse_species_assessment(
+            species_id, species_info
+        )
+        species_rows.append(
+            {
+                "scientific_name": species_name,
+                "species_sis_id": str(species_sis_id),
+                "type": species_type,
+            }
+            | species_assessment
+        )
+    return species_rows
+
+
+def extract_archive_shard(shard_file: Path):
+    """Extract the assessment dataset rows of all species of one shard.
+
+    A removal record gives the tombstone row of the species.
+    """
+    shard_rows = []
+    for record in iter_archive_records(shard_file):
+        if record.get("removed"):
+            shard_rows.append(
+                get_tombstone_row(record["scientific_name"])
+                | {"archived_at": record["archived_at"]}
+            )
+            continue
+        responses = [
+            (assessment["species_id"], assessment["response"])
+            for assessment in record["assessments"]
+        ]
+        for row in get_species_rows(
+            record["scientific_name"], record["species_sis_id"], responses
+        ):
+            row["archived_at"] = record["archived_at"]
+            shard_rows.append(row)
+    return shard_rows
+
+
+def extract_archive(
+    archive_path: Path = None, dataset_path: Path = None, processes: int = None
+):
+    """
+    To rebuild the assessment dataset from the archived API responses.
+
+    The shards are extracted in parallel by a process pool, with the same
+    field extraction as the crawl (`parse_species_assessment`), so a new
+    field only needs a new extraction instead of a new crawl. A species
+    archived more than once keeps its last archived responses, and a
+    species whose last record is a removal gets its tombstone.
+
+    Parameters:
+        - archive_path: Path
+            The folder of the archive
+
+        - dataset_path: Path
+            The folder of the assessment dataset to write
+
+        - processes: int
+            The number of processes, default is the number of CPUs
+
+    Return:
+        n_species: int
+            The number of species extracted, not counting the removed ones
+    """
+    archive_path = archive_path if archive_path else path_data_archive
+    dataset_path = dataset_path if dataset_path else path_data_assessments
+    shard_files = sorted(archive_path.glob("*.jsonl.zst"))
+    logging.info(f"Extract {len(shard_files)} archive shards")
+
+    last_archived = {}
+    rows = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for shard_rows in executor.map(extract_archive_shard, shard_files):
+            for row in shard_rows:
+                species_name = row["scientific_name"]
+                last_archived[species_name] = max(
+                    last_archived.get(species_name, 0), row["archived_at"]
+                )
+            rows.extend(shard_rows)
+
+    with AssessmentDatasetWriter(dataset_path) as writer:
+        species_rows = {}
+        for row in rows:
+            if row.pop("archived_at") == last_archived[row["scientific_name"]]:
+                species_rows.setdefault(row["scientific_name"], []).append(row)
+        for species_name, rows_ in species_rows.items():
+            writer.write(species_name, rows_)
+    return sum(rows_[0]["year"] is not None for rows_ in species_rows.values())
+
+
+def get_species_file(species_name: str):
+    """Get the csv file of the assessment details of the species."""
+    return (
+        path_data_output
+        / f"species_{species_name.replace(' ','_')}_assessment_detials.csv"
+    )
+
+
+def process_species(
+    species_item: tuple,
+    manifest: CrawlManifest = None,
+    writer: AssessmentDatasetWriter = None,
+    archive: RawResponseArchive = None,
+):
+    """
+    To get the id of each species
+
+    Parameters:
+        species_item: tuple
+            Include the species name, optionally followed by the species id
+            and sis id already resolved by `resolve_species_ids`
+
+        manifest: CrawlManifest
+            The manifest recording the crawl state. If given, a failure is
+            recorded in the manifest instead of raised.
+
+        writer: AssessmentDatasetWriter
+            The dataset the assessments are appended to. If not given, the
+            assessments are saved as one csv file of the species.
+
+        archive: RawResponseArchive
+            The archive the raw API responses are kept in
+    """
+    species_name = species_item[1]
+
+    try:
+        species_rows = _process_species(
+            species_name, species_item[2:], manifest, writer, archive
+        )
+    except Exception as error:
+        metrics.count("species_failed")
+        if manifest is None:
+            raise
+        logging.error(f"Failed to process {species_name}: {error!r}")
+        manifest.fail(species_name, repr(error))
+        return None
+    metrics.count("species_done")
+    if species_rows is None:
+        metrics.count("species_not_found")
+    else:
+        metrics.count("assessments", len(species_rows))
+    if manifest is None:
+        return species_rows
+
+
+def _process_species(
+    species_name: str,
+    species_ids: tuple,
+    manifest: CrawlManifest,
+    writer: AssessmentDatasetWriter,
+    archive: RawResponseArchive,
+):
+    if species_ids:
+        species_id, species_sis_id = species_ids
+    else:
+        species_id, species_sis_id = get_species_id(species_name=species_name)
+    if not species_id:
+        if manifest is not None:
+            manifest.mark(species_name, "not_found")
+        return
+    if manifest is not None:
+        manifest.mark(
+            species_name,
+            "resolved",
+            species_id=str(species_id),
+            species_sis_id=str(species_sis_id),
+        )
+
+    species_endpoint_all = get_species_endpoint(species_id)
+    if not species_endpoint_all:
+        raise RuntimeError(f"no endpoints for species id {species_id}")
+    if manifest is not None:
+        manifest.mark(
+            species_name, "endpoints_fetched", n_assessments=len(species_endpoint_all)
+        )
+
+    log_item(f"Get the {len(species_endpoint_all)} assessments of {species_name}")
+    responses = []
+    for species_assessment_year in species_endpoint_all.keys():
+        species_id_ = int(species_endpoint_all[species_assessment_year])
+
+        species_info = get_species_info(species_id_)
+        if species_info is None:
+            raise RuntimeError(f"no assessment for id {species_id_}")
+        responses.append((species_id_, species_info))
+    species_rows = get_species_rows(species_name, species_sis_id, responses)
+    if archive is not None:
+        archive.write(species_name, species_sis_id, responses)
+    if manifest is not None:
+        manifest.mark(species_name, "assessments_fetched")
+
+    if writer is not None:
+        writer.write(species_name, species_rows)
+        return species_rows
+
+    species_assessment_details = {
+        "scientific_name": species_name,
+        "species_sis_id": species_sis_id,
+        "type": species_rows[-1]["type"],
+    }
+    for row in species_rows:
+        year = row["year"]
+        species_assessment_details |= {
+            f"{year}_species_id": row["species_id"],
+            f"{year}_red_list_category": row["red_list_category"],
+            f"{year}_red_list_category_code": row["red_list_category_code"],
+            f"{year}_population_trend": row["population_trend"],
+            f"{year}_habitat1": row["habitat1"] or [],
+            f"{year}_habitat2": row["habitat2"],
+            f"{year}_threats": row["threats"],
+        }
+
+    path_data_output.mkdir(parents=True, exist_ok=True)
+    species_file = get_species_file(species_name)
+    species_assessment_details_ = pd.DataFrame([species_assessment_details])
+    species_assessment_details_.to_csv(species_file.with_suffix(".tmp"), index=False)
+    os.replace(species_file.with_suffix(".tmp"), species_file)
+    if manifest is not None:
+        manifest.mark(species_name, "written", last_error=None)
+    return species_rows
+
+
+def crawl_species(
+    name_list: list,
+    concurrency: int = 8,
+    manifest: CrawlManifest = None,
+    writer: AssessmentDatasetWriter = None,
+    archive: RawResponseArchive = None,
+):
+    """
+    To crawl the species concurrently in a pool of threads.
+
+    The requests are blocking, so `concurrency` species are processed at
+    the same time, while the request rate of each host is limited by its
+    shared token bucket, no matter how many species are in flight.
+
+    Parameters:
+        - name_list: list
+            The (index, species name) tuples to crawl
+
+        - concurrency: int
+            The maximum number of species processed at the same time
+
+        - manifest: CrawlManifest
+            The manifest recording the crawl state
+
+        - writer: AssessmentDatasetWriter
+            The dataset the assessments are appended to
+
+        - archive: RawResponseArchive
+            The archive the raw API responses are kept in
+
+    Return:
+        failed_species: list
+            The names of species failed with an exception. With a manifest,
+            the failures are recorded in the manifest instead
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(
+                process_species, species_item, manifest, writer, archive
+            ): species_item[1]
+            for species_item in name_list
+        }
+    failed_species = []
+    for future, species_name in futures.items():
+        if future.exception() is not None:
+            logging.error(f"Failed to process {species_name}: {future.exception()!r}")
+            failed_species.append(species_name)
+    return failed_species
+
+
+THREAT_LEVEL_MAPPING = {
+    "CR": 4,
+    "CT": 1,
+    "E": 3,
+    "EN": 3,
+    "EW": 5,
+    "EX": 5,
+    "Ex": 5,
+    "Ex/E": 5,
+    "Ex?": 5,
+    "LC": 0,
+    "LR/cd": 0,
+    "LR/lc": 0,
+    "LR/nt": 0,
+    "NT": 1,
+    "O": 0,
+    "R": 0,
+    "T": 1,
+    "V": 2,
+    "VU": 2,
+    "nt": 0,
+}
+
+
+def parse_list_value(value):
+    """Get the elements of a list value of an assessment.
+
+    Lists are returned as they are, and the string form of a list, as
+    stored in the species csv files, is parsed. A plain string, e.g. a
+    habitat system, is one element. A string which is not a valid list is
+    logged instead of silently dropped.
+
+    Parameters
+    ----------
+    value:
+        The value of an assessment field
+
+    Returns
+    -------
+    elements: list
+    """
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return list(value)
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return []
+    if isinstance(value, str) and value.startswith("["):
+        try:
+            parsed = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            logging.warning(f"Cannot parse the list {value[:80]!r}")
+            return []
+        return list(parsed) if isinstance(parsed, (list, tuple)) else [parsed]
+    return [value] if value != "" else []
+
+
+def refresh_species(
+    species_names: list,
+    red_list_version: str,
+    concurrency: int = 8,
+    search_batch_size: int = 200,
+    archive: RawResponseArchive = None,
+):
+    """
+    To update the assessment dataset to a new red list release.
+
+    The latest assessment id of every species is searched again in bulk
+    and compared with the stored one. Only species whose latest assessment
+    changed are crawled again: their new assessments are fetched, while
+    their former assessments come from the response cache, since published
+    assessments never change. Species no longer on the red list get a
+    tombstone in the dataset and a removal record in the archive, and
+    their csv file of former crawls is deleted. The changed species are
+    saved as a changeset, so downstream stages can rebuild only those rows.
+
+    Parameters:
+        - species_names: list
+            The names of species
+
+        - red_list_version: str
+            The label of the new release, e.g. "v.1.2026"
+
+        - concurrency: int
+            The maximum number of species processed at the same time
+
+        - search_batch_size: int
+            The species names resolved per multi-search request
+
+        - archive: RawResponseArchive
+            The archive the raw API responses are kept in
+
+    Return:
+        changeset: pd.DataFrame
+            One row per added, updated, removed or failed species
+    """
+    table_path = path_data_raw / "species_id_table.csv"
+    stored_table = load_species_id_table(table_path)
+    stored_ids = (
+        read_assessment_dataset(columns=["scientific_name", "species_id"])
+        .groupby("scientific_name")["species_id"]
+        .agg(set)
+        .to_dict()
+    )
+
+    logging.info("Search the latest assessments of all species")
+    new_table_path = table_path.with_name(f"species_id_table_{red_list_version}.csv")
+    new_table = resolve_species_ids(
+        species_names, table_path=new_table_path, batch_size=search_batch_size
+    )
+
+    changes = []
+    species_todo = []
+    for species_name in species_names:
+        old_id = stored_table.get(species_name, (None, None))[0]
+        if species_name not in new_table:
+            continue  # the search failed, keep the stored species
+        new_id, new_sis_id = new_table[species_name]
+        if new_id is None:
+            if old_id is not None or species_name in stored_ids:
+                old_ids = stored_ids.get(species_name, set())
+                changes.append(
+                    {
+                        "scientific_name": species_name,
+                        "change": "removed",
+                        "old_species_id": old_id,
+                        "new_species_id": None,
+                        "removed_assessment_ids": " ".join(map(str, sorted(old_ids))),
+                    }
+                )
+            continue
+        if str(new_id) != str(old_id) or species_name not in stored_ids:
+            species_todo.append((species_name, old_id, new_id, new_sis_id))
+    logging.info(f"{len(species_todo)} species have new assessments")
+
+    def refresh_one(species_item: tuple):
+        species_name, old_id, new_id, new_sis_id = species_item
+        change = {
+            "scientific_name": species_name,
+            "change": "updated" if species_name in stored_ids else "added",
+            "old_species_id": old_id,
+            "new_species_id": new_id,
+        }
+        try:
+            species_rows = _process_species(
+                species_name, (new_id, new_sis_id), None, writer, archive
+            )
+        except Exception as error:
+            metrics.count("species_failed")
+            logging.error(f"Failed to refresh {species_name}: {error!r}")
+            return change | {"change": "failed", "error": repr(error)}
+        metrics.count("species_done")
+
+        old_ids = stored_ids.get(species_name, set())
+        new_ids = {row["species_id"] for row in species_rows}
+        return change | {
+            "added_assessment_ids": " ".join(map(str, sorted(new_ids - old_ids))),
+            "removed_assessment_ids": " ".join(map(str, sorted(old_ids - new_ids))),
+        }
+
+    with AssessmentDatasetWriter(path_data_assessments) as writer:
+        # so far the changes are the species no longer on the red list
+        for change in changes:
+            species_name = change["scientific_name"]
+            writer.write(species_name, [get_tombstone_row(species_name)])
+            if archive is not None:
+                archive.write_removal(species_name)
+            get_species_file(species_name).unlink(missing_ok=True)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            changes.extend(executor.map(refresh_one, species_todo))
+
+    logging.info("Store the latest assessment ids")
+    refreshed_table = stored_table | {
+        change["scientific_name"]: new_table[change["scientific_name"]]
+        for change in changes
+        if change["change"] in ("added", "updated", "removed")
+    }
+    save_species_id_table(refreshed_table, table_path)
+
+    changeset = pd.DataFrame(
+        changes,
+        columns=[
+            "scientific_name",
+            "change",
+            "old_species_id",
+            "new_species_id",
+            "added_assessment_ids",
+            "removed_assessment_ids",
+            "error",
+        ],
+    )
+    changeset.insert(0, "red_list_version", red_list_version)
+    path_data_changesets.mkdir(parents=True, exist_ok=True)
+    changeset.to_csv(
+        path_data_changesets / f"changeset_{red_list_version}.csv", index=False
+    )
+    logging.info(f"Changes of species: {changeset['change'].value_counts().to_dict()}")
+    return changeset
+
+
+def omit_duplicate_elements(data: dict, keyword: str):
+    """
+    To get the unique value of a field over all assessment years.
+
+    Parameters:
+        - data: dict
+            The assessment details
+
+        - keyword: str
+            The field, e.g. "habitat1"
+
+    Return:
+        unique_element
+            The value if it is the same in all years, otherwise the sorted
+            union of the values
+        keyword_keys
+    """
+    keyword_keys = [key_ for key_ in data.keys() if keyword in key_]
+    data_keyword = {}
+    for key_ in keyword_keys:
+        if parse_list_value(data[key_]):
+            data_keyword.setdefault(str(data[key_]), data[key_])
+
+    if len(data_keyword) == 1:
+        unique_element = next(iter(data_keyword.values()))
+    elif len(data_keyword) > 1:
+        unique_element = set()
+        for item in data_keyword.values():
+            unique_element.update(parse_list_value(item))
+        unique_element = sorted(unique_element)
+    else:
+        unique_element = []
+    return unique_element, keyword_keys
+
+
+def _combine_period_values(values: list, keyword: str):
+    values = [
+        value
+        for value in values
+        if not (isinstance(value, str) and value in ("[]", ""))
+        and not (value is None or (isinstance(value, float) and np.isnan(value)))
+    ]
+    if not values:
+        return None
+
+    if "threat" in keyword:
+        unique_element = set()
+        for item in values:
+            unique_element.update(parse_list_value(item))
+        return sorted(
+            set(" | ".join(element_.split(" | ")[:2]) for element_ in unique_element)
+        )
+    elif "weight" in keyword:
+        return max(values)
+    return None
+
+
+def get_period_labels(period_bounds: list):
+    """
+    To get the labels of the periods split by the boundary years
+
+    Parameters:
+        - period_bounds: list
+            The sorted boundary years, e.g. [2010] or [2000, 2005, 2010]
+
+    Return:
+        period_labels: list
+            e.g. ["pre_2000", "2000_2005", "2005_2010", "post_2010"]
+    """
+    period_bounds = sorted(int(bound) for bound in period_bounds)
+    return (
+        [f"pre_{period_bounds[0]}"]
+        + [
+            f"{start}_{end}"
+            for start, end in zip(period_bounds[:-1], period_bounds[1:])
+        ]
+        + [f"post_{period_bounds[-1]}"]
+    )
+
+
+def get_period_index(years, period_bounds: list):
+    """Get the period of every year, as an index of `get_period_labels`."""
+    return np.searchsorted(
+        sorted(int(bound) for bound in period_bounds),
+        np.asarray(years, dtype=int),
+        side="right",
+    )
+
+
+def process_period_assessment_results(
+    data: dict, keyword: str, split_year: int = None, period_bounds: list = None
+):
+    """
+    To combine assessment details for splited periods
 
     Parameters:
         - data:dict
@@ -361,233 +2145,562 @@ def process_period_assessment_results(data: dict, keyword: str, split_year: int
         - year:
             The year used to split the whole sutdy period, default year=2010
 
+        - period_bounds: list
+            The boundary years of more than two periods, instead of split_year
+
     Return:
         unique_element_pre
         unique_element_post
+        or the combined details of every period of `get_period_labels`
     """
     split_year = split_year if split_year else 2010
+    period_bounds = period_bounds if period_bounds else [split_year]
 
-    pre_year_keys = [
-        key_
-        for key_ in data.keys()
-        if (keyword in key_) and (int(key_[-4:]) < split_year)
-    ]
-    post_year_keys = [
-        key_
-        for key_ in data.keys()
-        if (keyword in key_) and (int(key_[-4:]) >= split_year)
-    ]
-    if post_year_keys:
-        data_post_years = list(
-            set(
+    keyword_keys = [key_ for key_ in data.keys() if keyword in key_]
+    key_periods = get_period_index([key_[-4:] for key_ in keyword_keys], period_bounds)
+    return tuple(
+        _combine_period_values(
+            [
                 data[key_]
-                for key_ in post_year_keys
-                if (data[key_] != "[]") and (data[key_] != "")
-            )
+                for key_, key_period in zip(keyword_keys, key_periods)
+                if key_period == period_
+            ],
+            keyword,
         )
+        for period_ in range(len(period_bounds) + 1)
+    )
 
-        # data_post_years = data_post_years * 2
-        if data_post_years:
-            if "threat" in keyword:
-                unique_element = set()
-                for item in data_post_years:
-                    try:
-                        parsed = ast.literal_eval(item)
-                        if isinstance(parsed, list):
-                            unique_element.update(parsed)
-                    except:
-                        pass
-
-                unique_element_post = sorted(
-                    set(
-                        [
-                            " | ".join(element_.split(" | ")[:2])
-                            for element_ in unique_element
-                        ]
-                    )
-                )
-                del unique_element
-            elif "weight" in keyword:
-                try:
-                    unique_element_post = max(data_post_years)
-                except TypeError:
-                    unique_element_post = max(
-                        data_ for data_ in data_post_years if data_ is not None
-                    )
-        else:
-            unique_element_post = None
 
-        del data_post_years
-    else:
-        unique_element_post = None
+def encode_assessments(assessments: pd.DataFrame):
+    """Get the integer-coded threats and habitats of the assessments.
 
-    if pre_year_keys:
-        data_pre_years = list(
-            set(
-                data[key_]
-                for key_ in pre_year_keys
-                if (data[key_] != "[]") and (data[key_] != "")
-            )
+    Threats are dictionary-encoded by their full "level1 | level2 | level3"
+    name, and each threat also gets the id of its level-1 name and of its
+    name truncated to level 2, so the level-2 threats of a species are an
+    integer group-by. Habitats (habitat2) are encoded the same way.
+
+    Parameters
+    ----------
+    assessments: pd.DataFrame
+        The assessment dataset, one row per species and assessment
+
+    Returns
+    -------
+    tables: dict
+        - "species": species, scientific_name, species_sis_id
+        - "threats": threat_id, level1_id, level2_id, threat, level1,
+          level2, level3. level2_id is the id of the threat truncated to
+          level 2, i.e. of the level-1 name for threats without children.
+        - "species_threats": species, year, threat_id
+        - "habitats": habitat_id, habitat
+        - "species_habitats": species, year, habitat_id
+    """
+    species_codes, species_names = pd.factorize(assessments["scientific_name"])
+    species = pd.DataFrame(
+        {
+            "species": np.arange(len(species_names), dtype=np.int32),
+            "scientific_name": species_names,
+        }
+    )
+    species["species_sis_id"] = (
+        assessments.drop_duplicates("scientific_name")["species_sis_id"].to_numpy()
+    )
+
+    tables = {"species": species}
+    for field, id_column, name_column, table_name in [
+        ("threats", "threat_id", "threat", "threats"),
+        ("habitat2", "habitat_id", "habitat", "habitats"),
+    ]:
+        lengths = assessments[field].map(len).to_numpy()
+        elements = np.concatenate(
+            [np.asarray(value, dtype=object) for value in assessments[field]]
+            + [np.array([], dtype=object)]
+        )
+        element_codes, element_names = pd.factorize(elements)
+        tables[f"species_{table_name}"] = pd.DataFrame(
+            {
+                "species": np.repeat(species_codes, lengths).astype(np.int32),
+                "year": np.repeat(assessments["year"].to_numpy(), lengths),
+                id_column: element_codes.astype(np.int32),
+            }
+        )
+        tables[table_name] = pd.DataFrame(
+            {
+                id_column: np.arange(len(element_names), dtype=np.int32),
+                name_column: np.asarray(element_names, dtype=object),
+            }
         )
 
-        if data_pre_years:
-            if "threat" in keyword:
-                unique_element = set()
-                for item in data_pre_years:
-                    try:
-                        parsed = ast.literal_eval(item)
-                        if isinstance(parsed, list):
-                            unique_element.update(parsed)
-                    except:
-                        pass
-
-                unique_element_pre = sorted(
-                    set(
-                        [
-                            " | ".join(element_.split(" | ")[:2])
-                            for element_ in unique_element
-                        ]
-                    )
-                )
-                del unique_element
-            elif "weight" in keyword:
-                try:
-                    unique_element_pre = max(data_pre_years)
-                except TypeError:
-                    unique_element_pre = max(
-                        data_ for data_ in data_pre_years if data_ is not None
-                    )
-        else:
-            unique_element_pre = None
-        del data_pre_years
-    else:
-        unique_element_pre = None
+    threats = tables["threats"]
+    levels = threats["threat"].str.split(" | ", n=2, regex=False)
+    threats["level1"] = levels.str[0]
+    threats["level2"] = levels.str[1]
+    threats["level3"] = levels.str[2]
+    threats["level1_id"] = pd.factorize(threats["level1"])[0].astype(np.int32)
+    threats["level2_id"] = pd.factorize(levels.str[:2].str.join(" | "))[0].astype(
+        np.int32
+    )
+    tables["threats"] = threats[
+        ["threat_id", "level1_id", "level2_id", "threat", "level1", "level2", "level3"]
+    ]
+    return tables
+
 
-    return unique_element_pre, unique_element_post
+def _unique_habitats(assessments: pd.DataFrame, column: str, n_species: int):
+    """Get the habitat of each species over all its assessments.
+
+    As in `omit_duplicate_elements`: a species assessed with one distinct
+    value keeps it, several distinct values are merged into a sorted list,
+    and no value gives [].
+    """
+    values = assessments[["species", column]].dropna()
+    if column == "habitat2":
+        values = values[values[column].map(len) > 0]
+    values = values.assign(_key=values[column].map(str))
+    n_values = values.groupby("species")["_key"].nunique()
+
+    single = values[values["species"].isin(n_values.index[n_values == 1])]
+    single = single.drop_duplicates("species")
+    unique_habitats = dict(
+        zip(
+            single["species"],
+            single[column].map(list) if column == "habitat2" else single[column],
+        )
+    )
+
+    several = values[values["species"].isin(n_values.index[n_values > 1])]
+    several = several[["species", column]]
+    if column == "habitat2":
+        several = several.explode(column)
+    merged = (
+        several.drop_duplicates()
+        .sort_values(["species", column])
+        .groupby("species")[column]
+        .agg(list)
+    )
+    unique_habitats.update(merged.to_dict())
+
+    return pd.Series(
+        [unique_habitats.get(species, []) for species in range(n_species)],
+        dtype=object,
+    )
+
+
+def _integer_weights(weights: pd.Series):
+    """Get the weights as integers when none is missing, like the former records.
+
+    A code missing in the mapping, e.g. "DD", gives NaN weights in the long
+    table, which turns every weight into a float. A column of the combined
+    table without missing weight is written as integers again, so it reads
+    "3", not "3.0".
+    """
+    if weights.notna().all() and (weights.astype(float) % 1 == 0).all():
+        return weights.astype(int)
+    return weights
+
+
+def combine_assessments(
+    assessments: pd.DataFrame,
+    threat_level_mapping: dict = None,
+    split_year: int = None,
+    encoded: dict = None,
+    period_bounds: list = None,
+):
+    """
+    To combine the assessments of all species into one table.
+
+    The assessments are processed as one long table with grouped
+    operations, instead of one record per species, and give the same
+    table as the former loop over the species csv files: one row per
+    species with the habitats, the red list category weight and
+    level-2 threats of the two periods, and the details of each
+    assessment year.
+
+    Parameters:
+        - assessments: pd.DataFrame
+            The assessment dataset, one row per species and assessment
+
+        - threat_level_mapping: dict
+            The weights of the red list category codes
+
+        - split_year:
+            The year used to split the whole sutdy period, default year=2010
+
+        - encoded: dict
+            The tables of `encode_assessments` for these assessments, if
+            already computed
+
+        - period_bounds: list
+            The boundary years of more than two periods, instead of
+            split_year, e.g. [2000, 2005, 2010] or annual windows
+
+    Return:
+        species_assessment_details_all: pd.DataFrame
+    """
+    threat_level_mapping = (
+        threat_level_mapping if threat_level_mapping else THREAT_LEVEL_MAPPING
+    )
+    split_year = split_year if split_year else 2010
+    period_bounds = period_bounds if period_bounds else [split_year]
+    period_labels = get_period_labels(period_bounds)
+
+    assessments = assessments.reset_index(drop=True)
+    species_codes, species_names = pd.factorize(assessments["scientific_name"])
+    assessments = assessments.assign(
+        species=species_codes,
+        threats=assessments["threats"].map(list),
+        red_list_category_weight=assessments["red_list_category_code"].map(
+            threat_level_mapping
+        ),
+    )
+    if assessments["red_list_category_weight"].notna().all():
+        assessments["red_list_category_weight"] = assessments[
+            "red_list_category_weight"
+        ].astype(int)
+
+    encoded = encoded if encoded else encode_assessments(assessments)
+
+    logging.info("Get the species information")
+    species_info = assessments.drop_duplicates("species", keep="last").set_index(
+        "species"
+    )
+    species_info = species_info.loc[
+        np.arange(len(species_names)), ["type", "scientific_name"]
+    ]
+    species_info["species_sis_id"] = (
+        assessments.drop_duplicates("species").set_index("species")["species_sis_id"]
+    )
+
+    logging.info("Unique habitats")
+    species_info["habitat1"] = _unique_habitats(
+        assessments, "habitat1", len(species_names)
+    )
+    species_info["habitat2"] = _unique_habitats(
+        assessments, "habitat2", len(species_names)
+    )
+
+    logging.info("Include period results for red list category, and threats")
+    assessments["period"] = get_period_index(assessments["year"], period_bounds)
+    weights = (
+        assessments.groupby(["species", "period"])["red_list_category_weight"]
+        .max()
+        .unstack("period")
+    )
+    threat_level2_names = (
+        encoded["threats"]
+        .drop_duplicates("level2_id")
+        .set_index("level2_id")["threat"]
+        .str.split(" | ", n=2, regex=False)
+        .str[:2]
+        .str.join(" | ")
+        .sort_index()
+    )
+    species_threats = encoded["species_threats"]
+    threats = pd.DataFrame(
+        {
+            "species": species_threats["species"],
+            "period": get_period_index(species_threats["year"], period_bounds),
+            "level2_id": encoded["threats"]["level2_id"].to_numpy()[
+                species_threats["threat_id"].to_numpy()
+            ],
+        }
+    ).drop_duplicates()
+    threats["threats"] = threat_level2_names.to_numpy()[threats["level2_id"]]
+    threats = (
+        threats.sort_values(["species", "period", "threats"])
+        .groupby(["species", "period"])["threats"]
+        .agg(list)
+        .unstack("period")
+    )
+    for period_, period_label in enumerate(period_labels):
+        weight_column = f"red_list_category_weight_{period_label}"
+        species_info[weight_column] = weights.get(period_)
+        species_info[weight_column] = _integer_weights(species_info[weight_column])
+    for period_, period_label in enumerate(period_labels):
+        threat_column = f"threat_{period_label}"
+        species_info[threat_column] = threats.get(period_)
+        species_info[threat_column] = species_info[threat_column].astype(object)
+        species_info.loc[species_info[threat_column].isna(), threat_column] = None
+
+    logging.info("Get the assessment details of every year")
+    details = assessments.assign(threats=assessments["threats"].map(str)).pivot(
+        index="species",
+        columns="year",
+        values=[
+            "species_id",
+            "red_list_category",
+            "red_list_category_code",
+            "population_trend",
+            "threats",
+            "red_list_category_weight",
+        ],
+    )
+    details.columns = [f"{field}_{year}" for field, year in details.columns]
+    details = details[sorted(details.columns)].infer_objects()
+    for weight_column in details.columns:
+        if weight_column.startswith("red_list_category_weight_"):
+            details[weight_column] = _integer_weights(details[weight_column])
+
+    species_assessment_details_all = species_info.join(details)
+    species_assessment_details_all = species_assessment_details_all[
+        [
+            "type",
+            "scientific_name",
+            "species_sis_id",
+            "habitat1",
+            "habitat2",
+        ]
+        + [f"red_list_category_weight_{label}" for label in period_labels]
+        + [f"threat_{label}" for label in period_labels]
+        + list(details.columns)
+    ]
+    return species_assessment_details_all.reset_index(drop=True)
 
 
 if __name__ == "__main__":
-    logging.info("Get the full list of species")
-    with open(path_data_raw / "list.txt", encoding="utf-8") as f:
-        name_list = [(i, line.strip()) for i, line in enumerate(f) if line.strip()]
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,  # Set the logging level, DEBUG logs every request
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        handlers=[
+            logging.StreamHandler(),  # Log to console
+            logging.FileHandler("app.log"),  # Log to a file
+        ],
+    )
+
+    parser = argparse.ArgumentParser(description="Scrape the IUCN red list species")
+    parser.add_argument(
+        "--stage",
+        choices=["all", "crawl", "combine"],
+        default="all",
+        help="crawl: only fetch the assessments, combine: only combine the dataset",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="species crawled at the same time"
+    )
+    parser.add_argument(
+        "--requests-per-second",
+        type=float,
+        default=REQUESTS_PER_SECOND,
+        help="request budget per host, shared by all workers",
+    )
+    parser.add_argument(
+        "--cache-max-gb", type=float, default=5, help="size limit of the response cache"
+    )
+    parser.add_argument(
+        "--cache-max-age-days",
+        type=float,
+        default=None,
+        help="remove cached responses unused for this number of days",
+    )
+    parser.add_argument(
+        "--search-batch-size",
+        type=int,
+        default=200,
+        help="species names resolved per multi-search request",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=5,
+        help="attempts per species before it is left as failed",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=MAX_RETRIES,
+        help="retries of a request failed by a connection error or 5xx",
+    )
+    parser.add_argument(
+        "--no-archive",
+        action="store_true",
+        help="do not keep the raw API responses of the crawl",
+    )
+    parser.add_argument(
+        "--extract",
+        action="store_true",
+        help="rebuild the assessment dataset from the raw responses, no crawl",
+    )
+    parser.add_argument(
+        "--extract-processes",
+        type=int,
+        default=None,
+        help="processes of the extraction, default is the number of CPUs",
+    )
+    parser.add_argument(
+        "--refresh",
+        metavar="RED_LIST_VERSION",
+        default=None,
+        help="only fetch the species changed in this red list release",
+    )
+    parser.add_argument(
+        "--period-bounds",
+        type=int,
+        nargs="+",
+        default=[2010],
+        help="boundary years of the periods, default splits pre/post 2010",
+    )
+    parser.add_argument(
+        "--annual-periods",
+        type=int,
+        nargs=2,
+        metavar=("FIRST_YEAR", "LAST_YEAR"),
+        default=None,
+        help="one period per year from FIRST_YEAR to LAST_YEAR",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=60,
+        help="seconds between the progress summaries of the crawl",
+    )
+    parser.add_argument(
+        "--log-items",
+        type=float,
+        default=0.0,
+        metavar="RATE",
+        help="share of species and assessments logged one by one, e.g. 0.01",
+    )
+    args = parser.parse_args()
+    MAX_RETRIES = args.max_retries
+    ITEM_LOG_RATE = args.log_items
+    path_data_raw.mkdir(parents=True, exist_ok=True)
+    path_data_metrics = get_metrics_path(args.stage)
+    metrics.start_reporter(args.metrics_interval, path_data_metrics)
+    set_rate_limit(args.requests_per_second)
+    response_cache.max_bytes = int(args.cache_max_gb * 1024**3)
+    if args.cache_max_age_days is not None:
+        response_cache.max_age = args.cache_max_age_days * 86400
+    response_cache.evict()
+
+    if args.stage != "combine":
+        logging.info("Get the full list of species")
+        with open(path_data_raw / "list.txt", encoding="utf-8") as f:
+            name_list = [(i, line.strip()) for i, line in enumerate(f) if line.strip()]
 
-    path_data_output = path_data_raw / "red_list_assessment_details"
-    if not path_data_output.exists():
         path_data_output.mkdir(parents=True, exist_ok=True)
 
-    logging.info("Check the total number of data facts")
-    species_assessment_list = [file for file in path_data_output.glob("*.csv")]
-    if len(species_assessment_list) < len(name_list) * 0.8:
-        logging.info("We need to re-download the data")
-        logging.info("This may take 12 hours")
-        logging.info("Start downloading the assessment details")
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            executor.map(process_species, name_list)
-    else:
-        logging.info("No data need to be downloaded")
-
-    logging.info("Combine species assessment results")
-    threat_level_mapping = {
-        "CR": 4,
-        "CT": 1,
-        "E": 3,
-        "EN": 3,
-        "EW": 5,
-        "EX": 5,
-        "Ex": 5,
-        "Ex/E": 5,
-        "Ex?": 5,
-        "LC": 0,
-        "LR/cd": 0,
-        "LR/lc": 0,
-        "LR/nt": 0,
-        "NT": 1,
-        "O": 0,
-        "R": 0,
-        "T": 1,
-        "V": 2,
-        "VU": 2,
-        "nt": 0,
-    }
-    species_assessment_details_all = []
-    species_assessment_details_columns = []  # for the final columns
-    for species_assessment_file in species_assessment_list:
-        species_results = pd.read_csv(species_assessment_file).to_dict("records")[0]
-        species_basic_columns = ["type", "scientific_name", "species_sis_id"]
-
-        logging.info("Change the header names")
-        species_results_keys = list(species_results.keys())[3:]
-        for key_ in species_results_keys:
-            key_name = key_[5:] + "_" + key_[:4]
-            species_results[key_name] = species_results.pop(key_)
-            if "red_list_category_code_" in key_name:
-                try:
-                    species_results[key_name.replace("_code_", "_weight_")] = (
-                        threat_level_mapping[species_results[key_name]]
+        logging.info("Check the crawl state of species")
+        manifest = CrawlManifest(path_data_raw / "crawl_manifest.sqlite")
+        manifest.add_species(name_list)
+        for species_item in manifest.unfinished(max_attempts=args.max_attempts):
+            if get_species_file(species_item[1]).exists():
+                manifest.mark(species_item[1], "written")
+
+        name_list_todo = manifest.unfinished(max_attempts=args.max_attempts)
+        if args.extract:
+            logging.info("Extract the assessment details from the raw responses")
+            with metrics.stage("extract"):
+                n_species = extract_archive(processes=args.extract_processes)
+            logging.info(f"Extracted {n_species} species")
+        elif args.refresh:
+            store_manifest_species_ids(manifest)
+            logging.info(f"Refresh the species to the red list {args.refresh}")
+            archive = None if args.no_archive else RawResponseArchive(path_data_archive)
+            with metrics.stage("refresh"):
+                refresh_species(
+                    [species_name for _, species_name in name_list],
+                    red_list_version=args.refresh,
+                    concurrency=args.concurrency,
+                    search_batch_size=args.search_batch_size,
+                    archive=archive,
+                )
+            if archive is not None:
+                archive.close()
+        elif name_list_todo:
+            logging.info(f"We need to download {len(name_list_todo)} species")
+            logging.info("Resolve the species ids in batches")
+            with metrics.stage("resolve"):
+                species_id_table = resolve_species_ids(
+                    [species_item[1] for species_item in name_list_todo],
+                    batch_size=args.search_batch_size,
+                )
+            manifest.set_resolved(species_id_table)
+
+            logging.info("Start downloading the assessment details")
+            writer = AssessmentDatasetWriter(path_data_assessments, manifest=manifest)
+            archive = None if args.no_archive else RawResponseArchive(path_data_archive)
+            with metrics.stage("crawl"):
+                while True:
+                    name_list_todo = manifest.unfinished(max_attempts=args.max_attempts)
+                    if not name_list_todo:
+                        retry_at = manifest.next_retry_at(
+                            max_attempts=args.max_attempts
+                        )
+                        if retry_at is None:
+                            break
+                        logging.info("Wait for the backoff of failed species")
+                        time.sleep(max(retry_at - time.time(), 0))
+                        continue
+
+                    crawl_species(
+                        name_list_todo,
+                        concurrency=args.concurrency,
+                        manifest=manifest,
+                        writer=writer,
+                        archive=archive,
                     )
-                except KeyError:
-                    species_results[key_name.replace("_code_", "_weight_")] = None
-            del key_, key_name
-        species_results_keys = list(species_results.keys())[3:]
-
-        logging.info("Unique habitats")
-        species_habitat1, species_habitat1_keys = omit_duplicate_elements(
-            species_results, "habitat1"
-        )
-        species_results_keys = [
-            key_ for key_ in species_results_keys if key_ not in species_habitat1_keys
-        ]
-        species_habitat2, species_habitat2_keys = omit_duplicate_elements(
-            species_results, "habitat2"
-        )
-        species_results_keys = [
-            key_ for key_ in species_results_keys if key_ not in species_habitat2_keys
-        ]
-        logging.info("Update habitat results")
-        species_results["habitat1"] = species_habitat1
-        species_results["habitat2"] = species_habitat2
-        species_basic_columns = species_basic_columns + ["habitat1", "habitat2"]
-
-        logging.info("Include period results for red list category, and threats")
-        split_year = 2010  # we split the available years into pre-2010 and post-2010
-        for keyword_ in ["red_list_category_weight", "threat"]:
-            assessment_pre_period, assessment_post_period = (
-                process_period_assessment_results(
-                    species_results, keyword=keyword_, split_year=split_year
+                    writer.flush()
+                    # The worker threads of the round are gone, finish their shards
+                    if archive is not None:
+                        archive.close()
+            if archive is not None:
+                archive.close()
+            store_manifest_species_ids(manifest)
+            logging.info(f"Crawl state of species: {manifest.summary()}")
+        else:
+            logging.info("No data need to be downloaded")
+
+    if args.stage != "crawl":
+        logging.info("Read the assessment dataset")
+        with metrics.stage("read"):
+            assessments = read_assessment_dataset()
+            species_in_dataset = set(assessments["scientific_name"])
+            logging.info("Include species saved as csv files by former crawls")
+            species_records = []
+            for species_assessment_file in sorted(path_data_output.glob("*.csv")):
+                species_results = pd.read_csv(species_assessment_file).to_dict(
+                    "records"
+                )[0]
+                if species_results["scientific_name"] not in species_in_dataset:
+                    species_records.append(species_results)
+            if species_records:
+                assessments = pd.concat(
+                    [assessments, assessments_from_records(species_records)],
+                    ignore_index=True,
+                )
+            del species_in_dataset, species_records
+
+        logging.info("Encode threats and habitats")
+        with metrics.stage("encode"):
+            assessments = assessments.reset_index(drop=True)
+            encoded = encode_assessments(assessments)
+            for table_name, table in encoded.items():
+                table.to_parquet(
+                    path_data_raw / f"iucn_{table_name}.parquet", index=False
                 )
-            )
-            species_results[f"{keyword_}_pre_{split_year}"] = assessment_pre_period
-            species_results[f"{keyword_}_post_{split_year}"] = assessment_post_period
-            species_basic_columns = species_basic_columns + [
-                f"{keyword_}_pre_{split_year}",
-                f"{keyword_}_post_{split_year}",
-            ]
-            del assessment_pre_period, assessment_post_period
-
-        logging.info("Append the assessment results")
-        species_assessment_details_all.append(species_results)
-
-        logging.info("Update final columns")
-        species_assessment_details_columns = list(
-            np.unique(species_assessment_details_columns + species_results_keys)
-        )
 
-        del (
-            species_assessment_file,
-            species_results,
-            species_results_keys,
-            species_habitat1,
-            species_habitat1_keys,
-            species_habitat2,
-            species_habitat2_keys,
-        )
+        logging.info("Combine species assessment results")
+        with metrics.stage("combine"):
+            # we split the available years into pre-2010 and post-2010 by default
+            period_bounds = (
+                list(range(args.annual_periods[0], args.annual_periods[1] + 1))
+                if args.annual_periods
+                else args.period_bounds
+            )
+            species_assessment_details_all = combine_assessments(
+                assessments,
+                threat_level_mapping=THREAT_LEVEL_MAPPING,
+                encoded=encoded,
+                period_bounds=period_bounds,
+            )
 
-    species_assessment_details_all = pd.DataFrame(species_assessment_details_all)[
-        species_basic_columns + species_assessment_details_columns
-    ]
-    del species_basic_columns
+        logging.info("Done, save data")
+        with metrics.stage("save"):
+            species_assessment_details_all.to_csv(
+                path_data_raw / "iucn_species_assessment_details_time_series.csv",
+                index=False,
+            )
 
-    logging.info("Done, save data")
-    species_assessment_details_all.to_csv(
-        path_data_raw / "iucn_species_assessment_details_time_series.csv", index=False
-    )
+    metrics.stop_reporter(path_data_metrics)
@@ -0,0 +1,321 @@
+"""
+Created: Sunday 18 October 2026
+Description: Scripts to map the threats of red list species to economic sectors
+Scope: biodiversity threat project of Ling Zhang
+"""
+
+import ast
+import logging
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Read the variable
+data_home = Path("./data")
+current_version = "v.6.2025"
+current_project = "bio_threat"
+
+path_data_raw = data_home / "raw_data" / current_project / current_version
+path_data_mapping = path_data_raw / "sector_mapping"
+path_concordance = Path(__file__).resolve().parent / "concordance"
+
+N_SECTORS = 26  # sectors per country in the Eora MRIO tables
+
+# Period labels of the scraper, e.g. pre_2010, 2005_2010, post_2010
+PERIOD_PATTERN = r"pre_\d{4}|\d{4}_\d{4}|post_\d{4}"
+
+
+def get_periods(columns, prefix: str, suffix: str = ""):
+    """Get the periods of the {prefix}{period}{suffix} columns, in column order."""
+    pattern = re.compile(f"{re.escape(prefix)}({PERIOD_PATTERN}){re.escape(suffix)}")
+    return [
+        match.group(1)
+        for match in map(pattern.fullmatch, columns)
+        if match is not None
+    ]
+
+
+def load_concordance(path: Path = None):
+    """Load the threat classification and the threat -> sector concordance.
+
+    Parameters
+    ----------
+    path: Path
+        The folder of the concordance tables
+
+    Returns
+    -------
+    threat_classification: pd.DataFrame
+        threat_name, threat_code, climate_related
+    threat_sector: pd.DataFrame
+        threat_code, sector_code
+    """
+    path = path if path else path_concordance
+    threat_classification = pd.read_csv(path / "threat_classification.csv")
+    threat_sector = pd.read_csv(path / "threat_sector_concordance.csv")
+    return threat_classification, threat_sector
+
+
+def build_threat_sector_matrix(threat_sector: pd.DataFrame, n_threats: int = None):
+    """Get the threat x sector incidence matrix.
+
+    Parameters
+    ----------
+    threat_sector: pd.DataFrame
+        threat_code, sector_code (both starting from 1)
+    n_threats: int
+        The number of threat codes, default is the largest code
+
+    Returns
+    -------
+    threat_sector_matrix: sparse.csr_matrix
+        1 where the production of the sector causes the threat
+    """
+    n_threats = n_threats if n_threats else int(threat_sector["threat_code"].max())
+    threat_sector_matrix = sparse.csr_matrix(
+        (
+            np.ones(len(threat_sector)),
+            (
+                threat_sector["threat_code"].to_numpy() - 1,
+                threat_sector["sector_code"].to_numpy() - 1,
+            ),
+        ),
+        shape=(n_threats, N_SECTORS),
+    )
+    threat_sector_matrix.data[:] = 1
+    return threat_sector_matrix
+
+
+def _literal_threats(value, species, column: str):
+    """Get the threat list of one value, reporting the values that are no list."""
+    if isinstance(value, str):
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError) as error:
+            raise ValueError(
+                f"Cannot parse the threats of {species} in {column}: {value!r}"
+            ) from error
+    return list(value) if isinstance(value, (list, tuple, np.ndarray)) else []
+
+
+def parse_threat_column(threat_column: pd.Series):
+    """Get the threats of a period column of the combined assessments.
+
+    Parameters
+    ----------
+    threat_column: pd.Series
+        The level-2 threat lists, e.g. threat_pre_2010, or their string form
+        as read from csv. The index names the species in parse errors.
+
+    Returns
+    -------
+    threats: pd.Series
+        One "level1 | level2" threat per row, indexed by the row position
+    """
+    threat_lists = pd.Series(
+        [
+            _literal_threats(value, species, threat_column.name)
+            for species, value in threat_column.items()
+        ],
+        dtype=object,
+    )
+    return threat_lists.explode().dropna()
+
+
+def load_species_threats(path: Path = None):
+    """Load the level-2 threats of every assessment from the encoded tables.
+
+    The species and threat ids of the tables written by the combine stage
+    are only codes within one run, so they are joined back to the names.
+
+    Parameters
+    ----------
+    path: Path
+        The folder of iucn_species, iucn_threats and iucn_species_threats
+
+    Returns
+    -------
+    species_threats: pd.DataFrame
+        scientific_name, year, threat ("level1 | level2")
+    """
+    path = path if path else path_data_raw
+    species = pd.read_parquet(
+        path / "iucn_species.parquet", columns=["species", "scientific_name"]
+    )
+    threats = pd.read_parquet(
+        path / "iucn_threats.parquet", columns=["threat_id", "threat"]
+    )
+    threats["threat"] = (
+        threats["threat"].str.split(" | ", n=2, regex=False).str[:2].str.join(" | ")
+    )
+    species_threats = pd.read_parquet(path / "iucn_species_threats.parquet")
+    species_threats = species_threats.merge(species, on="species").merge(
+        threats, on="threat_id"
+    )
+    return species_threats[["scientific_name", "year", "threat"]]
+
+
+def get_period_threat_column(
+    species_threats: pd.DataFrame, scientific_names, period: str
+):
+    """Get the threat_{period} column of the combined assessments.
+
+    Parameters
+    ----------
+    species_threats: pd.DataFrame
+        scientific_name, year, threat, as of `load_species_threats`
+    scientific_names: list
+        The species of the rows of the column
+    period: str
+        The period label, e.g. pre_2010, 2005_2010 or post_2010
+
+    Returns
+    -------
+    threat_column: pd.Series
+        The sorted level-2 threats of each species in the period, missing
+        for species without threats, indexed by the scientific name
+    """
+    years = species_threats["year"]
+    bounds = [int(year) for year in re.findall(r"\d{4}", period)]
+    if period.startswith("pre_"):
+        in_period = years < bounds[0]
+    elif period.startswith("post_"):
+        in_period = years >= bounds[0]
+    else:
+        in_period = (years >= bounds[0]) & (years < bounds[1])
+    threat_lists = (
+        species_threats[in_period]
+        .drop_duplicates(["scientific_name", "threat"])
+        .sort_values("threat")
+        .groupby("scientific_name")["threat"]
+        .agg(list)
+    )
+    return threat_lists.reindex(pd.Index(scientific_names)).rename(f"threat_{period}")
+
+
+def build_species_threat_matrix(
+    threat_column: pd.Series, threat_classification: pd.DataFrame
+):
+    """Get the species x threat incidence matrix of one period.
+
+    A threat is matched by its level-2 name, or by its level-1 name for
+    threats without level 2.
+
+    Parameters
+    ----------
+    threat_column: pd.Series
+        The level-2 threat lists, e.g. threat_pre_2010, or their string form
+    threat_classification: pd.DataFrame
+        threat_name, threat_code
+
+    Returns
+    -------
+    species_threat_matrix: sparse.csr_matrix
+        1 where the species is threatened by the threat code
+    unmatched_threats: pd.Series
+        The number of threats without a threat code, by threat name
+    """
+    threats = parse_threat_column(threat_column)
+    threat_names = threats.str.split(" | ", regex=False).str[-1]
+    threat_codes = threat_names.map(
+        dict(
+            zip(
+                threat_classification["threat_name"],
+                threat_classification["threat_code"],
+            )
+        )
+    )
+    matched = threat_codes.notna().to_numpy()
+
+    species_threat_matrix = sparse.csr_matrix(
+        (
+            np.ones(matched.sum()),
+            (
+                threats.index.to_numpy()[matched],
+                threat_codes.to_numpy()[matched].astype(int) - 1,
+            ),
+        ),
+        shape=(len(threat_column), int(threat_classification["threat_code"].max())),
+    )
+    species_threat_matrix.data[:] = 1
+    unmatched_threats = threats[~matched].value_counts()
+    return species_threat_matrix, unmatched_threats
+
+
+def get_threat_code_strings(species_threat_matrix: sparse.csr_matrix):
+    """Get the comma-separated threat codes of each species, as used in MATLAB."""
+    species_threat_matrix = species_threat_matrix.tocsr()
+    species_threat_matrix.sort_indices()
+    codes = (species_threat_matrix.indices + 1).astype(str)
+    return [
+        ",".join(codes[start:end])
+        for start, end in zip(
+            species_threat_matrix.indptr[:-1], species_threat_matrix.indptr[1:]
+        )
+    ]
+
+
+if __name__ == "__main__":
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    logging.info("Read the concordance tables")
+    threat_classification, threat_sector = load_concordance()
+    n_threats = int(threat_classification["threat_code"].max())
+    threat_sector_matrix = build_threat_sector_matrix(threat_sector, n_threats)
+
+    logging.info("Read the combined species assessments")
+    path_assessments = path_data_raw / "iucn_species_assessment_details_time_series.csv"
+    periods = get_periods(pd.read_csv(path_assessments, nrows=0).columns, "threat_")
+    encoded = all(
+        (path_data_raw / f"iucn_{table_name}.parquet").exists()
+        for table_name in ["species", "threats", "species_threats"]
+    )
+    species_assessments = pd.read_csv(
+        path_assessments,
+        usecols=["scientific_name", "species_sis_id", "type"]
+        + ([] if encoded else [f"threat_{period}" for period in periods]),
+    )
+    if encoded:
+        logging.info("Read the encoded threats of the species")
+        species_threats = load_species_threats()
+
+    path_data_mapping.mkdir(parents=True, exist_ok=True)
+    species_index = species_assessments[
+        ["scientific_name", "species_sis_id", "type"]
+    ].copy()
+    for period in periods:
+        logging.info(f"Map the threats of {period} to threat codes")
+        if encoded:
+            threat_column = get_period_threat_column(
+                species_threats, species_assessments["scientific_name"], period
+            )
+        else:
+            threat_column = species_assessments.set_index("scientific_name")[
+                f"threat_{period}"
+            ]
+        species_threat_matrix, unmatched_threats = build_species_threat_matrix(
+            threat_column, threat_classification
+        )
+        if len(unmatched_threats):
+            logging.warning(
+                f"{unmatched_threats.sum()} threats of {period} have no threat code: "
+                f"{unmatched_threats.index.tolist()}"
+            )
+        sparse.save_npz(
+            path_data_mapping / f"species_threat_{period}.npz", species_threat_matrix
+        )
+        species_index[f"threat_{period}_num"] = get_threat_code_strings(
+            species_threat_matrix
+        )
+
+    logging.info("Done, save data")
+    sparse.save_npz(path_data_mapping / "threat_sector.npz", threat_sector_matrix)
+    species_index.to_csv(path_data_mapping / "species_index.csv", index=False)
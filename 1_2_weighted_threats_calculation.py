@@ -0,0 +1,197 @@
+"""
+Created: Sunday 18 October 2026
+Description: Scripts to calculate the country weights of red list species
+Scope: biodiversity threat project of Ling Zhang
+"""
+
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Read the variable
+data_home = Path("./data")
+current_version = "v.6.2025"
+current_project = "bio_threat"
+
+path_data_raw = data_home / "raw_data" / current_project / current_version
+path_data_weights = path_data_raw / "species_weights"
+path_data_hf = path_data_raw / "species_country_hf.csv"  # df1_hf_time2
+path_data_land = path_data_raw / "species_country_land.csv"  # df1_land_time2
+path_data_country_id = data_home / "raw_data" / "country_ID.csv"  # country_ID
+
+
+def get_group_shares(values: np.ndarray, groups: np.ndarray):
+    """Get the share of every value in the total of its group.
+
+    Values of groups with a zero total get a share of 0, like the nonzero
+    guard in MATLAB.
+
+    Parameters
+    ----------
+    values: np.ndarray
+    groups: np.ndarray
+        The group code of every value, starting from 0
+
+    Returns
+    -------
+    shares: np.ndarray
+    """
+    totals = np.bincount(groups, weights=values)[groups]
+    return np.divide(values, totals, out=np.zeros(len(values)), where=totals != 0)
+
+
+def to_species_country_table(
+    data: pd.DataFrame, prefix: str, country_ids: pd.DataFrame
+):
+    """Get the long table of one indicator by species, IO country and period.
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        sci_name, country and the {prefix}_{period} columns, e.g. hf_pre_2010
+    prefix: str
+        The prefix of the value columns, "hf" or "land"
+    country_ids: pd.DataFrame
+        shp_country, IO_id
+
+    Returns
+    -------
+    species_country: pd.DataFrame
+        scientific_name, country_io_id, period, {prefix}
+    """
+    value_columns = [
+        column for column in data.columns if column.startswith(f"{prefix}_")
+    ]
+    country_io_id = data["country"].map(
+        dict(zip(country_ids["shp_country"], country_ids["IO_id"]))
+    )
+    n_unmatched = country_io_id.isna().sum()
+    if n_unmatched:
+        logging.warning(
+            f"{n_unmatched} {prefix} rows without IO country are removed: "
+            f"{data.loc[country_io_id.isna(), 'country'].unique().tolist()}"
+        )
+
+    species_country = (
+        data.assign(country_io_id=country_io_id)
+        .dropna(subset=["country_io_id"])
+        .rename(columns={"sci_name": "scientific_name"})
+        .melt(
+            id_vars=["scientific_name", "country_io_id"],
+            value_vars=value_columns,
+            var_name="period",
+            value_name=prefix,
+        )
+    )
+    species_country["period"] = species_country["period"].str[len(prefix) + 1 :]
+    species_country["country_io_id"] = species_country["country_io_id"].astype(int)
+    species_country[prefix] = species_country[prefix].fillna(0)
+    # Several shape countries may belong to one IO country
+    return species_country.groupby(
+        ["scientific_name", "period", "country_io_id"], as_index=False, sort=True
+    )[prefix].sum()
+
+
+def compute_species_country_weights(
+    human_footprint: pd.DataFrame,
+    land_area: pd.DataFrame,
+    country_ids: pd.DataFrame,
+    species_ids: pd.DataFrame = None,
+):
+    """Compute the country weights of Eq. 2-4 for all species and periods.
+
+    Parameters
+    ----------
+    human_footprint: pd.DataFrame
+        sci_name, country, hf_pre_2010, hf_post_2010, ...
+    land_area: pd.DataFrame
+        sci_name, country, land_pre_2010, land_post_2010, ...
+    country_ids: pd.DataFrame
+        shp_country, IO_id
+    species_ids: pd.DataFrame
+        scientific_name, species_sis_id, the species id table of the scraper
+
+    Returns
+    -------
+    species_weights: pd.DataFrame
+        species_sis_id, scientific_name, country_io_id, period, alpha, beta, eta
+    """
+    species_weights = pd.merge(
+        to_species_country_table(land_area, "land", country_ids),
+        to_species_country_table(human_footprint, "hf", country_ids),
+        on=["scientific_name", "period", "country_io_id"],
+        how="outer",
+        sort=True,
+    ).fillna({"land": 0, "hf": 0})
+
+    species_codes = pd.factorize(species_weights["scientific_name"])[0]
+    period_codes, periods = pd.factorize(species_weights["period"])
+    groups = species_codes * len(periods) + period_codes
+
+    species_weights["alpha"] = get_group_shares(
+        species_weights["land"].to_numpy(dtype=float), groups
+    )
+    species_weights["beta"] = get_group_shares(
+        species_weights["hf"].to_numpy(dtype=float), groups
+    )
+    species_weights["eta"] = get_group_shares(
+        (species_weights["alpha"] * species_weights["beta"]).to_numpy(), groups
+    )
+
+    if species_ids is not None:
+        species_sis_ids = dict(
+            zip(species_ids["scientific_name"], species_ids["species_sis_id"])
+        )
+        species_weights["species_sis_id"] = (
+            species_weights["scientific_name"].map(species_sis_ids).astype("Int64")
+        )
+    else:
+        species_weights["species_sis_id"] = pd.array(
+            [pd.NA] * len(species_weights), dtype="Int64"
+        )
+
+    return species_weights[
+        [
+            "species_sis_id",
+            "scientific_name",
+            "country_io_id",
+            "period",
+            "alpha",
+            "beta",
+            "eta",
+        ]
+    ].reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    logging.info("Read the human footprint and land area of species")
+    human_footprint = pd.read_csv(path_data_hf)
+    land_area = pd.read_csv(path_data_land)
+    country_ids = pd.read_csv(path_data_country_id)
+    path_species_ids = path_data_raw / "species_id_table.csv"
+    species_ids = (
+        pd.read_csv(path_species_ids) if path_species_ids.exists() else None
+    )
+
+    logging.info("Calculate the country weights of species")
+    species_weights = compute_species_country_weights(
+        human_footprint, land_area, country_ids, species_ids
+    )
+    n_unresolved = species_weights["species_sis_id"].isna().sum()
+    if n_unresolved:
+        logging.warning(f"{n_unresolved} weight rows without species sis id")
+
+    logging.info("Done, save data")
+    path_data_weights.mkdir(parents=True, exist_ok=True)
+    species_weights.to_parquet(
+        path_data_weights / "species_country_weights.parquet", index=False
+    )
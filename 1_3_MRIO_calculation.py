@@ -0,0 +1,495 @@
+"""
+Created: Sunday 18 October 2026
+Description: Scripts to trace biodiversity threats along global supply chains
+Scope: biodiversity threat project of Ling Zhang
+"""
+
+import hashlib
+import importlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy.linalg
+import scipy.sparse.linalg
+from scipy import sparse
+
+satellite_account = importlib.import_module("1_3_satellite_account")
+
+# Read the variable
+data_home = Path("./data")
+current_version = "v.6.2025"
+current_project = "bio_threat"
+
+path_data_raw = data_home / "raw_data" / current_project / current_version
+path_data_satellite = path_data_raw / "satellite"
+path_data_footprint = path_data_raw / "footprint"
+path_data_leontief = data_home / "raw_data" / "eora" / "leontief_cache"
+
+N_SECTORS = satellite_account.N_SECTORS
+N_COUNTRIES = satellite_account.N_COUNTRIES
+
+
+def get_technical_coefficients(Z, X: np.ndarray):
+    """Get A = Z ./ X', with NaN and Inf replaced by 0, sparse if Z is sparse."""
+    if sparse.issparse(Z):
+        X = np.asarray(X, dtype=float).ravel()
+        inverse_output = np.divide(1.0, X, out=np.zeros(len(X)), where=X != 0)
+        A = sparse.csr_matrix(Z, dtype=float) @ sparse.diags(inverse_output)
+        A.data[~np.isfinite(A.data)] = 0
+        A.eliminate_zeros()
+        return A
+    with np.errstate(divide="ignore", invalid="ignore"):
+        A = np.asarray(Z, dtype=float) / np.asarray(X, dtype=float).ravel()[None, :]
+    A[~np.isfinite(A)] = 0
+    return A
+
+
+class LeontiefOperator:
+    """The Leontief inverse L = (I - A)^-1, without forming it.
+
+    I - A is factorized once, with a dense LU, or a sparse LU when A is
+    sparse, and L is applied through triangular solves. For very large
+    tables, the power series L = I + A + A^2 + ... can be used instead,
+    truncated when the added term is below the tolerance.
+    """
+
+    def __init__(
+        self,
+        A,
+        method: str = "auto",
+        tol: float = 1e-10,
+        max_iter: int = 1000,
+    ):
+        """
+        Parameters
+        ----------
+        A: np.ndarray or sparse matrix
+            The technical coefficient matrix
+        method: str
+            "lu", "splu", "series", or "auto" to use "splu" for sparse A
+        tol: float
+            The relative tolerance of the power series
+        max_iter: int
+            The maximum number of power series terms
+        """
+        if method == "auto":
+            method = "splu" if sparse.issparse(A) else "lu"
+        if method not in ("lu", "splu", "series"):
+            raise ValueError(f"Unknown Leontief method {method}")
+        self.method = method
+        self.tol = tol
+        self.max_iter = max_iter
+        self.n = A.shape[0]
+
+        if method == "lu":
+            A = A.toarray() if sparse.issparse(A) else np.asarray(A, dtype=float)
+            self._lu = scipy.linalg.lu_factor(
+                np.eye(self.n) - A, overwrite_a=True, check_finite=False
+            )
+        elif method == "splu":
+            self._lu = scipy.sparse.linalg.splu(
+                (sparse.identity(self.n) - sparse.csc_matrix(A)).tocsc()
+            )
+        else:
+            self.A = sparse.csr_matrix(A) if sparse.issparse(A) else np.asarray(A)
+
+    @classmethod
+    def from_flows(cls, Z, X, **kwargs):
+        """Get the operator of A = Z ./ X', with NaN and Inf replaced by 0."""
+        return cls(get_technical_coefficients(Z, X), **kwargs)
+
+    @classmethod
+    def from_lu(cls, lu: np.ndarray, piv: np.ndarray):
+        """Get the operator of a dense LU factorization of I - A, e.g. cached."""
+        operator = cls.__new__(cls)
+        operator.method = "lu"
+        operator.n = lu.shape[0]
+        operator._lu = (lu, piv)
+        return operator
+
+    def _series(self, B: np.ndarray, transpose: bool):
+        A = self.A.T if transpose else self.A
+        result = B.copy()
+        term = B
+        scale = max(np.abs(B).max(), np.finfo(float).tiny)
+        for _ in range(self.max_iter):
+            term = A @ term
+            result += term
+            if np.abs(term).max() <= self.tol * scale:
+                return result
+        logging.warning(
+            f"Leontief power series not converged after {self.max_iter} terms"
+        )
+        return result
+
+    def _solve(self, B: np.ndarray, transpose: bool):
+        B = np.asarray(B, dtype=float)
+        if self.method == "lu":
+            return scipy.linalg.lu_solve(
+                self._lu, B, trans=1 if transpose else 0, check_finite=False
+            )
+        elif self.method == "splu":
+            return self._lu.solve(B, trans="T" if transpose else "N")
+        return self._series(B, transpose)
+
+    def solve(self, Y: np.ndarray):
+        """Get L Y."""
+        return self._solve(Y, transpose=False)
+
+    def solve_T(self, F: np.ndarray):
+        """Get F L, for a row vector or the rows of a matrix F."""
+        return self._solve(np.asarray(F).T, transpose=True).T
+
+    def block(self, rows, columns):
+        """Get the block L[rows, columns]."""
+        columns = np.arange(self.n)[columns]
+        unit = np.zeros((self.n, len(columns)))
+        unit[columns, np.arange(len(columns))] = 1
+        return self.solve(unit)[rows]
+
+
+def compute_leontief_output(Z, X: np.ndarray, Y: np.ndarray, **kwargs):
+    """Get LY = (I - A)^-1 Y, the total output implied by the final demand."""
+    return LeontiefOperator.from_flows(Z, X, **kwargs).solve(Y)
+
+
+def hash_arrays(*arrays):
+    """Get the sha256 of the dtype, shape and content of dense or sparse arrays."""
+    digest = hashlib.sha256()
+    for array in arrays:
+        if sparse.issparse(array):
+            array = sparse.csr_matrix(array)
+            array.sum_duplicates()
+            parts = [array.data, array.indices, array.indptr]
+            digest.update(f"sparse{array.shape}".encode("utf-8"))
+        else:
+            parts = [np.asarray(array)]
+        for part in parts:
+            part = np.ascontiguousarray(part)
+            digest.update(f"{part.dtype.str}{part.shape}".encode("utf-8"))
+            # hash in 64 MB chunks to keep memory-mapped inputs out of memory
+            flat = part.reshape(-1).view(np.uint8)
+            for start in range(0, len(flat), 64 * 1024**2):
+                digest.update(flat[start : start + 64 * 1024**2])
+    return digest.hexdigest()
+
+
+class LeontiefCache:
+    """Persistent cache of A, the factorization of I - A and LY.
+
+    Entries are .npy files keyed by the sha256 of Z and X (A and the LU
+    factors) or of Z, X and Y (LY), and are opened memory-mapped, so runs
+    that only change the threat mapping skip the linear algebra.
+    """
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path) if path else path_data_leontief
+
+    def _save(self, entry: Path, name: str, array):
+        entry.mkdir(parents=True, exist_ok=True)
+        if sparse.issparse(array):
+            fd, tmp_name = tempfile.mkstemp(dir=entry, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                sparse.save_npz(f, sparse.csr_matrix(array))
+            os.replace(tmp_name, entry / f"{name}.npz")
+        else:
+            fd, tmp_name = tempfile.mkstemp(dir=entry, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.asarray(array))
+            os.replace(tmp_name, entry / f"{name}.npy")
+
+    @staticmethod
+    def _load(entry: Path, name: str):
+        if (entry / f"{name}.npz").exists():
+            return sparse.load_npz(entry / f"{name}.npz")
+        return np.load(entry / f"{name}.npy", mmap_mode="r")
+
+    def get_operator(self, Z, X: np.ndarray, method: str = "auto", **kwargs):
+        """Get the Leontief operator of Z and X, from the cache if possible.
+
+        The dense LU factors are cached. A sparse LU cannot be saved, so only
+        A is cached for the "splu" and "series" methods.
+        """
+        key = hash_arrays(Z, X)
+        entry = self.path / key
+        if method == "auto":
+            method = "splu" if sparse.issparse(Z) else "lu"
+
+        if method == "lu" and (entry / "lu.npy").exists():
+            logging.info(f"Leontief factorization {key[:12]} loaded from cache")
+            # the pivots are small, and lu_solve fails on read-only memory-mapped ones
+            operator = LeontiefOperator.from_lu(
+                self._load(entry, "lu"), np.array(self._load(entry, "piv"))
+            )
+        elif method != "lu" and any(entry.glob("A.np[yz]")):
+            logging.info(f"Technical coefficients {key[:12]} loaded from cache")
+            operator = LeontiefOperator(self._load(entry, "A"), method, **kwargs)
+        else:
+            A = get_technical_coefficients(Z, X)
+            self._save(entry, "A", A)
+            operator = LeontiefOperator(A, method, **kwargs)
+            if method == "lu":
+                self._save(entry, "lu", operator._lu[0])
+                self._save(entry, "piv", operator._lu[1])
+            with open(entry / "meta.json", "w", encoding="utf-8") as f:
+                json.dump({"shape": list(A.shape), "method": method}, f)
+        operator.cache_key = key
+        return operator
+
+    @staticmethod
+    def get_output_key(operator: LeontiefOperator, Y: np.ndarray):
+        """Get the key of LY, the key of Z and X followed by the hash of Y."""
+        # LY entries live under the entry of Z and X, so the hash of Y is enough
+        return f"{operator.cache_key}/LY/{hash_arrays(Y)}"
+
+    def get_leontief_output(self, operator: LeontiefOperator, Y: np.ndarray):
+        """Get LY of a cached operator, from the cache if possible."""
+        key = self.get_output_key(operator, Y)
+        LY_file = self.path / f"{key}.npy"
+        if LY_file.exists():
+            logging.info(f"Leontief output {LY_file.stem[:12]} loaded from cache")
+        else:
+            self._save(LY_file.parent, LY_file.stem, operator.solve(Y))
+        return self.load_leontief_output(key)
+
+    def load_leontief_output(self, key: str):
+        """Load a cached LY, memory-mapped, by its key of `get_output_key`."""
+        LY_file = self.path / f"{key}.npy"
+        if not LY_file.exists():
+            raise FileNotFoundError(
+                f"Leontief output {key} not in the cache {self.path}, "
+                "run the MRIO calculation again"
+            )
+        return self._load(LY_file.parent, LY_file.stem)
+
+
+def get_aggregation_matrix(n_rows: int, n_groups: int):
+    """Get the rows x groups matrix summing consecutive blocks of rows."""
+    block_size = n_rows // n_groups
+    return sparse.csr_matrix(
+        (np.ones(n_rows), (np.arange(n_rows), np.arange(n_rows) // block_size)),
+        shape=(n_rows, n_groups),
+    )
+
+
+def get_type_intensity(
+    satellite_account: sparse.csr_matrix, species_types: pd.Series, types: list = None
+):
+    """Sum the Bio rows of every species class in one sparse product.
+
+    Parameters
+    ----------
+    satellite_account: sparse.csr_matrix
+    species_types: pd.Series
+        The species class of every row
+    types: list
+        The species classes of the intensity rows, default is the sorted
+        classes of species_types
+
+    Returns
+    -------
+    types: list
+        The species classes
+    intensity: np.ndarray
+        types x (country, sector)
+    """
+    if types is None:
+        type_codes, types = pd.factorize(pd.Series(species_types), sort=True)
+    else:
+        type_codes = pd.Index(types).get_indexer(pd.Series(species_types))
+    matched = type_codes >= 0
+    type_species = sparse.csr_matrix(
+        (
+            np.ones(matched.sum()),
+            (type_codes[matched], np.flatnonzero(matched)),
+        ),
+        shape=(len(types), satellite_account.shape[0]),
+    )
+    return list(types), (type_species @ satellite_account).toarray()
+
+
+class FactoredFootprint:
+    """Footprints of species classes stored as intensity vectors and a shared LY.
+
+    The footprint of class t is diag(s_t) LY, with s_t the sum of the Bio rows
+    of the species of class t, so only s_t and LY are kept. Aggregated views
+    are computed from LY aggregated to consumer countries, and the full
+    (country, sector) x consumer flows are streamed block by block. An LY
+    from the LeontiefCache is saved as its cache key, not as a copy.
+    """
+
+    def __init__(
+        self,
+        types,
+        intensity: np.ndarray,
+        LY: np.ndarray,
+        n_countries: int = N_COUNTRIES,
+        LY_key: str = None,
+    ):
+        """
+        Parameters
+        ----------
+        types: list
+            The species class of every intensity row
+        intensity: np.ndarray
+            types x (country, sector), the summed Bio rows
+        LY: np.ndarray
+            (country, sector) x final demand columns, ordered by country
+        n_countries: int
+        LY_key: str
+            The key of LY in the LeontiefCache, if it is cached
+        """
+        self.types = list(types)
+        self.intensity = np.asarray(intensity, dtype=float)
+        self.LY = LY
+        self.n_countries = n_countries
+        self.LY_key = LY_key
+        self.n_sectors = self.intensity.shape[1] // n_countries
+        self._producer_country = get_aggregation_matrix(
+            self.intensity.shape[1], n_countries
+        )
+        self._LY_country = np.asarray(
+            (get_aggregation_matrix(LY.shape[1], n_countries).T @ LY.T).T
+        )
+
+    @classmethod
+    def from_satellite_account(
+        cls,
+        satellite_account: sparse.csr_matrix,
+        species_types: pd.Series,
+        LY: np.ndarray,
+        n_countries: int = N_COUNTRIES,
+        LY_key: str = None,
+    ):
+        """Get the footprints of every species class of the satellite account."""
+        types, intensity = get_type_intensity(satellite_account, species_types)
+        return cls(types, intensity, LY, n_countries, LY_key)
+
+    def _get_intensity(self, species_type: str):
+        return self.intensity[self.types.index(species_type)]
+
+    def total(self, species_type: str):
+        """Get the total footprint of a species class."""
+        return float(self._get_intensity(species_type) @ self._LY_country.sum(axis=1))
+
+    def sector_country(self, species_type: str):
+        """Get the producer (country, sector) x consumer country footprint."""
+        return self._get_intensity(species_type)[:, None] * self._LY_country
+
+    def country_country(self, species_type: str):
+        """Get the producer country x consumer country footprint."""
+        return np.asarray(
+            self._producer_country.T @ self.sector_country(species_type)
+        )
+
+    def iter_full(self, species_type: str, block_size: int = 1024):
+        """Stream the full footprint, diag(s) LY, by blocks of producer rows.
+
+        Yields
+        ------
+        start: int
+            The first producer row of the block
+        block: np.ndarray
+            block rows x final demand columns
+        """
+        intensity = self._get_intensity(species_type)
+        for start in range(0, len(intensity), block_size):
+            end = min(start + block_size, len(intensity))
+            yield start, intensity[start:end, None] * np.asarray(self.LY[start:end])
+
+    def save(self, path: Path):
+        """Save the factored form to a .npz file.
+
+        The intensity vectors are saved with the cache key of LY, or with a
+        copy of LY if it is not cached.
+        """
+        if self.LY_key is not None:
+            LY = {"LY_key": self.LY_key}
+        else:
+            LY = {"LY": np.asarray(self.LY)}
+        np.savez(
+            path,
+            types=np.array(self.types, dtype=str),
+            intensity=self.intensity,
+            n_countries=self.n_countries,
+            **LY,
+        )
+
+    @classmethod
+    def load(cls, path: Path, cache: LeontiefCache = None):
+        """Load the factored form, with LY memory-mapped from the cache.
+
+        Parameters
+        ----------
+        path: Path
+            The .npz file
+        cache: LeontiefCache
+            The cache of LY, default is the cache of the Eora tables
+        """
+        with np.load(path) as data:
+            if "LY_key" in data:
+                LY_key = str(data["LY_key"])
+                cache = cache if cache else LeontiefCache()
+                LY = cache.load_leontief_output(LY_key)
+            else:
+                LY_key, LY = None, data["LY"]
+            return cls(
+                data["types"].tolist(),
+                data["intensity"],
+                LY,
+                int(data["n_countries"]),
+                LY_key,
+            )
+
+
+if __name__ == "__main__":
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    bio_index = pd.read_csv(path_data_satellite / "bio_index.csv")
+    periods = sorted(
+        file.stem[len("bio_") :] for file in path_data_satellite.glob("bio_*.npz")
+    )
+
+    leontief_cache = LeontiefCache()
+    path_data_footprint.mkdir(parents=True, exist_ok=True)
+    for period in periods:
+        logging.info(f"Calculate the Leontief output of {period}")
+        leontief = leontief_cache.get_operator(
+            satellite_account.load_eora_table("Z", period),
+            satellite_account.load_eora_table("X", period),
+        )
+        Y = satellite_account.load_eora_table("Y", period)
+        LY = leontief_cache.get_leontief_output(leontief, Y)
+
+        logging.info(f"Calculate the footprints of {period}")
+        footprint = FactoredFootprint.from_satellite_account(
+            sparse.load_npz(path_data_satellite / f"bio_{period}.npz"),
+            bio_index["type"],
+            LY,
+            LY_key=leontief_cache.get_output_key(leontief, Y),
+        )
+        footprint.save(path_data_footprint / f"footprint_{period}.npz")
+        np.savez_compressed(
+            path_data_footprint / f"footprint_country_{period}.npz",
+            **{
+                f"acc_bf_{species_type}": footprint.country_country(species_type)
+                for species_type in footprint.types
+            },
+        )
+        for species_type in footprint.types:
+            logging.info(
+                f"Footprint of {species_type} in {period}: "
+                f"{footprint.total(species_type):.6f}"
+            )
+
+    logging.info("Done")
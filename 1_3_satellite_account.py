@@ -0,0 +1,278 @@
+"""
+Created: Sunday 18 October 2026
+Description: Scripts to build the biodiversity threat satellite account (Bio)
+Scope: biodiversity threat project of Ling Zhang
+"""
+
+import importlib
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+sector_mapping = importlib.import_module("1_1_sector_mapping")
+
+# Read the variable
+data_home = Path("./data")
+current_version = "v.6.2025"
+current_project = "bio_threat"
+
+path_data_raw = data_home / "raw_data" / current_project / current_version
+path_data_mapping = path_data_raw / "sector_mapping"
+path_data_weights = path_data_raw / "species_weights"
+path_data_satellite = path_data_raw / "satellite"
+path_data_eora = data_home / "raw_data" / "eora"
+
+N_SECTORS = sector_mapping.N_SECTORS
+N_COUNTRIES = 189  # countries in the Eora MRIO tables
+
+
+def load_eora_table(name: str, period: str, path: Path = None):
+    """Load one Eora table of a period, e.g. X_pre_2010.
+
+    Parameters
+    ----------
+    name: str
+        The name of the table, e.g. Z, X, Y, E
+    period: str
+        The period of the table, e.g. pre_2010
+    path: Path
+        The folder of the Eora tables, with .npy, .csv or .txt files
+
+    Returns
+    -------
+    table: np.ndarray
+    """
+    path = path if path else path_data_eora
+    file_name = path / f"{name}_{period}"
+    if file_name.with_suffix(".npy").exists():
+        return np.load(file_name.with_suffix(".npy"), mmap_mode="r")
+    elif file_name.with_suffix(".csv").exists():
+        return np.loadtxt(file_name.with_suffix(".csv"), delimiter=",")
+    elif file_name.with_suffix(".txt").exists():
+        return np.loadtxt(file_name.with_suffix(".txt"))
+    raise FileNotFoundError(f"Eora table {file_name} (.npy, .csv or .txt) not found")
+
+
+def get_country_expansion(n_countries: int = N_COUNTRIES, n_sectors: int = N_SECTORS):
+    """Get the country x (country, sector) matrix, (r - 1) * n_sectors + i in MATLAB."""
+    return sparse.kron(
+        sparse.identity(n_countries, format="csr"),
+        np.ones((1, n_sectors)),
+        format="csr",
+    )
+
+
+def get_country_weight_matrix(
+    species_weights: pd.DataFrame,
+    species_names: pd.Series,
+    period: str,
+    n_countries: int = N_COUNTRIES,
+):
+    """Get the species x country allocation fraction (eta) matrix of one period.
+
+    Parameters
+    ----------
+    species_weights: pd.DataFrame
+        scientific_name, country_io_id (starting from 1), period, eta
+    species_names: pd.Series
+        The scientific names of the rows of the satellite account
+    period: str
+        The period of the weights, e.g. pre_2010
+
+    Returns
+    -------
+    eta: sparse.csr_matrix
+        Species without weights get an empty row
+    """
+    species_weights = species_weights[species_weights["period"] == period]
+    species_rows = pd.Index(species_names).get_indexer(
+        species_weights["scientific_name"]
+    )
+    matched = species_rows >= 0
+    return sparse.csr_matrix(
+        (
+            species_weights["eta"].to_numpy()[matched],
+            (
+                species_rows[matched],
+                species_weights["country_io_id"].to_numpy()[matched] - 1,
+            ),
+        ),
+        shape=(len(species_names), n_countries),
+    )
+
+
+def get_threat_allocation_base(
+    threat_sector_matrix: sparse.csr_matrix,
+    output: np.ndarray,
+    emission: np.ndarray,
+    climate_related: np.ndarray,
+):
+    """Get the threat x (country, sector) allocation base, the numerator of Eq. 1.
+
+    Parameters
+    ----------
+    threat_sector_matrix: sparse.csr_matrix
+        threat x sector incidence of the concordance
+    output: np.ndarray
+        The sectoral gross output x of every (country, sector)
+    emission: np.ndarray
+        The sectoral GHG emissions E of every (country, sector)
+    climate_related: np.ndarray
+        True for the threats allocated by GHG emissions instead of output
+
+    Returns
+    -------
+    allocation_base: np.ndarray
+        x or E where the sector causes the threat, otherwise 0
+    """
+    n_countries = len(output) // threat_sector_matrix.shape[1]
+    threat_incidence = sparse.hstack([threat_sector_matrix] * n_countries).toarray()
+    sector_values = np.where(
+        np.asarray(climate_related, dtype=bool)[:, None],
+        np.asarray(emission, dtype=float).ravel()[None, :],
+        np.asarray(output, dtype=float).ravel()[None, :],
+    )
+    return threat_incidence * sector_values
+
+
+def build_satellite_account(
+    species_threat_matrix: sparse.csr_matrix,
+    eta: sparse.csr_matrix,
+    allocation_base: np.ndarray,
+    species_weight: np.ndarray = None,
+    chunk_size: int = 20000,
+    max_block_entries: int = 1 << 22,
+):
+    """Build the Bio rows of all species with Eq. 1 and the threat normalization.
+
+    For species p, threat q is allocated to (country r, sector i) by
+    B = eta_r * base_q,ri / sum_s,j (eta_s * base_q,sj), and the h threats of
+    the species share one unit, so Bio_p = 1 / h * sum_q B. Threats without
+    any allocation base in the range of the species are not counted in h.
+    Only the (country, sector) cells in the range of the species are
+    evaluated, chunk by chunk of species.
+
+    Parameters
+    ----------
+    species_threat_matrix: sparse.csr_matrix
+        species x threat incidence
+    eta: sparse.csr_matrix
+        species x country allocation fraction
+    allocation_base: np.ndarray
+        threat x (country, sector) allocation base
+    species_weight: np.ndarray
+        The weight of each species row, default is 1
+    chunk_size: int
+        The number of species per chunk
+    max_block_entries: int
+        The maximum number of cell x threat entries evaluated at once
+
+    Returns
+    -------
+    satellite_account: sparse.csr_matrix
+        species x (country, sector)
+    """
+    n_species, n_countries = eta.shape
+    n_sectors = allocation_base.shape[1] // n_countries
+    expansion = get_country_expansion(n_countries, n_sectors)
+    country_base = sparse.csr_matrix(allocation_base) @ expansion.T
+    species_threat_matrix = species_threat_matrix.tocsr()
+    eta = eta.tocsr()
+    allocation_base_t = np.ascontiguousarray(allocation_base.T)
+    block_size = max(1, max_block_entries // max(1, allocation_base.shape[0]))
+
+    satellite_chunks = []
+    for start in range(0, n_species, chunk_size):
+        end = min(start + chunk_size, n_species)
+        eta_chunk = eta[start:end]
+
+        # Denominator of Eq. 1 for every species and threat
+        denominator = species_threat_matrix[start:end].multiply(
+            (eta_chunk @ country_base.T).toarray()
+        )
+        denominator = sparse.csr_matrix(denominator)
+        denominator.eliminate_zeros()
+        threat_count = np.diff(denominator.indptr)
+        scale = np.divide(
+            1.0,
+            threat_count,
+            out=np.zeros(len(threat_count)),
+            where=threat_count > 0,
+        )
+        if species_weight is not None:
+            scale = scale * species_weight[start:end]
+        threat_share = denominator.copy()
+        threat_share.data = 1.0 / threat_share.data
+        threat_share = (sparse.diags(scale) @ threat_share).toarray()
+
+        # Evaluate only the (country, sector) cells in the range of the species,
+        # block by block of cells to bound the gathered cell x threat arrays
+        eta_expanded = (eta_chunk @ expansion).tocoo()
+        values = np.empty(eta_expanded.nnz)
+        for block in range(0, eta_expanded.nnz, block_size):
+            cells = slice(block, block + block_size)
+            values[cells] = eta_expanded.data[cells] * np.einsum(
+                "kq,kq->k",
+                threat_share[eta_expanded.row[cells]],
+                allocation_base_t[eta_expanded.col[cells]],
+            )
+        satellite_chunk = sparse.csr_matrix(
+            (values, (eta_expanded.row, eta_expanded.col)),
+            shape=(end - start, allocation_base.shape[1]),
+        )
+        satellite_chunk.eliminate_zeros()
+        satellite_chunks.append(satellite_chunk)
+        logging.info(f"Satellite account of species {end}/{n_species} built")
+
+    if not satellite_chunks:
+        return sparse.csr_matrix((0, allocation_base.shape[1]))
+    return sparse.vstack(satellite_chunks, format="csr")
+
+
+if __name__ == "__main__":
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    logging.info("Read the threat mapping and species weights")
+    threat_classification, _ = sector_mapping.load_concordance()
+    climate_related = (
+        threat_classification.groupby("threat_code")["climate_related"]
+        .max()
+        .to_numpy()
+    )
+    threat_sector_matrix = sparse.load_npz(path_data_mapping / "threat_sector.npz")
+    species_index = pd.read_csv(path_data_mapping / "species_index.csv")
+    species_weights = pd.read_parquet(
+        path_data_weights / "species_country_weights.parquet"
+    )
+    periods = sector_mapping.get_periods(species_index.columns, "threat_", "_num")
+
+    path_data_satellite.mkdir(parents=True, exist_ok=True)
+    for period in periods:
+        logging.info(f"Build the satellite account of {period}")
+        allocation_base = get_threat_allocation_base(
+            threat_sector_matrix,
+            output=load_eora_table("X", period),
+            emission=load_eora_table("E", period),
+            climate_related=climate_related,
+        )
+        satellite_account = build_satellite_account(
+            sparse.load_npz(path_data_mapping / f"species_threat_{period}.npz"),
+            get_country_weight_matrix(
+                species_weights, species_index["scientific_name"], period
+            ),
+            allocation_base,
+        )
+        sparse.save_npz(path_data_satellite / f"bio_{period}.npz", satellite_account)
+
+    logging.info("Done, save data")
+    species_index[["scientific_name", "species_sis_id", "type"]].to_csv(
+        path_data_satellite / "bio_index.csv", index=False
+    )
@@ -0,0 +1,256 @@
+"""
+Created: Sunday 18 October 2026
+Description: Scripts to decompose the changes of biodiversity footprints (SDA)
+Scope: biodiversity threat project of Ling Zhang
+"""
+
+import importlib
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+mrio_calculation = importlib.import_module("1_3_MRIO_calculation")
+satellite_account = importlib.import_module("1_3_satellite_account")
+sector_mapping = importlib.import_module("1_1_sector_mapping")
+
+# Read the variable
+data_home = Path("./data")
+current_version = "v.6.2025"
+current_project = "bio_threat"
+
+path_data_raw = data_home / "raw_data" / current_project / current_version
+path_data_mapping = path_data_raw / "sector_mapping"
+path_data_satellite = path_data_raw / "satellite"
+path_data_sda = path_data_raw / "sda"
+# table_pop, country and pop_{period} columns
+path_data_population = data_home / "raw_data" / "population.csv"
+
+N_FINAL_DEMAND = 6  # final demand categories per country in Eora
+
+# The four drivers of T = F L (S .* P')
+DRIVERS = ("F", "L", "S", "P")
+
+
+def get_polar_weight(others: tuple):
+    """Get the weight of a term in the 1/24 average of polar decompositions.
+
+    A term gets 6 when the other three drivers are all of the same period
+    and 2 otherwise, as in E_F, E_L, E_S and E_P of the MATLAB script.
+    """
+    return 6 if len(set(others)) == 1 else 2
+
+
+def aggregate_final_demand(
+    Y: np.ndarray, n_countries: int, n_categories: int = N_FINAL_DEMAND
+):
+    """Sum the final demand categories of every country, Y * sum_mat_y."""
+    return np.asarray(
+        (
+            mrio_calculation.get_aggregation_matrix(
+                n_countries * n_categories, n_countries
+            ).T
+            @ np.asarray(Y, dtype=float).T
+        ).T
+    )
+
+
+def get_intensity_products(F: list, leontief: list, pairs, max_workers: int = None):
+    """Get the products F_f L_l of the (f, l) pairs with transposed solves."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            (f, l): executor.submit(leontief[l].solve_T, F[f]) for f, l in set(pairs)
+        }
+        return {key: future.result() for key, future in futures.items()}
+
+
+def structural_decomposition(
+    F: tuple,
+    leontief: tuple,
+    S: tuple,
+    P: tuple,
+    max_workers: int = None,
+    FL: dict = None,
+):
+    """Decompose the change of T = F L (S .* P') between two periods.
+
+    All 32 triple products of the four effects are differences of the 16
+    products T_flsp = (F_f L_l) (S_s .* P_p'), f, l, s, p in {0, 1}. So the 4
+    products F_f L_l are computed with transposed Leontief solves, the 4
+    products S_s .* P_p' once, and the 16 T_flsp from them, in parallel.
+
+    Parameters
+    ----------
+    F: tuple
+        (F0, F1), the intensity row vectors, or matrices with one row per
+        species class
+    leontief: tuple
+        (L0, L1), the LeontiefOperator of every period
+    S: tuple
+        (S0, S1), the per-capita final demand, (country, sector) x country
+    P: tuple
+        (P0, P1), the population of every country
+    max_workers: int
+        The number of threads
+    FL: dict
+        The products F_f L_l already computed, by (f, l)
+
+    Returns
+    -------
+    decomposition: dict
+        T0, T1, E_F, E_L, E_S, E_P, E_total and the closure error
+        T1 - T0 - E_total, all rows x countries
+    """
+    F = [np.atleast_2d(np.asarray(F_, dtype=float)) for F_ in F]
+    P = [np.asarray(P_, dtype=float).ravel() for P_ in P]
+    S = [np.asarray(S_, dtype=float) for S_ in S]
+    periods = (0, 1)
+
+    if FL is None:
+        FL = get_intensity_products(
+            F, leontief, itertools.product(periods, periods), max_workers
+        )
+    SP = {(s, p): S[s] * P[p][None, :] for s, p in itertools.product(periods, periods)}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        T_futures = {
+            (f, l, s, p): executor.submit(np.matmul, FL[f, l], SP[s, p])
+            for f, l, s, p in itertools.product(periods, repeat=4)
+        }
+        T = {key: future.result() for key, future in T_futures.items()}
+
+    decomposition = {"T0": T[0, 0, 0, 0], "T1": T[1, 1, 1, 1]}
+    for position, driver in enumerate(DRIVERS):
+        effect = 0
+        for others in itertools.product(periods, repeat=3):
+            index_1 = others[:position] + (1,) + others[position:]
+            index_0 = others[:position] + (0,) + others[position:]
+            effect = effect + get_polar_weight(others) * (T[index_1] - T[index_0])
+        decomposition[f"E_{driver}"] = effect / 24
+    decomposition["E_total"] = sum(
+        decomposition[f"E_{driver}"] for driver in DRIVERS
+    )
+    decomposition["closure_error"] = (
+        decomposition["T1"] - decomposition["T0"] - decomposition["E_total"]
+    )
+    return decomposition
+
+
+def chained_decomposition(
+    F: list, leontief: list, S: list, P: list, max_workers: int = None
+):
+    """Decompose the changes between every two consecutive periods.
+
+    The products F_t L_t are shared by the two decompositions around period
+    t, so N periods take 3N - 2 transposed solves instead of 4(N - 1), with
+    the Leontief operator of every period built once.
+
+    Returns
+    -------
+    decompositions: list
+        The decomposition of every pair (t, t + 1)
+    """
+    F = [np.atleast_2d(np.asarray(F_, dtype=float)) for F_ in F]
+    pairs = [
+        pair
+        for t in range(len(F) - 1)
+        for pair in ((t, t), (t, t + 1), (t + 1, t), (t + 1, t + 1))
+    ]
+    FL = get_intensity_products(F, leontief, pairs, max_workers)
+    return [
+        structural_decomposition(
+            F[t : t + 2],
+            leontief[t : t + 2],
+            S[t : t + 2],
+            P[t : t + 2],
+            max_workers=max_workers,
+            FL={
+                (f, l): FL[t + f, t + l]
+                for f, l in itertools.product((0, 1), (0, 1))
+            },
+        )
+        for t in range(len(F) - 1)
+    ]
+
+
+def log_decomposition(decomposition: dict, title: str, country: int = None):
+    """Log the decomposition of one country (column), or the global total."""
+
+    def total(name):
+        values = decomposition[name]
+        return values[:, country].sum() if country is not None else values.sum()
+
+    logging.info(f"=== Full decomposition (E = F·L·Y), {title} ===")
+    logging.info(f"E0 (total)                 : {total('T0'):.6f}")
+    logging.info(f"E1 (total)                 : {total('T1'):.6f}")
+    logging.info(f"ΔE total                   : {total('E_total'):.6f}")
+    logging.info(f"  ΔE_F (Intensity, F)      : {total('E_F'):.6f}")
+    logging.info(f"  ΔE_L (Structure, L)      : {total('E_L'):.6f}")
+    logging.info(f"  ΔE_P (Population, P)     : {total('E_P'):.6f}")
+    logging.info(f"  ΔE_S (Per-capita FD, S)  : {total('E_S'):.6f}")
+    logging.info(f"Closure error              : {total('closure_error'):.3e}")
+
+
+if __name__ == "__main__":
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    population = pd.read_csv(path_data_population)
+    bio_index = pd.read_csv(path_data_satellite / "bio_index.csv")
+    periods = sector_mapping.get_periods(
+        pd.read_csv(path_data_mapping / "species_index.csv", nrows=0).columns,
+        "threat_",
+        "_num",
+    )
+    leontief_cache = mrio_calculation.LeontiefCache()
+
+    F, leontief, S, P = [], [], [], []
+    for period in periods:
+        logging.info(f"Prepare the drivers of {period}")
+        types, intensity = mrio_calculation.get_type_intensity(
+            sparse.load_npz(path_data_satellite / f"bio_{period}.npz"),
+            bio_index["type"],
+        )
+        F.append(intensity)
+        leontief.append(
+            leontief_cache.get_operator(
+                satellite_account.load_eora_table("Z", period),
+                satellite_account.load_eora_table("X", period),
+            )
+        )
+        P.append(population[f"pop_{period}"].to_numpy(dtype=float))
+        Y_country = aggregate_final_demand(
+            satellite_account.load_eora_table("FD", period), len(population)
+        )
+        S.append(Y_country / P[-1][None, :])
+
+    logging.info("Decompose the changes of footprints")
+    decompositions = chained_decomposition(F, leontief, S, P)
+
+    logging.info("Done, save data")
+    path_data_sda.mkdir(parents=True, exist_ok=True)
+    for t, decomposition in enumerate(decompositions):
+        period_pair = f"{periods[t]} to {periods[t + 1]}"
+        log_decomposition(decomposition, f"{period_pair}, country m = 40", country=39)
+        log_decomposition(decomposition, f"{period_pair}, global total")
+
+        E_table = pd.DataFrame(
+            {
+                "type": np.repeat(types, len(population)),
+                "country": np.tile(population.iloc[:, 0].to_numpy(), len(types)),
+                **{
+                    name: decomposition[name].ravel()
+                    for name in ("T0", "E_F", "E_L", "E_P", "E_S", "T1")
+                },
+            }
+        )
+        E_table.to_csv(
+            path_data_sda / f"sda_{periods[t]}_{periods[t + 1]}.csv", index=False
+        )
@@ -0,0 +1,327 @@
+"""
+Created: Sunday 18 October 2026
+Description: Scripts to evaluate the footprints of sensitivity scenarios in batch
+Scope: biodiversity threat project of Ling Zhang
+"""
+
+import importlib
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+scraper = importlib.import_module("0_data_scraper_iucn_red_list")
+sector_mapping = importlib.import_module("1_1_sector_mapping")
+weights_calculation = importlib.import_module("1_2_weighted_threats_calculation")
+satellite_account = importlib.import_module("1_3_satellite_account")
+mrio_calculation = importlib.import_module("1_3_MRIO_calculation")
+sda_analysis = importlib.import_module("1_4_SDA_analysis")
+
+# Read the variable
+data_home = Path("./data")
+current_version = "v.6.2025"
+current_project = "bio_threat"
+
+path_data_raw = data_home / "raw_data" / current_project / current_version
+path_data_weights = path_data_raw / "species_weights"
+path_data_scenarios = path_data_raw / "scenarios"
+
+# The Eora tables the pre and post periods of every scenario are evaluated with
+ECONOMIC_PERIODS = ("pre_2010", "post_2010")
+
+# How the country allocation fraction eta is derived from alpha and beta
+ALLOCATION_RULES = ("hf_la", "la", "hf")
+
+_scenario_context = {}
+
+
+def get_allocation_weights(species_weights: pd.DataFrame, rule: str):
+    """Get the species weights with eta of an allocation rule.
+
+    Parameters
+    ----------
+    species_weights: pd.DataFrame
+        scientific_name, country_io_id, period, alpha, beta
+    rule: str
+        "hf_la": eta from alpha * beta (Eq. 2), "la": land area only,
+        "hf": human footprint only
+
+    Returns
+    -------
+    species_weights: pd.DataFrame
+        with the eta of the rule
+    """
+    groups = pd.MultiIndex.from_frame(
+        species_weights[["scientific_name", "period"]]
+    ).factorize()[0]
+    if rule == "hf_la":
+        values = (species_weights["alpha"] * species_weights["beta"]).to_numpy()
+    elif rule == "la":
+        values = species_weights["alpha"].to_numpy(dtype=float)
+    elif rule == "hf":
+        values = species_weights["beta"].to_numpy(dtype=float)
+    else:
+        raise ValueError(f"Unknown allocation rule {rule}")
+    return species_weights.assign(
+        eta=weights_calculation.get_group_shares(values, groups)
+    )
+
+
+def build_scenario_grid(
+    split_years: list, category_weights: dict, allocation_rules: list = None
+):
+    """Get every combination of the scenario parameters.
+
+    Parameters
+    ----------
+    split_years: list
+        The years splitting the assessments into the pre and post period
+    category_weights: dict
+        name: red list category weight mapping, None to count every species once
+    allocation_rules: list
+        The rules of `get_allocation_weights`
+
+    Returns
+    -------
+    scenarios: pd.DataFrame
+        scenario, split_year, category_weights, allocation_rule
+    """
+    allocation_rules = allocation_rules if allocation_rules else ALLOCATION_RULES
+    scenarios = pd.DataFrame(
+        itertools.product(split_years, category_weights, allocation_rules),
+        columns=["split_year", "category_weights", "allocation_rule"],
+    )
+    scenarios.insert(0, "scenario", np.arange(len(scenarios)))
+    return scenarios
+
+
+def _init_scenario_worker(context: dict):
+    _scenario_context.update(context)
+
+
+def build_scenario_intensity(split_year: int, category_weights_name: str):
+    """Get the intensity F of the scenarios of one split year and weighting.
+
+    The assessments are combined once, and the satellite account is built
+    for every allocation rule.
+
+    Returns
+    -------
+    intensity: dict
+        (allocation_rule, economic period): types x (country, sector)
+    """
+    context = _scenario_context
+    category_weights = context["category_weights"][category_weights_name]
+    combined = scraper.combine_assessments(
+        context["assessments"],
+        threat_level_mapping=category_weights,
+        split_year=split_year,
+    )
+    period_labels = scraper.get_period_labels([split_year])
+
+    intensity = {}
+    for period_label, economic_period in zip(period_labels, ECONOMIC_PERIODS):
+        allocation_base = context["allocation_base"][economic_period]
+        species_threat_matrix, _ = sector_mapping.build_species_threat_matrix(
+            combined[f"threat_{period_label}"], context["threat_classification"]
+        )
+        species_weight = None
+        if category_weights is not None:
+            species_weight = (
+                combined[f"red_list_category_weight_{period_label}"]
+                .fillna(0)
+                .to_numpy(dtype=float)
+            )
+        for rule in context["allocation_rules"]:
+            eta = satellite_account.get_country_weight_matrix(
+                context["species_weights"][rule],
+                combined["scientific_name"],
+                economic_period,
+                n_countries=allocation_base.shape[1] // sector_mapping.N_SECTORS,
+            )
+            bio = satellite_account.build_satellite_account(
+                species_threat_matrix,
+                eta,
+                allocation_base,
+                species_weight=species_weight,
+            )
+            _, intensity[rule, economic_period] = mrio_calculation.get_type_intensity(
+                bio, combined["type"], context["types"]
+            )
+    return intensity
+
+
+def evaluate_scenarios(
+    scenarios: pd.DataFrame,
+    leontief: dict,
+    final_demand: dict,
+    context: dict,
+    types: list,
+    processes: int = None,
+):
+    """Evaluate the footprints T = F L Y of all scenarios.
+
+    The intensities F of the scenarios are built in a process pool, then,
+    since T is linear in F, the F of all scenarios are stacked and go
+    through one transposed Leontief solve per economic period.
+
+    Parameters
+    ----------
+    scenarios: pd.DataFrame
+        The grid of `build_scenario_grid`
+    leontief: dict
+        economic period: LeontiefOperator
+    final_demand: dict
+        economic period: final demand, (country, sector) x consumer country
+    context: dict
+        assessments, threat_classification, species_weights by rule,
+        allocation_base by economic period, category_weights by name
+    types: list
+        The sorted species classes of the assessments
+    processes: int
+        The number of processes
+
+    Returns
+    -------
+    footprints: pd.DataFrame
+        scenario, period, type, country_io_id, footprint
+    """
+    context = dict(
+        context,
+        types=types,
+        allocation_rules=sorted(scenarios["allocation_rule"].unique()),
+    )
+    groups = scenarios[["split_year", "category_weights"]].drop_duplicates()
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_init_scenario_worker,
+        initargs=(context,),
+    ) as executor:
+        group_intensity = dict(
+            zip(
+                map(tuple, groups.to_numpy()),
+                executor.map(
+                    build_scenario_intensity,
+                    groups["split_year"],
+                    groups["category_weights"],
+                ),
+            )
+        )
+    logging.info(f"Intensity of {len(scenarios)} scenarios built")
+
+    footprints = []
+    for economic_period in ECONOMIC_PERIODS:
+        F = np.vstack(
+            [
+                group_intensity[split_year, category_weights][rule, economic_period]
+                for split_year, category_weights, rule in scenarios[
+                    ["split_year", "category_weights", "allocation_rule"]
+                ].to_numpy()
+            ]
+        )
+        T = leontief[economic_period].solve_T(F) @ final_demand[economic_period]
+        n_countries = T.shape[1]
+        footprints.append(
+            pd.DataFrame(
+                {
+                    "scenario": np.repeat(
+                        scenarios["scenario"].to_numpy(), len(types) * n_countries
+                    ),
+                    "period": economic_period,
+                    "type": np.tile(np.repeat(types, n_countries), len(scenarios)),
+                    "country_io_id": np.tile(
+                        np.arange(1, n_countries + 1), len(scenarios) * len(types)
+                    ),
+                    "footprint": T.ravel(),
+                }
+            )
+        )
+        logging.info(
+            f"Footprints of {len(scenarios)} scenarios in {economic_period} done"
+        )
+    return pd.concat(footprints, ignore_index=True)
+
+
+if __name__ == "__main__":
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    split_years = [2006, 2008, 2010, 2012, 2014]
+    category_weights = {
+        "unweighted": None,
+        "iucn": scraper.THREAT_LEVEL_MAPPING,
+        "threatened_only": {
+            code: int(weight >= 2)
+            for code, weight in scraper.THREAT_LEVEL_MAPPING.items()
+        },
+    }
+    scenarios = build_scenario_grid(split_years, list(category_weights))
+
+    logging.info("Read the assessments, threat mapping and species weights")
+    assessments = scraper.read_assessment_dataset()
+    threat_classification, threat_sector = sector_mapping.load_concordance()
+    n_threats = int(threat_classification["threat_code"].max())
+    threat_sector_matrix = sector_mapping.build_threat_sector_matrix(
+        threat_sector, n_threats
+    )
+    climate_related = (
+        threat_classification.groupby("threat_code")["climate_related"]
+        .max()
+        .to_numpy()
+    )
+    species_weights = pd.read_parquet(
+        path_data_weights / "species_country_weights.parquet"
+    )
+
+    logging.info("Prepare the economic tables")
+    leontief_cache = mrio_calculation.LeontiefCache()
+    leontief, final_demand, allocation_base = {}, {}, {}
+    for economic_period in ECONOMIC_PERIODS:
+        leontief[economic_period] = leontief_cache.get_operator(
+            satellite_account.load_eora_table("Z", economic_period),
+            satellite_account.load_eora_table("X", economic_period),
+        )
+        final_demand[economic_period] = sda_analysis.aggregate_final_demand(
+            satellite_account.load_eora_table("FD", economic_period),
+            satellite_account.N_COUNTRIES,
+        )
+        allocation_base[economic_period] = (
+            satellite_account.get_threat_allocation_base(
+                threat_sector_matrix,
+                output=satellite_account.load_eora_table("X", economic_period),
+                emission=satellite_account.load_eora_table("E", economic_period),
+                climate_related=climate_related,
+            )
+        )
+
+    logging.info(f"Evaluate {len(scenarios)} scenarios")
+    footprints = evaluate_scenarios(
+        scenarios,
+        leontief,
+        final_demand,
+        context={
+            "assessments": assessments,
+            "threat_classification": threat_classification,
+            "species_weights": {
+                rule: get_allocation_weights(species_weights, rule)
+                for rule in ALLOCATION_RULES
+            },
+            "allocation_base": allocation_base,
+            "category_weights": category_weights,
+        },
+        types=sorted(assessments["type"].dropna().unique()),
+    )
+
+    logging.info("Done, save data")
+    path_data_scenarios.mkdir(parents=True, exist_ok=True)
+    scenarios.to_csv(path_data_scenarios / "scenarios.csv", index=False)
+    footprints.to_parquet(
+        path_data_scenarios / "scenario_footprints.parquet", index=False
+    )
@@ -0,0 +1,517 @@
+"""
+Created: Sunday 18 October 2026
+Description: Scripts to build and query the footprint cube of all periods
+Scope: biodiversity threat project of Ling Zhang
+
+The cube holds the footprint of every period x species class x producer
+country x producer sector x consumer country, e.g. the consumer countries
+driving the threats to Amphibia in the agriculture of Brazil:
+    cube.top_k(
+        "consumer_country",
+        period="post_2010",
+        type="AMPHIBIA",
+        producer_country="BRA",
+        producer_sector="Agriculture",
+    )
+"""
+
+import importlib
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+sector_mapping = importlib.import_module("1_1_sector_mapping")
+mrio_calculation = importlib.import_module("1_3_MRIO_calculation")
+
+# Read the variable
+data_home = Path("./data")
+current_version = "v.6.2025"
+current_project = "bio_threat"
+
+path_data_raw = data_home / "raw_data" / current_project / current_version
+path_data_footprint = path_data_raw / "footprint"
+path_data_cube = path_data_raw / "footprint_cube"
+# table_pop, country and pop_{period} columns
+path_data_population = data_home / "raw_data" / "population.csv"
+# country and region columns, optional
+path_data_regions = data_home / "raw_data" / "country_region.csv"
+
+DIMENSIONS = (
+    "period",
+    "type",
+    "producer_country",
+    "producer_sector",
+    "consumer_country",
+)
+
+# The region dimensions and the country dimension they group
+REGION_DIMENSIONS = {
+    "producer_region": "producer_country",
+    "consumer_region": "consumer_country",
+}
+
+# The precomputed rollups, by the dimensions of their axes
+ROLLUPS = {
+    "region_region": ("period", "type", "producer_region", "consumer_region"),
+    "region_producer": ("period", "type", "producer_region", "producer_sector"),
+    "sector_consumer": ("period", "type", "producer_sector", "consumer_country"),
+    "producer": ("period", "type", "producer_country", "producer_sector"),
+    "country_country": ("period", "type", "producer_country", "consumer_country"),
+}
+
+
+def load_sector_names(path: Path = None):
+    """Load the names of the Eora sectors, ordered by sector code."""
+    path = path if path else sector_mapping.path_concordance
+    sectors = pd.read_csv(path / "eora_sectors.csv").sort_values("sector_code")
+    return sectors["sector_name"].tolist()
+
+
+def get_group_matrix(groups: np.ndarray, n_groups: int):
+    """Get the rows x groups indicator matrix of the group code of every row."""
+    return sparse.csr_matrix(
+        (np.ones(len(groups)), (np.arange(len(groups)), groups)),
+        shape=(len(groups), n_groups),
+    )
+
+
+class FootprintCube:
+    """The footprints of all periods and species classes, with indexed queries.
+
+    The cells are one sparse matrix with a row per (period, species class,
+    producer country, producer sector), in this order, and a column per
+    consumer country, so the cells of a period, class or producer are row
+    slices. Sums such as producer country x consumer country, or by region,
+    are precomputed as small dense rollups. A query is answered from the
+    smallest rollup having all the dimensions it filters or groups by, and
+    from the cells otherwise.
+
+    Parameters
+    ----------
+    periods: list
+    types: list
+        The species classes
+    countries: list
+        The Eora countries, producers and consumers
+    sectors: list
+        The Eora sectors
+    cells: sparse.csr_matrix
+        (period, type, producer country, producer sector) x consumer country
+    country_region: list
+        The region of every country, None for no region rollups
+    rollups: dict
+        The rollups of a former build, computed from the cells if not given
+    """
+
+    def __init__(
+        self,
+        periods: list,
+        types: list,
+        countries: list,
+        sectors: list,
+        cells: sparse.csr_matrix,
+        country_region: list = None,
+        rollups: dict = None,
+    ):
+        self.labels = {
+            "period": list(periods),
+            "type": list(types),
+            "producer_country": list(countries),
+            "producer_sector": list(sectors),
+            "consumer_country": list(countries),
+        }
+        self.shape = tuple(len(self.labels[dimension]) for dimension in DIMENSIONS)
+        self.cells = sparse.csr_matrix(cells)
+        self._cells_csc = None
+
+        self.country_region = None
+        if country_region is not None:
+            region_codes, regions = pd.factorize(
+                pd.Series(list(country_region)), sort=True
+            )
+            if (region_codes < 0).any():
+                raise ValueError("Every country needs a region")
+            self.country_region = region_codes
+            self.labels["producer_region"] = list(regions)
+            self.labels["consumer_region"] = list(regions)
+        self._label_codes = {
+            dimension: {label: code for code, label in enumerate(labels)}
+            for dimension, labels in self.labels.items()
+        }
+
+        self.rollups = rollups if rollups else self._build_rollups()
+
+    @classmethod
+    def from_footprints(
+        cls,
+        footprints: dict,
+        countries: list,
+        sectors: list,
+        country_region: list = None,
+    ):
+        """Build the cube from the FactoredFootprint of every period.
+
+        Parameters
+        ----------
+        footprints: dict
+            period: FactoredFootprint
+        countries: list
+        sectors: list
+        country_region: list
+            The region of every country
+
+        Returns
+        -------
+        cube: FootprintCube
+        """
+        types = sorted(
+            set().union(*(footprint.types for footprint in footprints.values()))
+        )
+        n_producers = len(countries) * len(sectors)
+        blocks = []
+        for footprint in footprints.values():
+            for species_type in types:
+                if species_type in footprint.types:
+                    block = sparse.csr_matrix(footprint.sector_country(species_type))
+                    block.eliminate_zeros()
+                else:
+                    block = sparse.csr_matrix((n_producers, len(countries)))
+                blocks.append(block)
+        return cls(
+            list(footprints),
+            types,
+            countries,
+            sectors,
+            sparse.vstack(blocks, format="csr"),
+            country_region=country_region,
+        )
+
+    def _build_rollups(self):
+        n_periods, n_types, n_countries, n_sectors, _ = self.shape
+        n_blocks = n_periods * n_types
+        block, country, sector = np.unravel_index(
+            np.arange(self.cells.shape[0]), (n_blocks, n_countries, n_sectors)
+        )
+        rollups = {
+            "country_country": (
+                get_group_matrix(
+                    block * n_countries + country, n_blocks * n_countries
+                ).T
+                @ self.cells
+            )
+            .toarray()
+            .reshape(n_periods, n_types, n_countries, n_countries),
+            "producer": np.asarray(self.cells.sum(axis=1)).reshape(
+                n_periods, n_types, n_countries, n_sectors
+            ),
+            "sector_consumer": (
+                get_group_matrix(block * n_sectors + sector, n_blocks * n_sectors).T
+                @ self.cells
+            )
+            .toarray()
+            .reshape(n_periods, n_types, n_sectors, n_countries),
+        }
+        if self.country_region is not None:
+            regions = get_group_matrix(
+                self.country_region, len(self.labels["producer_region"])
+            ).toarray()
+            rollups["region_region"] = np.einsum(
+                "ptrc,rg,ch->ptgh", rollups["country_country"], regions, regions
+            )
+            rollups["region_producer"] = np.einsum(
+                "ptri,rg->ptgi", rollups["producer"], regions
+            )
+        return rollups
+
+    def _get_codes(self, dimension: str, labels):
+        """Get the codes of one label or a list of labels of a dimension."""
+        if dimension not in self._label_codes:
+            raise ValueError(f"Unknown dimension {dimension}")
+        if isinstance(labels, (str, int, np.integer)):
+            labels = [labels]
+        try:
+            return np.array(
+                [self._label_codes[dimension][label] for label in labels], dtype=int
+            )
+        except KeyError as error:
+            raise ValueError(f"Unknown {dimension} {error.args[0]!r}") from None
+
+    def _get_selection(self, dimension: str, filters: dict):
+        """Get the selected codes of a base dimension, None if not filtered."""
+        codes = None
+        if dimension in filters:
+            codes = filters[dimension]
+        for region_dimension, country_dimension in REGION_DIMENSIONS.items():
+            if country_dimension == dimension and region_dimension in filters:
+                region_countries = np.flatnonzero(
+                    np.isin(self.country_region, filters[region_dimension])
+                )
+                codes = (
+                    region_countries
+                    if codes is None
+                    else np.intersect1d(codes, region_countries)
+                )
+        return codes
+
+    def _get_group_codes(self, dimension: str, codes: dict):
+        """Get the codes of a group dimension from the codes of the base ones."""
+        if codes.get(dimension) is not None:
+            return codes[dimension]
+        if dimension in REGION_DIMENSIONS:
+            return self.country_region[codes[REGION_DIMENSIONS[dimension]]]
+        return codes[dimension]
+
+    def _aggregate(self, codes: dict, values: np.ndarray, group_by: list):
+        """Sum the values of the cells by the group dimensions."""
+        if not group_by:
+            return float(values.sum())
+        keys = np.ravel_multi_index(
+            [self._get_group_codes(dimension, codes) for dimension in group_by],
+            [len(self.labels[dimension]) for dimension in group_by],
+        )
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        sums = np.bincount(inverse.ravel(), weights=values)
+        group_codes = np.unravel_index(
+            unique_keys, [len(self.labels[dimension]) for dimension in group_by]
+        )
+        index = pd.MultiIndex.from_arrays(
+            [
+                np.asarray(self.labels[dimension], dtype=object)[group_code]
+                for dimension, group_code in zip(group_by, group_codes)
+            ],
+            names=group_by,
+        )
+        if len(group_by) == 1:
+            index = index.get_level_values(0)
+        result = pd.Series(sums, index=index, name="footprint")
+        return result[result != 0]
+
+    def _query_rollup(self, name: str, filters: dict, group_by: list):
+        axes = ROLLUPS[name]
+        selections = []
+        for axis in axes:
+            if axis in REGION_DIMENSIONS:
+                codes = filters.get(axis)
+            else:
+                codes = self._get_selection(axis, filters)
+            selections.append(
+                np.arange(len(self.labels[axis])) if codes is None else codes
+            )
+        values = self.rollups[name][np.ix_(*selections)]
+
+        # Sum out the axes not grouped by before expanding the cells
+        grouped = [
+            position
+            for position, axis in enumerate(axes)
+            if axis in group_by
+            or any(REGION_DIMENSIONS.get(dimension) == axis for dimension in group_by)
+        ]
+        values = values.sum(
+            axis=tuple(set(range(len(axes))) - set(grouped)), keepdims=True
+        )
+        positions = np.indices(values.shape).reshape(len(axes), -1)
+        codes = {
+            axis: selections[position][positions[position]]
+            if position in grouped
+            else None
+            for position, axis in enumerate(axes)
+        }
+        return self._aggregate(codes, values.ravel(), group_by)
+
+    def _query_cells(self, filters: dict, group_by: list):
+        row_dimensions = DIMENSIONS[:4]
+        row_selections = [
+            self._get_selection(dimension, filters) for dimension in row_dimensions
+        ]
+        consumers = self._get_selection("consumer_country", filters)
+
+        if all(selection is None for selection in row_selections):
+            rows = np.arange(self.cells.shape[0])
+            if consumers is None:
+                cells = self.cells
+            else:
+                # a column selection of all rows, faster from the CSC copy
+                if self._cells_csc is None:
+                    self._cells_csc = self.cells.tocsc()
+                cells = self._cells_csc[:, consumers].tocsr()
+        else:
+            rows = np.ravel_multi_index(
+                np.ix_(
+                    *(
+                        np.arange(size) if selection is None else selection
+                        for size, selection in zip(self.shape[:4], row_selections)
+                    )
+                ),
+                self.shape[:4],
+            ).ravel()
+            cells = self.cells[rows]
+            if consumers is not None:
+                cells = cells[:, consumers]
+
+        cells = cells.tocoo()
+        codes = dict(
+            zip(row_dimensions, np.unravel_index(rows[cells.row], self.shape[:4]))
+        )
+        codes["consumer_country"] = (
+            cells.col if consumers is None else consumers[cells.col]
+        )
+        return self._aggregate(codes, cells.data, group_by)
+
+    def query(self, group_by: list = None, **filters):
+        """Get the footprint of the cells selected by the filters, by groups.
+
+        Parameters
+        ----------
+        group_by: list
+            The dimensions of the result, e.g. ["consumer_country"], none to
+            get the total
+        **filters:
+            dimension=label or list of labels, for the dimensions period,
+            type, producer_country, producer_sector, consumer_country, and
+            producer_region and consumer_region if the cube has regions
+
+        Returns
+        -------
+        footprint: pd.Series or float
+            The nonzero sums indexed by the group_by labels, or the total
+        """
+        group_by = [group_by] if isinstance(group_by, str) else list(group_by or [])
+        filters = {
+            dimension: self._get_codes(dimension, labels)
+            for dimension, labels in filters.items()
+        }
+        for dimension in group_by:
+            if dimension not in self.labels:
+                raise ValueError(f"Unknown dimension {dimension}")
+
+        dimensions = set(filters) | set(group_by)
+        for name, axes in ROLLUPS.items():
+            if name not in self.rollups:
+                continue
+            covered = set(axes) | {
+                region
+                for region, country in REGION_DIMENSIONS.items()
+                if country in axes
+            }
+            if dimensions <= covered:
+                return self._query_rollup(name, filters, group_by)
+        return self._query_cells(filters, group_by)
+
+    def top_k(self, group_by, k: int = 10, **filters):
+        """Get the k largest contributors, e.g. top_k("consumer_country", 5).
+
+        Parameters
+        ----------
+        group_by: str or list
+            The dimensions of the contributors
+        k: int
+        **filters:
+            As in `query`
+
+        Returns
+        -------
+        footprint: pd.Series
+            The k largest sums, in descending order
+        """
+        return self.query(group_by=group_by, **filters).nlargest(k)
+
+    def save(self, path: Path):
+        """Save the cells, labels and rollups to a .npz file."""
+        np.savez(
+            path,
+            **{
+                f"labels_{dimension}": np.array(self.labels[dimension], dtype=str)
+                for dimension in DIMENSIONS[:4]
+            },
+            country_region=(
+                np.array(
+                    np.asarray(self.labels["producer_region"])[self.country_region],
+                    dtype=str,
+                )
+                if self.country_region is not None
+                else np.array([], dtype=str)
+            ),
+            cells_data=self.cells.data,
+            cells_indices=self.cells.indices,
+            cells_indptr=self.cells.indptr,
+            cells_shape=np.array(self.cells.shape),
+            **{f"rollup_{name}": rollup for name, rollup in self.rollups.items()},
+        )
+
+    @classmethod
+    def load(cls, path: Path):
+        with np.load(path) as data:
+            cells = sparse.csr_matrix(
+                (data["cells_data"], data["cells_indices"], data["cells_indptr"]),
+                shape=tuple(data["cells_shape"]),
+            )
+            country_region = data["country_region"].tolist()
+            return cls(
+                data["labels_period"].tolist(),
+                data["labels_type"].tolist(),
+                data["labels_producer_country"].tolist(),
+                data["labels_producer_sector"].tolist(),
+                cells,
+                country_region=country_region if country_region else None,
+                rollups={
+                    key[len("rollup_") :]: data[key]
+                    for key in data.files
+                    if key.startswith("rollup_")
+                },
+            )
+
+
+if __name__ == "__main__":
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    countries = pd.read_csv(path_data_population).iloc[:, 0].astype(str).tolist()
+    sectors = load_sector_names()
+    country_region = None
+    if path_data_regions.exists():
+        country_region = (
+            pd.read_csv(path_data_regions, dtype=str)
+            .set_index("country")["region"]
+            .reindex(countries)
+        )
+        if country_region.isna().any():
+            raise ValueError(
+                f"No region for {country_region[country_region.isna()].index.tolist()}"
+            )
+        country_region = country_region.tolist()
+
+    periods = sorted(
+        file.stem[len("footprint_") :]
+        for file in path_data_footprint.glob("footprint_*.npz")
+        if not file.stem.startswith("footprint_country_")
+    )
+    logging.info(f"Read the footprints of {periods}")
+    footprints = {
+        period: mrio_calculation.FactoredFootprint.load(
+            path_data_footprint / f"footprint_{period}.npz"
+        )
+        for period in periods
+    }
+
+    logging.info("Build the footprint cube")
+    cube = FootprintCube.from_footprints(
+        footprints, countries, sectors, country_region=country_region
+    )
+    logging.info(
+        f"{cube.cells.nnz} nonzero cells of {np.prod(cube.shape)}, "
+        f"rollups {list(cube.rollups)}"
+    )
+
+    logging.info("Done, save data")
+    path_data_cube.mkdir(parents=True, exist_ok=True)
+    cube.save(path_data_cube / "footprint_cube.npz")
+    for period in periods:
+        top_consumers = cube.top_k("consumer_country", 5, period=period)
+        logging.info(f"Top consumer countries of {period}: {top_consumers.to_dict()}")
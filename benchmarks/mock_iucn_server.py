@@ -0,0 +1,284 @@
+"""
+Created: Sunday 18 October 2026
+Description: A local stand-in of the IUCN red list search and species API
+Scope: biodiversity threat project of Ling Zhang
+
+The server replays synthetic responses in the shape parsed by the scraper:
+    POST /dosearch/assessments/_search
+    POST /dosearch/assessments/_msearch
+    GET  /api/v4/species/{id}
+Every species name is found, except the names starting with "Unknown", and
+the responses are derived from the name or the id, so they are the same in
+every run. A multi-search batch with a name starting with "Broken" gets an
+HTML page with status 200, like the error page of a proxy. Latency, server
+errors and 429 responses can be configured.
+
+Usage:
+    python benchmarks/mock_iucn_server.py --port 8000 --latency 0.05
+    IUCN_URL=http://127.0.0.1:8000 python 0_data_scraper_iucn_red_list.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+THREATS = [
+    ("Residential & commercial development", ["Housing & urban areas"]),
+    (
+        "Agriculture & aquaculture",
+        ["Annual & perennial non-timber crops", "Livestock farming & ranching"],
+    ),
+    ("Energy production & mining", ["Mining & quarrying"]),
+    ("Biological resource use", ["Logging & wood harvesting"]),
+    ("Climate change & severe weather", ["Droughts", "Storms & flooding"]),
+    ("Pollution", ["Agricultural & forestry effluents"]),
+]
+CATEGORIES = [
+    ("LC", "Least Concern"),
+    ("NT", "Near Threatened"),
+    ("VU", "Vulnerable"),
+    ("EN", "Endangered"),
+    ("CR", "Critically Endangered"),
+]
+CLASSES = [("Animalia", "AVES"), ("Animalia", "MAMMALIA"), ("Plantae", "MAGNOLIOPSIDA")]
+SYSTEMS = ["Terrestrial", "Freshwater (=Inland waters)", "Marine"]
+HABITATS = ["Forest - Boreal", "Shrubland - Dry", "Grassland - Temperate"]
+PREVIOUS_ASSESSMENTS = 2  # per species
+
+
+def get_species_ids(species_name: str):
+    """Get the assessment id and sis id of a synthetic species."""
+    sis_id = zlib.crc32(species_name.encode("utf-8")) % 10**8 + 1
+    return sis_id * 10, sis_id
+
+
+def get_species_hits(species_name: str, size: int = 1):
+    if species_name.startswith("Unknown"):
+        return []
+    species_id, sis_id = get_species_ids(species_name)
+    hits = [
+        {
+            "_id": str(species_id),
+            "fields": {"sisTaxonId": [sis_id], "scientificName": [species_name]},
+        }
+    ]
+    if size > 1:
+        # a second, less relevant hit, like a subspecies
+        hits.append(
+            {
+                "_id": str(species_id + 1),
+                "fields": {
+                    "sisTaxonId": [sis_id + 1],
+                    "scientificName": [f"{species_name} minor"],
+                },
+            }
+        )
+    return hits[:size]
+
+
+def get_species_response(species_id: int):
+    """Get the synthetic /api/v4/species/{id} response of an assessment."""
+    latest_id = species_id - species_id % 10
+    rng = random.Random(species_id)
+    year = 2024 - 6 * (species_id - latest_id)
+    kingdom, class_name = CLASSES[(latest_id // 10) % len(CLASSES)]
+    code, title = rng.choice(CATEGORIES)
+    threats = []
+    for level1, level2_names in rng.sample(THREATS, rng.randint(0, 3)):
+        threats.append(
+            {
+                "description": {"en": level1},
+                "children": [
+                    {"description": {"en": level2}, "children": []}
+                    for level2 in rng.sample(level2_names, 1)
+                ],
+            }
+        )
+    return {
+        "citation": {"footer": f"{year}. IUCN Red List of Threatened Species"},
+        "date": f"01-01-{year}",
+        "previousAssessments": (
+            [
+                {"id": latest_id + k, "yearPublished": str(2024 - 6 * k)}
+                for k in range(1, PREVIOUS_ASSESSMENTS + 1)
+            ]
+            if species_id == latest_id
+            else []
+        ),
+        "taxon": {"taxonomy": {"kingdomName": kingdom, "className": class_name}},
+        "redListCategory": {"code": code, "title": {"en": title}},
+        "populationTrend": {"title": {"en": rng.choice(["Decreasing", "Stable"])}},
+        "systems": [{"description": {"en": rng.choice(SYSTEMS)}}],
+        "habitats": [
+            {"description": {"en": habitat}}
+            for habitat in rng.sample(HABITATS, rng.randint(0, 2))
+        ],
+        "threats": threats,
+    }
+
+
+def get_search_name(query: dict):
+    return query["query"]["bool"]["must"][0]["multi_match"]["query"]
+
+
+class MockIUCNHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data, status: int = 200, headers: dict = None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_html(self, text: str, status: int = 200):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _simulate_server(self):
+        """Wait for the latency, then answer with an error if drawn, True if sent."""
+        server = self.server
+        if server.latency:
+            time.sleep(random.uniform(0.5, 1.5) * server.latency)
+        with server.lock:
+            server.requests += 1
+        draw = random.random()
+        if draw < server.throttle_rate:
+            self._send_json(
+                {"error": "rate limited"},
+                status=429,
+                headers={"Retry-After": str(server.retry_after)},
+            )
+            return True
+        if draw < server.throttle_rate + server.error_rate:
+            self._send_json({"error": "server error"}, status=500)
+            return True
+        return False
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self._read_body()
+        if self._simulate_server():
+            return
+        if path == "/dosearch/assessments/_search":
+            species_name = get_search_name(json.loads(body))
+            self._send_json({"hits": {"hits": get_species_hits(species_name)}})
+        elif path == "/dosearch/assessments/_msearch":
+            lines = [line for line in body.decode("utf-8").splitlines() if line]
+            queries = [json.loads(query) for query in lines[1::2]]
+            if any(get_search_name(query).startswith("Broken") for query in queries):
+                self._send_html("<html><body>Bad gateway</body></html>")
+                return
+            responses = [
+                {
+                    "hits": {
+                        "hits": get_species_hits(
+                            get_search_name(query), query.get("size", 1)
+                        )
+                    }
+                }
+                for query in queries
+            ]
+            self._send_json({"responses": responses})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if self._simulate_server():
+            return
+        if path.startswith("/api/v4/species/"):
+            try:
+                species_id = int(path.rsplit("/", 1)[-1])
+            except ValueError:
+                self._send_json({"error": "not found"}, status=404)
+                return
+            self._send_json(get_species_response(species_id))
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+
+def start_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    throttle_rate: float = 0.0,
+    retry_after: float = 0,
+):
+    """Start the mock server in a background thread.
+
+    Parameters
+    ----------
+    host: str
+    port: int
+        0 to use a free port
+    latency: float
+        The mean response time in seconds
+    error_rate: float
+        The share of requests answered with HTTP 500
+    throttle_rate: float
+        The share of requests answered with HTTP 429
+    retry_after: float
+        The Retry-After seconds of the 429 responses
+
+    Returns
+    -------
+    server: ThreadingHTTPServer
+        server.url is the base url, server.requests the number of requests
+    """
+    server = ThreadingHTTPServer((host, port), MockIUCNHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.throttle_rate = throttle_rate
+    server.retry_after = retry_after
+    server.requests = 0
+    server.lock = threading.Lock()
+    server.url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a mock IUCN red list API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0)
+    args = parser.parse_args()
+
+    server = start_server(
+        args.host,
+        args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+    )
+    print(f"Mock IUCN server on {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,396 @@
+"""
+Created: Sunday 18 October 2026
+Description: End-to-end benchmarks of the crawl and the pipeline stages
+Scope: biodiversity threat project of Ling Zhang
+
+Every benchmark runs in a fresh process on synthetic data, so its peak RSS
+is its own, and reports its wall time and throughput:
+    crawl      species/s, against the local mock IUCN server
+    combine    assessment rows/s of combine_assessments
+    satellite  species/s of build_satellite_account
+    leontief   factorization and L Y of an Eora-sized table
+    sda        the two-period structural decomposition
+
+Usage:
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --baseline results.json
+    python benchmarks/run_benchmarks.py --benchmarks leontief sda --full-resolution
+    python benchmarks/run_benchmarks.py --benchmarks crawl --error-rate 0.05 \
+        --throttle-rate 0.05 --retry-after 1
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+path_repo = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(path_repo))
+sys.path.insert(0, str(path_repo / "benchmarks"))
+
+N_SECTORS = 26
+N_COUNTRIES = 189
+FULL_RESOLUTION = 15909  # sectors of the full-resolution Eora table
+
+
+def get_peak_rss_mb():
+    """Get the peak resident set size of this process in MB."""
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak_rss / 1024**2 if sys.platform == "darwin" else peak_rss / 1024
+
+
+def get_synthetic_flows(n: int, seed: int = 0, density: float = 1.0):
+    """Get Z, X and Y of a synthetic MRIO table with a productive A."""
+    rng = np.random.default_rng(seed)
+    if density < 1:
+        # dense-ish domestic blocks and sparse trade, like the Eora tables
+        block_size = -(-n // N_COUNTRIES)
+        domestic = sparse.kron(
+            sparse.identity(N_COUNTRIES),
+            sparse.random(block_size, block_size, density=0.2, random_state=seed),
+            format="csr",
+        )[:n, :n]
+        trade = sparse.random(n, n, density=density, format="csr", random_state=seed)
+        Z = (domestic + trade + sparse.identity(n)).tocsr()  # no empty column
+    else:
+        Z = rng.random((n, n), dtype=np.float64)
+    X = np.asarray(Z.sum(axis=0)).ravel() / rng.uniform(0.3, 0.7, n)
+    Y = rng.random((n, N_COUNTRIES))
+    return Z, X, Y
+
+
+def get_synthetic_assessments(n_species: int, seed: int = 0):
+    """Get a long assessment table like `read_assessment_dataset`."""
+    rng = np.random.default_rng(seed)
+    level2_threats = [
+        "Residential & commercial development | Housing & urban areas",
+        "Agriculture & aquaculture | Livestock farming & ranching",
+        "Biological resource use | Logging & wood harvesting",
+        "Climate change & severe weather | Droughts",
+        "Pollution | Air-borne pollutants",
+    ]
+    n_assessments = rng.integers(1, 5, n_species)
+    species = np.repeat(np.arange(n_species), n_assessments)
+    rows = pd.DataFrame(
+        {
+            "scientific_name": [f"Species {i}" for i in species],
+            "species_sis_id": species + 1,
+            "type": np.array(["AVES", "MAMMALIA", "Plantae"])[species % 3],
+            "species_id": np.arange(len(species)) + 1,
+            "red_list_category": "Vulnerable",
+            "red_list_category_code": rng.choice(
+                ["LC", "NT", "VU", "EN", "CR"], len(species)
+            ),
+            "population_trend": "Decreasing",
+            "habitat1": "Terrestrial",
+        }
+    )
+    rows["year"] = 2024 - 4 * rows.groupby("species_sis_id").cumcount()
+    rows["habitat2"] = [["Forest - Boreal"]] * len(rows)
+    rows["threats"] = [
+        list(rng.choice(level2_threats, rng.integers(0, 3), replace=False))
+        for _ in range(len(rows))
+    ]
+    return rows
+
+
+def benchmark_crawl(
+    n_species: int,
+    concurrency: int,
+    latency: float,
+    error_rate: float = 0.0,
+    throttle_rate: float = 0.0,
+    retry_after: float = 0,
+    **kwargs,
+):
+    mock_iucn_server = importlib.import_module("mock_iucn_server")
+    scraper = importlib.import_module("0_data_scraper_iucn_red_list")
+    logging.getLogger().setLevel(logging.CRITICAL if error_rate else logging.WARNING)
+
+    server = mock_iucn_server.start_server(
+        latency=latency,
+        error_rate=error_rate,
+        throttle_rate=throttle_rate,
+        retry_after=retry_after,
+    )
+    scraper.IUCN_URL = server.url
+    scraper.set_rate_limit(10**6)
+    species_names = [f"Species {i}" for i in range(n_species)]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        scraper.response_cache = scraper.ResponseCache(Path(tmp_dir) / "cache")
+        start = time.perf_counter()
+        species_ids = scraper.resolve_species_ids(
+            species_names, table_path=Path(tmp_dir) / "species_id_table.csv"
+        )
+        name_list = [
+            (i, name, *species_ids[name]) for i, name in enumerate(species_names)
+        ]
+        with scraper.AssessmentDatasetWriter(Path(tmp_dir) / "assessments") as writer:
+            failed = scraper.crawl_species(
+                name_list, concurrency=concurrency, writer=writer
+            )
+        wall_time = time.perf_counter() - start
+    server.shutdown()
+    return {
+        "wall_time_s": wall_time,
+        "species_per_s": n_species / wall_time,
+        "requests": server.requests,
+        "failed": len(failed),
+    }
+
+
+def benchmark_combine(n_species: int, **kwargs):
+    scraper = importlib.import_module("0_data_scraper_iucn_red_list")
+    logging.getLogger().setLevel(logging.WARNING)
+
+    assessments = get_synthetic_assessments(n_species)
+    start = time.perf_counter()
+    scraper.combine_assessments(assessments)
+    wall_time = time.perf_counter() - start
+    return {"wall_time_s": wall_time, "rows_per_s": len(assessments) / wall_time}
+
+
+def benchmark_satellite(n_species: int, n_sectors: int = N_SECTORS, **kwargs):
+    sector_mapping = importlib.import_module("1_1_sector_mapping")
+    satellite_account = importlib.import_module("1_3_satellite_account")
+
+    rng = np.random.default_rng(0)
+    threat_classification, threat_sector = sector_mapping.load_concordance()
+    n_threats = int(threat_classification["threat_code"].max())
+    threat_sector_matrix = sector_mapping.build_threat_sector_matrix(
+        threat_sector, n_threats
+    )
+    # finer sectors inherit the threats of the sector of the concordance
+    threat_sector_matrix = threat_sector_matrix[:, np.arange(n_sectors) % N_SECTORS]
+    climate_related = (
+        threat_classification.groupby("threat_code")["climate_related"].max()
+    ).to_numpy()
+    allocation_base = satellite_account.get_threat_allocation_base(
+        threat_sector_matrix,
+        output=rng.random(n_sectors * N_COUNTRIES),
+        emission=rng.random(n_sectors * N_COUNTRIES),
+        climate_related=climate_related,
+    )
+    species_threat_matrix = sparse.random(
+        n_species, n_threats, density=0.08, format="csr", random_state=0
+    )
+    species_threat_matrix.data[:] = 1
+    eta = sparse.random(
+        n_species, N_COUNTRIES, density=0.02, format="csr", random_state=1
+    )
+
+    start = time.perf_counter()
+    satellite_account.build_satellite_account(
+        species_threat_matrix, eta, allocation_base
+    )
+    wall_time = time.perf_counter() - start
+    return {"wall_time_s": wall_time, "species_per_s": n_species / wall_time}
+
+
+def benchmark_leontief(n_sectors: int, method: str, **kwargs):
+    mrio_calculation = importlib.import_module("1_3_MRIO_calculation")
+
+    density = 1.0 if method == "lu" else 2e-5
+    Z, X, Y = get_synthetic_flows(n_sectors, density=density)
+    start = time.perf_counter()
+    leontief = mrio_calculation.LeontiefOperator.from_flows(Z, X, method=method)
+    factorization_time = time.perf_counter() - start
+    leontief.solve(Y)
+    wall_time = time.perf_counter() - start
+    return {
+        "wall_time_s": wall_time,
+        "factorization_s": factorization_time,
+        "solve_s": wall_time - factorization_time,
+    }
+
+
+def benchmark_sda(n_sectors: int, method: str = "lu", **kwargs):
+    mrio_calculation = importlib.import_module("1_3_MRIO_calculation")
+    sda_analysis = importlib.import_module("1_4_SDA_analysis")
+
+    rng = np.random.default_rng(0)
+    density = 1.0 if method == "lu" else 2e-5
+    leontief, F, S, P = [], [], [], []
+    for seed in (0, 1):
+        Z, X, Y = get_synthetic_flows(n_sectors, seed=seed, density=density)
+        leontief.append(
+            mrio_calculation.LeontiefOperator.from_flows(Z, X, method=method)
+        )
+        P.append(rng.uniform(1, 100, N_COUNTRIES))
+        S.append(Y / P[-1][None, :])
+        F.append(rng.random((10, n_sectors)))
+        del Z
+
+    start = time.perf_counter()
+    decomposition = sda_analysis.structural_decomposition(F, leontief, S, P)
+    wall_time = time.perf_counter() - start
+    return {
+        "wall_time_s": wall_time,
+        "closure_error": float(np.abs(decomposition["closure_error"]).max()),
+    }
+
+
+BENCHMARKS = {
+    "crawl": benchmark_crawl,
+    "combine": benchmark_combine,
+    "satellite": benchmark_satellite,
+    "leontief": benchmark_leontief,
+    "sda": benchmark_sda,
+}
+
+
+def run_benchmark(name: str, parameters: dict):
+    result = BENCHMARKS[name](**parameters)
+    result["peak_rss_mb"] = get_peak_rss_mb()
+    return result
+
+
+def run_isolated(name: str, parameters: dict):
+    """Run one benchmark in a fresh process."""
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        return executor.submit(run_benchmark, name, parameters).result()
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float):
+    """Get the benchmarks slower than the baseline by more than the tolerance."""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        base_time = baseline[key]["wall_time_s"]
+        if result["wall_time_s"] > base_time * (1 + tolerance):
+            regressions.append(
+                f"{key}: {result['wall_time_s']:.3f}s vs {base_time:.3f}s baseline"
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the crawl and pipeline")
+    parser.add_argument(
+        "--benchmarks", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS)
+    )
+    parser.add_argument("--crawl-species", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="mock server latency, seconds"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="share of mock HTTP 500"
+    )
+    parser.add_argument(
+        "--throttle-rate", type=float, default=0.0, help="share of mock HTTP 429"
+    )
+    parser.add_argument(
+        "--retry-after", type=float, default=0, help="Retry-After of the 429, seconds"
+    )
+    parser.add_argument("--combine-species", type=int, default=50000)
+    parser.add_argument("--satellite-species", type=int, default=50000)
+    parser.add_argument(
+        "--full-resolution",
+        action="store_true",
+        help=f"also run satellite, leontief and sda with {FULL_RESOLUTION} sectors",
+    )
+    parser.add_argument("--output", type=Path, default=None, help="results json")
+    parser.add_argument("--baseline", type=Path, default=None, help="results json")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="allowed slowdown vs baseline"
+    )
+    args = parser.parse_args()
+
+    eora_sectors = N_SECTORS * N_COUNTRIES
+    # the full resolution has 84 sectors per country in the satellite account
+    full_country_sectors = FULL_RESOLUTION // N_COUNTRIES
+    runs = {
+        "crawl": [
+            (
+                "crawl",
+                {
+                    "n_species": args.crawl_species,
+                    "concurrency": args.concurrency,
+                    "latency": args.latency,
+                    "error_rate": args.error_rate,
+                    "throttle_rate": args.throttle_rate,
+                    "retry_after": args.retry_after,
+                },
+            )
+        ],
+        "combine": [("combine", {"n_species": args.combine_species})],
+        "satellite": [("satellite", {"n_species": args.satellite_species})]
+        + (
+            [
+                (
+                    f"satellite_{full_country_sectors * N_COUNTRIES}",
+                    {
+                        "n_species": args.satellite_species,
+                        "n_sectors": full_country_sectors,
+                    },
+                )
+            ]
+            if args.full_resolution
+            else []
+        ),
+        "leontief": [
+            (f"leontief_{eora_sectors}", {"n_sectors": eora_sectors, "method": "lu"})
+        ]
+        + (
+            [
+                (
+                    f"leontief_{FULL_RESOLUTION}",
+                    {"n_sectors": FULL_RESOLUTION, "method": "splu"},
+                )
+            ]
+            if args.full_resolution
+            else []
+        ),
+        "sda": [(f"sda_{eora_sectors}", {"n_sectors": eora_sectors})]
+        + (
+            [
+                (
+                    f"sda_{FULL_RESOLUTION}",
+                    {"n_sectors": FULL_RESOLUTION, "method": "splu"},
+                )
+            ]
+            if args.full_resolution
+            else []
+        ),
+    }
+
+    results = {}
+    for name in args.benchmarks:
+        for key, parameters in runs[name]:
+            results[key] = run_isolated(name, parameters)
+            print(
+                f"{key:<20}"
+                + "  ".join(
+                    f"{field}={value:.4g}"
+                    if isinstance(value, float)
+                    else f"{field}={value}"
+                    for field, value in results[key].items()
+                ),
+                flush=True,
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression {regression}")
+        sys.exit(1 if regressions else 0)
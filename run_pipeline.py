@@ -0,0 +1,413 @@
+"""
+Created: Sunday 18 October 2026
+Description: Scripts to run the pipeline stages, skipping the up-to-date ones
+Scope: biodiversity threat project of Ling Zhang
+
+The stages crawl -> combine -> map -> weights -> satellite -> mrio -> sda ->
+cube run their scripts in order, each in its own process, so the heavy imports and
+side effects of a script only happen in its stage. Every stage declares the
+files it reads and writes. A stage is skipped when the content hash of its
+inputs (with its scripts and arguments) is the one of its last successful
+run and its outputs are still the ones it wrote, so a changed file only
+reruns the stages reading it and, if their outputs change, the ones
+downstream. Outputs deleted or changed since, e.g. a cleared Leontief cache,
+rerun the stage that wrote them.
+
+Usage:
+    python run_pipeline.py
+    python run_pipeline.py --from map --to satellite
+    python run_pipeline.py --only sda --force
+    python run_pipeline.py --dry-run
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Read the variable
+data_home = Path("./data")
+current_version = "v.6.2025"
+current_project = "bio_threat"
+
+path_repo = Path(__file__).resolve().parent
+path_data_raw = data_home / "raw_data" / current_project / current_version
+path_data_eora = data_home / "raw_data" / "eora"
+path_data_leontief = path_data_eora / "leontief_cache"
+path_concordance = path_repo / "concordance"
+path_pipeline_state = path_data_raw / "pipeline_state.json"
+
+
+class Stage:
+    """One step of the pipeline, a script run with arguments.
+
+    Parameters
+    ----------
+    name: str
+        The name of the stage
+    scripts: list
+        The script run by the stage, followed by the scripts it imports
+    inputs: list
+        The files, folders or glob patterns read by the stage
+    outputs: list
+        The files, folders or glob patterns written by the stage
+    args: list
+        The command line arguments of the script
+    """
+
+    def __init__(
+        self,
+        name: str,
+        scripts: list,
+        inputs: list,
+        outputs: list,
+        args: list = None,
+    ):
+        self.name = name
+        self.scripts = [path_repo / script for script in scripts]
+        self.inputs = inputs
+        self.outputs = outputs
+        self.args = list(args) if args else []
+
+    def command(self):
+        return [sys.executable, str(self.scripts[0]), *self.args]
+
+
+def get_stages(period_bounds: list = None):
+    """Get the stages of the pipeline in the order they run.
+
+    Parameters
+    ----------
+    period_bounds: list
+        The boundary years of the periods, passed to the combine stage
+
+    Returns
+    -------
+    stages: list
+    """
+    scraper = "0_data_scraper_iucn_red_list.py"
+    sector_mapping = "1_1_sector_mapping.py"
+    satellite_account = "1_3_satellite_account.py"
+    mrio_calculation = "1_3_MRIO_calculation.py"
+    # the threats of the species as written by the combine stage, read by the map
+    encoded_tables = [
+        path_data_raw / f"iucn_{table_name}.parquet"
+        for table_name in ["species", "threats", "species_threats"]
+    ]
+    combine_args = ["--stage", "combine"]
+    if period_bounds:
+        combine_args += ["--period-bounds", *map(str, period_bounds)]
+    return [
+        Stage(
+            "crawl",
+            [scraper],
+            inputs=[path_data_raw / "list.txt"],
+            outputs=[
+                path_data_raw / "red_list_assessments.parquet",
+                path_data_raw / "species_id_table.csv",
+            ],
+            args=["--stage", "crawl"],
+        ),
+        Stage(
+            "combine",
+            [scraper],
+            inputs=[
+                path_data_raw / "red_list_assessments.parquet",
+                path_data_raw / "red_list_assessment_details",
+            ],
+            outputs=[
+                path_data_raw / "iucn_species_assessment_details_time_series.csv",
+                *encoded_tables,
+            ],
+            args=combine_args,
+        ),
+        Stage(
+            "map",
+            [sector_mapping],
+            inputs=[
+                path_concordance / "threat_classification.csv",
+                path_concordance / "threat_sector_concordance.csv",
+                path_data_raw / "iucn_species_assessment_details_time_series.csv",
+                *encoded_tables,
+            ],
+            outputs=[path_data_raw / "sector_mapping"],
+        ),
+        Stage(
+            "weights",
+            ["1_2_weighted_threats_calculation.py"],
+            inputs=[
+                path_data_raw / "species_country_hf.csv",
+                path_data_raw / "species_country_land.csv",
+                data_home / "raw_data" / "country_ID.csv",
+                path_data_raw / "species_id_table.csv",
+            ],
+            outputs=[path_data_raw / "species_weights"],
+        ),
+        Stage(
+            "satellite",
+            [satellite_account, sector_mapping],
+            inputs=[
+                path_concordance / "threat_classification.csv",
+                path_concordance / "threat_sector_concordance.csv",
+                path_data_raw / "sector_mapping",
+                path_data_raw / "species_weights",
+                path_data_eora / "X_*",
+                path_data_eora / "E_*",
+            ],
+            outputs=[path_data_raw / "satellite"],
+        ),
+        Stage(
+            "mrio",
+            [mrio_calculation, satellite_account, sector_mapping],
+            inputs=[
+                path_data_raw / "satellite",
+                path_data_eora / "Z_*",
+                path_data_eora / "X_*",
+                path_data_eora / "Y_*",
+            ],
+            # the footprints only keep the cache keys of their LY
+            outputs=[path_data_raw / "footprint", path_data_leontief / "*" / "LY"],
+        ),
+        Stage(
+            "sda",
+            [
+                "1_4_SDA_analysis.py",
+                mrio_calculation,
+                satellite_account,
+                sector_mapping,
+            ],
+            inputs=[
+                path_data_raw / "satellite",
+                path_data_raw / "sector_mapping" / "species_index.csv",
+                data_home / "raw_data" / "population.csv",
+                path_data_eora / "Z_*",
+                path_data_eora / "X_*",
+                path_data_eora / "FD_*",
+            ],
+            outputs=[path_data_raw / "sda"],
+        ),
+        Stage(
+            "cube",
+            [
+                "1_6_footprint_cube.py",
+                mrio_calculation,
+                satellite_account,
+                sector_mapping,
+            ],
+            inputs=[
+                path_data_raw / "footprint",
+                path_data_leontief / "*" / "LY",
+                path_concordance / "eora_sectors.csv",
+                data_home / "raw_data" / "population.csv",
+                data_home / "raw_data" / "country_region.csv",
+            ],
+            outputs=[path_data_raw / "footprint_cube"],
+        ),
+    ]
+
+
+def expand_paths(patterns: list):
+    """Get the files of the paths, folders (recursively) and glob patterns."""
+    files = set()
+    for pattern in patterns:
+        pattern = Path(pattern)
+        glob_parts = [i for i, part in enumerate(pattern.parts) if "*" in part]
+        if glob_parts:
+            base = Path(*pattern.parts[: glob_parts[0]])
+            matches = base.glob(str(Path(*pattern.parts[glob_parts[0] :])))
+        else:
+            matches = [pattern]
+        for path in matches:
+            if path.is_dir():
+                files.update(file for file in path.rglob("*") if file.is_file())
+            elif path.is_file():
+                files.add(path)
+    # temporary files of interrupted writes are not part of the data
+    return sorted(
+        file
+        for file in files
+        if not file.name.startswith(".") and not file.name.endswith(".tmp")
+    )
+
+
+class FileHasher:
+    """Get the sha256 of files, rehashing only the files changed on disk.
+
+    The digests are remembered with the size and modification time of the
+    file, so unchanged multi-GB tables are not read again in every run.
+
+    Parameters
+    ----------
+    digests: dict
+        path: [size, mtime_ns, digest] of a former run
+    """
+
+    def __init__(self, digests: dict = None):
+        self.digests = digests if digests else {}
+
+    def hash_file(self, path: Path):
+        stat = path.stat()
+        key = str(path)
+        cached = self.digests.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        self.digests[key] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def hash_stage(self, stage: Stage):
+        """Get the hash of the scripts, arguments and inputs of a stage."""
+        digest = hashlib.sha256()
+        digest.update(json.dumps(stage.args).encode("utf-8"))
+        for file in stage.scripts + expand_paths(stage.inputs):
+            digest.update(str(file).encode("utf-8"))
+            digest.update(self.hash_file(file).encode("utf-8"))
+        return digest.hexdigest()
+
+    def hash_outputs(self, stage: Stage):
+        """Get the hash of the files written by a stage."""
+        digest = hashlib.sha256()
+        for file in expand_paths(stage.outputs):
+            digest.update(str(file).encode("utf-8"))
+            digest.update(self.hash_file(file).encode("utf-8"))
+        return digest.hexdigest()
+
+
+def load_state(path: Path = None):
+    """Load the input hashes of the last successful run of every stage."""
+    path = path if path else path_pipeline_state
+    if not path.exists():
+        return {"stages": {}, "outputs": {}, "files": {}}
+    with open(path, encoding="utf-8") as f:
+        return {"outputs": {}} | json.load(f)
+
+
+def save_state(state: dict, path: Path = None):
+    path = path if path else path_pipeline_state
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def outputs_exist(stage: Stage):
+    return all(expand_paths([output]) for output in stage.outputs)
+
+
+def outputs_unchanged(stage: Stage, state: dict, hasher: FileHasher):
+    """Check the outputs of a stage are still the ones of its last run."""
+    if not outputs_exist(stage):
+        return False
+    # states of former runs have no output hashes
+    outputs_hash = state["outputs"].get(stage.name)
+    return outputs_hash is None or outputs_hash == hasher.hash_outputs(stage)
+
+
+def run_pipeline(
+    stages: list, force: bool = False, dry_run: bool = False, state_path: Path = None
+):
+    """Run the stages whose inputs changed since their last successful run.
+
+    Parameters
+    ----------
+    stages: list
+        The stages to consider, in the order they run
+    force: bool
+        Run the stages even when they are up to date
+    dry_run: bool
+        Only log which stages would run, with the inputs as they are now, so
+        the stages after a changed one are only listed once it ran
+    state_path: Path
+        The json file of the input hashes of the stages
+
+    Returns
+    -------
+    ran: list
+        The names of the stages that ran, or would run with dry_run
+    """
+    state = load_state(state_path)
+    hasher = FileHasher(state["files"])
+    ran = []
+    for stage in stages:
+        inputs_hash = hasher.hash_stage(stage)
+        if (
+            not force
+            and state["stages"].get(stage.name) == inputs_hash
+            and outputs_unchanged(stage, state, hasher)
+        ):
+            logging.info(f"Stage {stage.name} is up to date, skip")
+            if stage.name not in state["outputs"] and not dry_run:
+                state["outputs"][stage.name] = hasher.hash_outputs(stage)
+                save_state(state, state_path)
+            continue
+
+        ran.append(stage.name)
+        if dry_run:
+            logging.info(f"Stage {stage.name} would run: {' '.join(stage.command())}")
+            continue
+        logging.info(f"Run stage {stage.name}")
+        start = time.monotonic()
+        subprocess.run(stage.command(), check=True)
+        logging.info(f"Stage {stage.name} done in {time.monotonic() - start:.1f}s")
+
+        state["stages"][stage.name] = inputs_hash
+        state["outputs"][stage.name] = hasher.hash_outputs(stage)
+        state["files"] = hasher.digests
+        save_state(state, state_path)
+    return ran
+
+
+if __name__ == "__main__":
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    stage_names = [stage.name for stage in get_stages()]
+    parser = argparse.ArgumentParser(description="Run the biodiversity threat pipeline")
+    parser.add_argument("--from", dest="first", choices=stage_names, default=None)
+    parser.add_argument("--to", dest="last", choices=stage_names, default=None)
+    parser.add_argument(
+        "--only", nargs="+", choices=stage_names, default=None, help="run these stages"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="run the stages even if up to date"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only list the stages that would run"
+    )
+    parser.add_argument(
+        "--period-bounds",
+        type=int,
+        nargs="+",
+        default=None,
+        help="boundary years of the periods, default splits pre/post 2010",
+    )
+    args = parser.parse_args()
+
+    stages = get_stages(args.period_bounds)
+    first = stage_names.index(args.first) if args.first else 0
+    last = stage_names.index(args.last) if args.last else len(stages) - 1
+    stages = [
+        stage
+        for index, stage in enumerate(stages)
+        if first <= index <= last and (not args.only or stage.name in args.only)
+    ]
+
+    try:
+        ran = run_pipeline(stages, force=args.force, dry_run=args.dry_run)
+    except subprocess.CalledProcessError as error:
+        logging.error(f"Stage failed with exit code {error.returncode}, stop")
+        sys.exit(error.returncode)
+    logging.info(f"Done, {len(ran)} of {len(stages)} stages ran: {ran}")
@@ -0,0 +1,58 @@
+"""
+Created: Sunday 18 October 2026
+Description: Fixtures of the tests, the scripts and a local mock IUCN server
+Scope: biodiversity threat project of Ling Zhang
+"""
+
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+path_repo = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(path_repo))
+sys.path.insert(0, str(path_repo / "benchmarks"))
+
+mock_iucn_server = importlib.import_module("mock_iucn_server")
+
+
+@pytest.fixture(scope="session")
+def scraper():
+    return importlib.import_module("0_data_scraper_iucn_red_list")
+
+
+@pytest.fixture
+def mock_server(scraper, monkeypatch):
+    """Point the scraper to a local mock server, without rate limit and backoff."""
+    servers = []
+
+    def start(**kwargs):
+        server = mock_iucn_server.start_server(**kwargs)
+        servers.append(server)
+        monkeypatch.setattr(scraper, "IUCN_URL", server.url)
+        return server
+
+    monkeypatch.setattr(scraper, "BACKOFF_BASE", 0.0)
+    monkeypatch.setattr(scraper, "MAX_RETRIES", 1)
+    requests_per_second = scraper.REQUESTS_PER_SECOND
+    scraper.set_rate_limit(1e6)
+    yield start
+    scraper.set_rate_limit(requests_per_second)
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def data_paths(scraper, monkeypatch, tmp_path):
+    """Point the data folders of the scraper to a temporary folder."""
+    monkeypatch.setattr(scraper, "path_data_raw", tmp_path)
+    monkeypatch.setattr(scraper, "path_data_output", tmp_path / "details")
+    monkeypatch.setattr(scraper, "path_data_assessments", tmp_path / "assessments")
+    monkeypatch.setattr(scraper, "path_data_changesets", tmp_path / "changesets")
+    monkeypatch.setattr(scraper, "path_data_archive", tmp_path / "raw_responses")
+    monkeypatch.setattr(
+        scraper, "response_cache", scraper.ResponseCache(tmp_path / "cache")
+    )
+    return tmp_path
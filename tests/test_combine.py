@@ -0,0 +1,221 @@
+"""
+Created: Sunday 18 October 2026
+Description: Tests of the combined assessment table against the species records
+Scope: biodiversity threat project of Ling Zhang
+"""
+
+import importlib
+import io
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+YEARS = [1996, 2004, 2008, 2012, 2016, 2020]
+CODES = ["LC", "NT", "VU", "EN", "CR", "DD"]  # "DD" is not in THREAT_LEVEL_MAPPING
+THREATS = [
+    "Agriculture & aquaculture | Livestock farming & ranching | Nomadic grazing",
+    "Agriculture & aquaculture | Livestock farming & ranching",
+    "Agriculture & aquaculture | Annual & perennial non-timber crops",
+    "Biological resource use | Logging & wood harvesting | Unintentional effects",
+    "Biological resource use | Logging & wood harvesting | Intentional use",
+    "Climate change & severe weather",
+    "Pollution | Agricultural & forestry effluents",
+]
+HABITATS = ["Forest - Boreal", "Shrubland - Dry", "Grassland - Temperate"]
+FIELDS = [
+    "species_id",
+    "red_list_category",
+    "red_list_category_code",
+    "population_trend",
+    "threats",
+    "red_list_category_weight",
+]
+
+
+def get_synthetic_assessments(n_species: int = 40, seed: int = 0):
+    """Get an assessment dataset with every case of the combination."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_species):
+        years = sorted(rng.sample(YEARS, rng.randint(1, 4)))
+        # every species has a mapped code in each of its periods
+        codes = [rng.choice(CODES[:-1]) for _ in years]
+        if i % 5 == 0:
+            years.append(years[-1] + 1)
+            codes.append("DD")
+        for k, (year, code) in enumerate(zip(years, codes)):
+            rows.append(
+                {
+                    "scientific_name": f"Species {i:03d}",
+                    "species_sis_id": str(1000 + i),
+                    "type": rng.choice(["AVES", "MAMMALIA"]),
+                    "year": year,
+                    "species_id": 10 * (1000 + i) + k,
+                    "red_list_category": f"Category {code}",
+                    "red_list_category_code": code,
+                    "population_trend": rng.choice(["Decreasing", "Stable", None]),
+                    "habitat1": rng.choice(HABITATS[:2]) if i % 3 else HABITATS[2],
+                    "habitat2": sorted(rng.sample(HABITATS, rng.randint(0, 2))),
+                    "threats": rng.sample(THREATS, rng.randint(0, 3)),
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def get_species_record(species_rows: pd.DataFrame, threat_level_mapping: dict):
+    """Get the record of one species, like the former species csv files."""
+    first = species_rows.iloc[0]
+    record = {
+        "type": species_rows.iloc[-1]["type"],
+        "scientific_name": first["scientific_name"],
+        "species_sis_id": first["species_sis_id"],
+    }
+    for row in species_rows.itertuples(index=False):
+        record[f"species_id_{row.year}"] = row.species_id
+        record[f"red_list_category_{row.year}"] = row.red_list_category
+        record[f"red_list_category_code_{row.year}"] = row.red_list_category_code
+        record[f"population_trend_{row.year}"] = row.population_trend
+        record[f"threats_{row.year}"] = str(list(row.threats))
+        record[f"habitat1_{row.year}"] = row.habitat1
+        record[f"habitat2_{row.year}"] = list(row.habitat2)
+        record[f"red_list_category_weight_{row.year}"] = threat_level_mapping.get(
+            row.red_list_category_code
+        )
+    return record
+
+
+def normalize(value):
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return list(value)
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def test_combine_assessments_matches_species_records(scraper):
+    assessments = get_synthetic_assessments()
+    mapping = scraper.THREAT_LEVEL_MAPPING
+
+    combined = scraper.combine_assessments(assessments).set_index("scientific_name")
+
+    for species_name, species_rows in assessments.groupby("scientific_name"):
+        record = get_species_record(species_rows, mapping)
+        expected = {
+            "type": record["type"],
+            "species_sis_id": record["species_sis_id"],
+            "habitat1": scraper.omit_duplicate_elements(record, "habitat1")[0],
+            "habitat2": scraper.omit_duplicate_elements(record, "habitat2")[0],
+        }
+        for keyword in ["red_list_category_weight", "threat"]:
+            pre, post = scraper.process_period_assessment_results(record, keyword)
+            expected[f"{keyword}_pre_2010"] = pre
+            expected[f"{keyword}_post_2010"] = post
+        for year in species_rows["year"]:
+            for field in FIELDS:
+                expected[f"{field}_{year}"] = record[f"{field}_{year}"]
+
+        row = combined.loc[species_name]
+        for column, value in expected.items():
+            assert normalize(row[column]) == normalize(value), (species_name, column)
+
+
+def test_combine_assessments_unmapped_code_keeps_integer_weights(scraper):
+    assessments = get_synthetic_assessments()
+    assert "DD" in set(assessments["red_list_category_code"])
+    # every species is assessed after 2010, so its weight is never missing
+    assessments = assessments[assessments["year"] >= 2012]
+
+    combined = scraper.combine_assessments(assessments)
+
+    assert combined["red_list_category_weight_post_2010"].dtype.kind == "i"
+    text = io.StringIO()
+    combined[["red_list_category_weight_post_2010"]].to_csv(text, index=False)
+    assert ".0" not in text.getvalue()
+    # the weight of a year with a "DD" assessment stays missing
+    dd_years = assessments.loc[
+        assessments["red_list_category_code"] == "DD", "year"
+    ].unique()
+    for year in dd_years:
+        assert combined[f"red_list_category_weight_{year}"].isna().any()
+
+
+@pytest.mark.parametrize("period_bounds", [[2010], [2000, 2010, 2015]])
+def test_combine_assessments_period_columns(scraper, period_bounds):
+    assessments = get_synthetic_assessments()
+
+    combined = scraper.combine_assessments(assessments, period_bounds=period_bounds)
+
+    for label in scraper.get_period_labels(period_bounds):
+        assert f"red_list_category_weight_{label}" in combined.columns
+        assert f"threat_{label}" in combined.columns
+    assert len(combined) == assessments["scientific_name"].nunique()
+
+
+@pytest.mark.parametrize(
+    "period_bounds, period_labels",
+    [
+        ([2010], ["pre_2010", "post_2010"]),
+        ([2010, 2000], ["pre_2000", "2000_2010", "post_2010"]),
+        ([2000, 2005, 2010], ["pre_2000", "2000_2005", "2005_2010", "post_2010"]),
+    ],
+)
+def test_get_period_labels_and_index(scraper, period_bounds, period_labels):
+    assert scraper.get_period_labels(period_bounds) == period_labels
+
+    # a boundary year starts the next period
+    years = [1990, 2000, 2004, 2005, 2009, 2010, 2024]
+    labels = [
+        period_labels[i] for i in scraper.get_period_index(years, period_bounds)
+    ]
+    expected = {
+        1: ["pre_2010"] * 5 + ["post_2010"] * 2,
+        2: ["pre_2000"] + ["2000_2010"] * 4 + ["post_2010"] * 2,
+        3: ["pre_2000", "2000_2005", "2000_2005"]
+        + ["2005_2010"] * 2
+        + ["post_2010"] * 2,
+    }[len(period_bounds)]
+    assert labels == expected
+
+
+def test_process_period_assessment_results_three_periods(scraper):
+    record = {
+        "threats_1996": "['Pollution | Garbage & solid waste | Litter']",
+        "threats_2004": "['Climate change & severe weather | Droughts']",
+        "threats_2008": "['Pollution | Garbage & solid waste']",
+        "threats_2020": "[]",
+        "red_list_category_weight_1996": 1,
+        "red_list_category_weight_2004": 3,
+        "red_list_category_weight_2008": 2,
+        "red_list_category_weight_2020": 4,
+    }
+
+    threats = scraper.process_period_assessment_results(
+        record, "threat", period_bounds=[2000, 2010]
+    )
+    weights = scraper.process_period_assessment_results(
+        record, "red_list_category_weight", period_bounds=[2000, 2010]
+    )
+
+    assert threats == (
+        ["Pollution | Garbage & solid waste"],
+        [
+            "Climate change & severe weather | Droughts",
+            "Pollution | Garbage & solid waste",
+        ],
+        None,
+    )
+    assert weights == (1, 3, 4)
+
+
+def test_get_periods_of_the_mapping_stage(scraper):
+    sector_mapping = importlib.import_module("1_1_sector_mapping")
+    period_labels = scraper.get_period_labels([2000, 2005, 2010])
+    columns = ["scientific_name", "threat_2000"] + [
+        f"threat_{label}" for label in period_labels
+    ]
+
+    assert sector_mapping.get_periods(columns, "threat_") == period_labels
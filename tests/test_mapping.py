@@ -0,0 +1,130 @@
+"""
+Created: Sunday 18 October 2026
+Description: Tests of the mapping of the species threats to threat codes
+Scope: biodiversity threat project of Ling Zhang
+"""
+
+import importlib
+
+import numpy as np
+import pandas as pd
+import pytest
+from test_combine import get_synthetic_assessments
+
+sector_mapping = importlib.import_module("1_1_sector_mapping")
+
+
+@pytest.mark.parametrize("period_bounds", [[2010], [2000, 2010, 2015]])
+def test_encoded_threats_match_combined_threat_columns(
+    scraper, tmp_path, period_bounds
+):
+    assessments = get_synthetic_assessments()
+    encoded = scraper.encode_assessments(assessments)
+    for table_name, table in encoded.items():
+        table.to_parquet(tmp_path / f"iucn_{table_name}.parquet", index=False)
+    combined = scraper.combine_assessments(
+        assessments, encoded=encoded, period_bounds=period_bounds
+    )
+
+    species_threats = sector_mapping.load_species_threats(tmp_path)
+
+    # the rows are reversed, so the species are matched by name, not by id
+    scientific_names = combined["scientific_name"][::-1]
+    for period in scraper.get_period_labels(period_bounds):
+        threat_column = sector_mapping.get_period_threat_column(
+            species_threats, scientific_names, period
+        )
+        expected = combined.set_index("scientific_name").loc[
+            scientific_names, f"threat_{period}"
+        ]
+        for species_name, threats in threat_column.items():
+            expected_threats = expected[species_name]
+            if expected_threats is None:
+                assert threats is None or pd.isna(threats), (species_name, period)
+            else:
+                assert threats == expected_threats, (species_name, period)
+
+
+def test_parse_threat_column_reports_species_and_column():
+    threat_column = pd.Series(
+        ["['Pollution | Garbage & solid waste']", "['Pollution | Garb"],
+        index=pd.Index(["Panthera leo", "Lynx lynx"], name="scientific_name"),
+        name="threat_pre_2010",
+    )
+
+    with pytest.raises(ValueError, match="Lynx lynx in threat_pre_2010"):
+        sector_mapping.parse_threat_column(threat_column)
+
+    threats = sector_mapping.parse_threat_column(threat_column[:1])
+    assert threats.tolist() == ["Pollution | Garbage & solid waste"]
+    assert threats.index.tolist() == [0]
+
+
+def test_build_species_threat_matrix_matches_level2_and_level1_names():
+    threat_classification = pd.DataFrame(
+        {
+            "threat_name": [
+                "Annual & perennial non-timber crops",
+                "Logging & wood harvesting",
+                "Climate change & severe weather",
+            ],
+            "threat_code": [1, 2, 3],
+        }
+    )
+    threat_column = pd.Series(
+        [
+            "['Agriculture & aquaculture | Annual & perennial non-timber crops', "
+            "'Climate change & severe weather']",
+            None,
+            [
+                "Biological resource use | Logging & wood harvesting",
+                "Pollution | Garbage & solid waste",
+                "Climate change & severe weather",
+            ],
+        ],
+        name="threat_pre_2010",
+    )
+
+    species_threat_matrix, unmatched_threats = (
+        sector_mapping.build_species_threat_matrix(
+            threat_column, threat_classification
+        )
+    )
+
+    assert species_threat_matrix.toarray().tolist() == [
+        [1, 0, 1],
+        [0, 0, 0],
+        [0, 1, 1],
+    ]
+    assert unmatched_threats.to_dict() == {"Pollution | Garbage & solid waste": 1}
+    assert sector_mapping.get_threat_code_strings(species_threat_matrix) == [
+        "1,3",
+        "",
+        "2,3",
+    ]
+
+
+def test_build_threat_sector_matrix_counts_pairs_once():
+    threat_sector = pd.DataFrame(
+        {"threat_code": [1, 1, 1, 3], "sector_code": [4, 4, 26, 1]}
+    )
+
+    threat_sector_matrix = sector_mapping.build_threat_sector_matrix(
+        threat_sector, n_threats=4
+    )
+
+    assert threat_sector_matrix.shape == (4, sector_mapping.N_SECTORS)
+    expected = np.zeros((4, sector_mapping.N_SECTORS))
+    expected[0, [3, 25]] = 1
+    expected[2, 0] = 1
+    np.testing.assert_array_equal(threat_sector_matrix.toarray(), expected)
+
+
+def test_load_concordance_codes_fit_the_sectors():
+    threat_classification, threat_sector = sector_mapping.load_concordance()
+
+    assert threat_classification["threat_name"].is_unique
+    assert set(threat_sector["threat_code"]) <= set(
+        threat_classification["threat_code"]
+    )
+    assert threat_sector["sector_code"].between(1, sector_mapping.N_SECTORS).all()
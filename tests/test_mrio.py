@@ -0,0 +1,120 @@
+"""
+Created: Sunday 18 October 2026
+Description: Tests of the MRIO calculation on a small synthetic table
+Scope: biodiversity threat project of Ling Zhang
+"""
+
+import importlib
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+mrio_calculation = importlib.import_module("1_3_MRIO_calculation")
+
+
+def test_factored_footprint_saves_the_cache_key_of_LY(tmp_path):
+    rng = np.random.default_rng(0)
+    n_countries, n_sectors = 3, 4
+    n = n_countries * n_sectors
+    Z = rng.random((n, n))
+    X = Z.sum(axis=0) * 2
+    Y = rng.random((n, n_countries))
+    cache = mrio_calculation.LeontiefCache(tmp_path / "leontief_cache")
+    operator = cache.get_operator(Z, X)
+    LY = cache.get_leontief_output(operator, Y)
+    footprint = mrio_calculation.FactoredFootprint.from_satellite_account(
+        sparse.random(5, n, density=0.5, format="csr", random_state=0),
+        ["AVES", "MAMMALIA", "AVES", "AVES", "MAMMALIA"],
+        LY,
+        n_countries,
+        LY_key=cache.get_output_key(operator, Y),
+    )
+    np.testing.assert_allclose(LY, operator.solve(Y))
+
+    footprint.save(tmp_path / "footprint.npz")
+    with np.load(tmp_path / "footprint.npz") as data:
+        assert "LY" not in data
+    loaded = mrio_calculation.FactoredFootprint.load(
+        tmp_path / "footprint.npz", cache=cache
+    )
+    assert isinstance(loaded.LY, np.memmap)
+    for species_type in footprint.types:
+        np.testing.assert_allclose(
+            loaded.country_country(species_type),
+            footprint.country_country(species_type),
+        )
+
+    # without its cache, the footprint cannot be loaded
+    with pytest.raises(FileNotFoundError):
+        mrio_calculation.FactoredFootprint.load(
+            tmp_path / "footprint.npz",
+            cache=mrio_calculation.LeontiefCache(tmp_path / "empty"),
+        )
+
+
+def get_flows(n: int = 12, n_countries: int = 3, seed: int = 0):
+    """Get Z, X and Y of a productive table, with one sector without output."""
+    rng = np.random.default_rng(seed)
+    Z = rng.random((n, n))
+    Z[:, -1] = 0
+    # every column of A sums to 0.5, so the power series converges
+    X = Z.sum(axis=0) * 2
+    Y = rng.random((n, n_countries))
+    return Z, X, Y
+
+
+@pytest.mark.parametrize("method", ["lu", "splu", "series"])
+@pytest.mark.parametrize("sparse_A", [False, True])
+def test_leontief_operator_matches_inverse(method, sparse_A):
+    Z, X, Y = get_flows()
+    A = mrio_calculation.get_technical_coefficients(Z, X)
+    assert np.isfinite(A).all()
+    L = np.linalg.inv(np.eye(len(A)) - A)
+    F = np.random.default_rng(1).random((5, len(A)))
+
+    operator = mrio_calculation.LeontiefOperator(
+        sparse.csr_matrix(A) if sparse_A else A, method=method, tol=1e-14
+    )
+
+    np.testing.assert_allclose(operator.solve(Y), L @ Y, rtol=1e-9)
+    np.testing.assert_allclose(operator.solve(Y[:, 0]), L @ Y[:, 0], rtol=1e-9)
+    np.testing.assert_allclose(operator.solve_T(F), F @ L, rtol=1e-9)
+    np.testing.assert_allclose(operator.block(slice(2, 5), [0, 7]), L[2:5, [0, 7]])
+
+
+def test_leontief_operator_unknown_method():
+    with pytest.raises(ValueError, match="Unknown Leontief method"):
+        mrio_calculation.LeontiefOperator(np.zeros((2, 2)), method="inv")
+
+
+@pytest.mark.parametrize("method", ["lu", "splu"])
+def test_leontief_cache_reuses_factorization_and_output(tmp_path, method):
+    Z, X, Y = get_flows()
+    A = mrio_calculation.get_technical_coefficients(Z, X)
+    L = np.linalg.inv(np.eye(len(A)) - A)
+    cache = mrio_calculation.LeontiefCache(tmp_path / "leontief_cache")
+    operator = cache.get_operator(Z, X, method=method)
+    LY = cache.get_leontief_output(operator, Y)
+    entry = tmp_path / "leontief_cache" / operator.cache_key
+    cached_files = {path.name for path in entry.iterdir()}
+
+    # a new run loads the operator and LY instead of computing them again
+    cache = mrio_calculation.LeontiefCache(tmp_path / "leontief_cache")
+    cached_operator = cache.get_operator(Z.copy(), X.copy(), method=method)
+    cached_LY = cache.get_leontief_output(cached_operator, Y.copy())
+
+    assert cached_operator.cache_key == operator.cache_key
+    assert cached_files == {"A.npy", "LY", "meta.json"} | (
+        {"lu.npy", "piv.npy"} if method == "lu" else set()
+    )
+    assert isinstance(cached_LY, np.memmap)
+    np.testing.assert_allclose(cached_LY, L @ Y)
+    np.testing.assert_allclose(cached_operator.solve(Y), LY)
+
+    # another final demand gets its own LY under the same entry
+    other_LY = cache.get_leontief_output(cached_operator, 2 * Y)
+    np.testing.assert_allclose(other_LY, 2 * L @ Y)
+    assert len(list((entry / "LY").glob("*.npy"))) == 2
+    # other flows get another entry
+    assert cache.get_operator(2 * Z, X).cache_key != operator.cache_key
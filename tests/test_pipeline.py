@@ -0,0 +1,72 @@
+"""
+Created: Sunday 18 October 2026
+Description: Tests of the pipeline stage skipping on small scripts
+Scope: biodiversity threat project of Ling Zhang
+"""
+
+import importlib
+
+run_pipeline = importlib.import_module("run_pipeline")
+
+
+def get_copy_stages(tmp_path):
+    """Two stages copying a file, the second reading the output of the first."""
+    script = tmp_path / "copy.py"
+    script.write_text(
+        "import shutil, sys\nshutil.copy(sys.argv[1], sys.argv[2])\n", encoding="utf-8"
+    )
+    source, middle, target = (tmp_path / name for name in ["a.txt", "b.txt", "c.txt"])
+    source.write_text("a", encoding="utf-8")
+    return [
+        run_pipeline.Stage(
+            "first", [script], [source], [middle], args=[str(source), str(middle)]
+        ),
+        run_pipeline.Stage(
+            "second", [script], [middle], [target], args=[str(middle), str(target)]
+        ),
+    ]
+
+
+def test_run_pipeline_skips_up_to_date_stages(tmp_path):
+    stages = get_copy_stages(tmp_path)
+    state_path = tmp_path / "pipeline_state.json"
+
+    assert run_pipeline.run_pipeline(stages, state_path=state_path) == [
+        "first",
+        "second",
+    ]
+    assert run_pipeline.run_pipeline(stages, state_path=state_path) == []
+
+    # a changed input reruns its stage and the stages reading its outputs
+    (tmp_path / "a.txt").write_text("changed", encoding="utf-8")
+    assert run_pipeline.run_pipeline(stages, state_path=state_path) == [
+        "first",
+        "second",
+    ]
+
+
+def test_run_pipeline_reruns_stage_of_changed_outputs(tmp_path):
+    stages = get_copy_stages(tmp_path)
+    state_path = tmp_path / "pipeline_state.json"
+    run_pipeline.run_pipeline(stages, state_path=state_path)
+
+    # the output of the first stage is changed behind the pipeline, like a
+    # cleared cache, so the first stage writes it again; the second stage
+    # reads the same content as before and is skipped
+    (tmp_path / "b.txt").write_text("edited", encoding="utf-8")
+    assert run_pipeline.run_pipeline(stages, state_path=state_path) == ["first"]
+    assert (tmp_path / "b.txt").read_text(encoding="utf-8") == "a"
+
+    (tmp_path / "b.txt").unlink()
+    assert run_pipeline.run_pipeline(stages, state_path=state_path) == ["first"]
+
+
+def test_expand_paths_globs_folders(tmp_path):
+    for key in ["k1", "k2"]:
+        (tmp_path / key / "LY").mkdir(parents=True)
+        (tmp_path / key / "LY" / "y.npy").write_bytes(b"0")
+        (tmp_path / key / "lu.npy").write_bytes(b"0")
+
+    files = run_pipeline.expand_paths([tmp_path / "*" / "LY"])
+
+    assert files == [tmp_path / "k1" / "LY" / "y.npy", tmp_path / "k2" / "LY" / "y.npy"]
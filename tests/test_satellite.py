@@ -0,0 +1,99 @@
+"""
+Created: Sunday 18 October 2026
+Description: Tests of the Bio satellite account against the example of demo_mapping.md
+Scope: biodiversity threat project of Ling Zhang
+"""
+
+import importlib
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+satellite_account = importlib.import_module("1_3_satellite_account")
+
+# Species A of demo_mapping.md, in the countries X, Y, Z with the sectors S1-S4
+THREAT_SECTOR = [[1, 1, 1, 0], [0, 1, 1, 0], [0, 0, 0, 1], [1, 1, 1, 1]]
+CLIMATE_RELATED = [False, False, False, True]  # Ta, Tb, Tc, Td
+OUTPUT = [20, 30, 40, 50, 200, 300, 500, 100, 70, 30, 60, 80]
+EMISSION = [50, 40, 30, 20, 100, 500, 300, 200, 80, 60, 30, 70]
+HABITAT = [100, 500, 400]
+HUMAN_FOOTPRINT = [5, 15, 30]
+
+# Tables (c) of demo_mapping.md, the allocated threats B^q and normalized B
+# fmt: off
+ALLOCATED_THREATS = [
+    [0.001, 0.002, 0.002, 0, 0.158, 0.238, 0.396, 0, 0.089, 0.038, 0.076, 0],
+    [0, 0.002, 0.003, 0, 0, 0.316, 0.527, 0, 0, 0.051, 0.101, 0],
+    [0, 0, 0, 0.014, 0, 0, 0, 0.432, 0, 0, 0, 0.553],
+    [0.002, 0.002, 0.001, 0.001, 0.067, 0.335, 0.201, 0.134, 0.086, 0.064, 0.032, 0.075]
+]
+NORMALIZED_THREATS = (
+    [0.001, 0.001, 0.002, 0.004, 0.056, 0.222, 0.281, 0.142, 0.044, 0.038, 0.052, 0.157]
+)
+# fmt: on
+
+
+def get_demo_inputs(species_names: list):
+    """Get the allocation base and eta of the species, all ranging like species A."""
+    allocation_base = satellite_account.get_threat_allocation_base(
+        sparse.csr_matrix(THREAT_SECTOR),
+        np.array(OUTPUT),
+        np.array(EMISSION),
+        np.array(CLIMATE_RELATED),
+    )
+    alpha = np.array(HABITAT) / sum(HABITAT)
+    beta = np.array(HUMAN_FOOTPRINT) / sum(HUMAN_FOOTPRINT)
+    species_weights = pd.DataFrame(
+        {
+            "scientific_name": np.repeat(species_names, 3),
+            "country_io_id": np.tile([1, 2, 3], len(species_names)),
+            "period": "post_2010",
+            "eta": np.tile(alpha * beta / (alpha * beta).sum(), len(species_names)),
+        }
+    )
+    eta = satellite_account.get_country_weight_matrix(
+        species_weights, pd.Series(species_names), "post_2010", n_countries=3
+    )
+    return allocation_base, eta
+
+
+@pytest.mark.parametrize("chunk_size, max_block_entries", [(20000, 1 << 22), (2, 8)])
+def test_build_satellite_account_matches_demo(chunk_size, max_block_entries):
+    # species A with all 4 threats, then one species per threat
+    species_names = ["A", "Ta", "Tb", "Tc", "Td"]
+    species_threat_matrix = sparse.csr_matrix(np.vstack([np.ones(4), np.eye(4)]))
+    allocation_base, eta = get_demo_inputs(species_names)
+
+    bio = satellite_account.build_satellite_account(
+        species_threat_matrix,
+        eta,
+        allocation_base,
+        chunk_size=chunk_size,
+        max_block_entries=max_block_entries,
+    ).toarray()
+
+    np.testing.assert_array_equal(bio[0].round(3), NORMALIZED_THREATS)
+    np.testing.assert_array_equal(bio[1:].round(3), ALLOCATED_THREATS)
+    np.testing.assert_allclose(bio.sum(axis=1), 1)
+
+
+def test_build_satellite_account_weights_and_empty_rows():
+    species_names = ["A", "B", "C"]
+    # B has no threat, C has no range
+    species_threat_matrix = sparse.csr_matrix(
+        [[1, 1, 1, 1], [0, 0, 0, 0], [1, 0, 0, 0]]
+    )
+    allocation_base, eta = get_demo_inputs(species_names[:2])
+    eta = sparse.vstack([eta, sparse.csr_matrix((1, 3))], format="csr")
+
+    bio = satellite_account.build_satellite_account(
+        species_threat_matrix,
+        eta,
+        allocation_base,
+        species_weight=np.array([5.0, 1.0, 1.0]),
+    ).toarray()
+
+    np.testing.assert_array_equal((bio[0] / 5).round(3), NORMALIZED_THREATS)
+    np.testing.assert_allclose(bio.sum(axis=1), [5, 0, 0])
@@ -0,0 +1,142 @@
+"""
+Created: Sunday 18 October 2026
+Description: Tests of the batched evaluation of the sensitivity scenarios
+Scope: biodiversity threat project of Ling Zhang
+"""
+
+import importlib
+
+import numpy as np
+import pandas as pd
+import pytest
+from test_combine import get_synthetic_assessments
+
+scenario_analysis = importlib.import_module("1_5_scenario_analysis")
+sector_mapping = importlib.import_module("1_1_sector_mapping")
+satellite_account = importlib.import_module("1_3_satellite_account")
+mrio_calculation = importlib.import_module("1_3_MRIO_calculation")
+
+N_COUNTRIES = 2
+
+
+def get_species_weights(species_names: list, rng):
+    species_weights = pd.DataFrame(
+        [
+            (species_name, country_io_id, period)
+            for species_name in species_names
+            for country_io_id in range(1, N_COUNTRIES + 1)
+            for period in scenario_analysis.ECONOMIC_PERIODS
+        ],
+        columns=["scientific_name", "country_io_id", "period"],
+    )
+    species_weights["alpha"] = rng.random(len(species_weights))
+    species_weights["beta"] = rng.random(len(species_weights))
+    return species_weights
+
+
+def get_scenario_inputs(seed: int = 0):
+    """Get the tables of the scenarios on 2 countries with the Eora sectors."""
+    rng = np.random.default_rng(seed)
+    assessments = get_synthetic_assessments()
+    threat_classification, threat_sector = sector_mapping.load_concordance()
+    threat_sector_matrix = sector_mapping.build_threat_sector_matrix(
+        threat_sector, int(threat_classification["threat_code"].max())
+    )
+    climate_related = (
+        threat_classification.groupby("threat_code")["climate_related"]
+        .max()
+        .to_numpy()
+    )
+    species_weights = get_species_weights(
+        sorted(assessments["scientific_name"].unique()), rng
+    )
+    n = N_COUNTRIES * sector_mapping.N_SECTORS
+    A, final_demand, allocation_base = {}, {}, {}
+    for economic_period in scenario_analysis.ECONOMIC_PERIODS:
+        A[economic_period] = rng.random((n, n))
+        A[economic_period] *= 0.5 / A[economic_period].sum(axis=0)
+        final_demand[economic_period] = rng.random((n, N_COUNTRIES))
+        allocation_base[economic_period] = (
+            satellite_account.get_threat_allocation_base(
+                threat_sector_matrix,
+                output=rng.random(n),
+                emission=rng.random(n),
+                climate_related=climate_related,
+            )
+        )
+    context = {
+        "assessments": assessments,
+        "threat_classification": threat_classification,
+        "species_weights": {
+            rule: scenario_analysis.get_allocation_weights(species_weights, rule)
+            for rule in scenario_analysis.ALLOCATION_RULES
+        },
+        "allocation_base": allocation_base,
+        "category_weights": {
+            "unweighted": None,
+            "threatened_only": {"LC": 0, "NT": 0, "VU": 1, "EN": 1, "CR": 1},
+        },
+    }
+    return A, final_demand, context
+
+
+def test_evaluate_scenarios_matches_one_scenario_at_a_time(monkeypatch):
+    A, final_demand, context = get_scenario_inputs()
+    types = sorted(context["assessments"]["type"].unique())
+    scenarios = scenario_analysis.build_scenario_grid(
+        [2006, 2010], list(context["category_weights"])
+    )
+    assert len(scenarios) == 2 * 2 * len(scenario_analysis.ALLOCATION_RULES)
+    leontief = {
+        economic_period: mrio_calculation.LeontiefOperator(A_)
+        for economic_period, A_ in A.items()
+    }
+
+    footprints = scenario_analysis.evaluate_scenarios(
+        scenarios, leontief, final_demand, context, types, processes=1
+    )
+
+    # the intensity of every scenario alone, built in this process
+    monkeypatch.setattr(scenario_analysis, "_scenario_context", {})
+    scenario_analysis._init_scenario_worker(
+        dict(context, types=types, allocation_rules=scenario_analysis.ALLOCATION_RULES)
+    )
+    footprints = footprints.set_index(
+        ["scenario", "period", "type", "country_io_id"]
+    ).sort_index()
+    for scenario in scenarios.itertuples(index=False):
+        intensity = scenario_analysis.build_scenario_intensity(
+            scenario.split_year, scenario.category_weights
+        )
+        for economic_period in scenario_analysis.ECONOMIC_PERIODS:
+            L = np.linalg.inv(np.eye(len(A[economic_period])) - A[economic_period])
+            expected = (
+                intensity[scenario.allocation_rule, economic_period]
+                @ L
+                @ final_demand[economic_period]
+            )
+            T = (
+                footprints.loc[(scenario.scenario, economic_period), "footprint"]
+                .to_numpy()
+                .reshape(len(types), N_COUNTRIES)
+            )
+            np.testing.assert_allclose(T, expected, rtol=1e-10)
+    assert footprints["footprint"].gt(0).any()
+
+
+def test_get_allocation_weights_rules():
+    species_weights = get_species_weights(["A", "B"], np.random.default_rng(0))
+
+    for rule, values in [
+        ("hf_la", species_weights["alpha"] * species_weights["beta"]),
+        ("la", species_weights["alpha"]),
+        ("hf", species_weights["beta"]),
+    ]:
+        eta = scenario_analysis.get_allocation_weights(species_weights, rule)["eta"]
+        totals = values.groupby(
+            [species_weights["scientific_name"], species_weights["period"]]
+        ).transform("sum")
+        np.testing.assert_allclose(eta, values / totals)
+
+    with pytest.raises(ValueError, match="Unknown allocation rule"):
+        scenario_analysis.get_allocation_weights(species_weights, "gdp")
@@ -0,0 +1,394 @@
+"""
+Created: Sunday 18 October 2026
+Description: Tests of the IUCN red list scraper against the mock server
+Scope: biodiversity threat project of Ling Zhang
+"""
+
+import email.utils
+import json
+import os
+import time
+
+import mock_iucn_server
+import pandas as pd
+
+
+def get_expected_ids(species_name: str):
+    species_id, sis_id = mock_iucn_server.get_species_ids(species_name)
+    return str(species_id), str(sis_id)
+
+
+def as_strings(species_id_table: dict):
+    """The ids as loaded from the csv table."""
+    return {
+        species_name: tuple(None if value is None else str(value) for value in ids)
+        for species_name, ids in species_id_table.items()
+    }
+
+
+def test_resolve_species_ids_hits_misses_and_failed_batch(
+    scraper, mock_server, tmp_path
+):
+    server = mock_server()
+    table_path = tmp_path / "species_id_table.csv"
+    species_names = [
+        "Panthera leo",
+        "Unknown species",
+        "Broken species",
+        "Panthera tigris",
+        "Lynx lynx",
+    ]
+
+    species_id_table = scraper.resolve_species_ids(
+        species_names, table_path=table_path, batch_size=2
+    )
+
+    # the second batch got a non-JSON page, its names are left to resolve
+    assert as_strings(species_id_table) == {
+        "Panthera leo": get_expected_ids("Panthera leo"),
+        "Unknown species": (None, None),
+        "Lynx lynx": get_expected_ids("Lynx lynx"),
+    }
+    loaded_table = scraper.load_species_id_table(table_path)
+    assert loaded_table == as_strings(species_id_table)
+    table = pd.read_csv(table_path, dtype=str, keep_default_na=False)
+    assert len(table) == 3
+
+    # a rerun only searches the names of the failed batch
+    n_requests = server.requests
+    species_id_table = scraper.resolve_species_ids(
+        ["Panthera tigris", "Panthera leo"], table_path=table_path
+    )
+    assert server.requests == n_requests + 1
+    assert as_strings(species_id_table)["Panthera tigris"] == get_expected_ids(
+        "Panthera tigris"
+    )
+    assert len(pd.read_csv(table_path)) == 4
+
+
+def test_resolve_species_ids_server_error(scraper, mock_server, tmp_path):
+    mock_server(error_rate=1.0)
+    table_path = tmp_path / "species_id_table.csv"
+
+    species_id_table = scraper.resolve_species_ids(
+        ["Panthera leo", "Unknown species"], table_path=table_path
+    )
+
+    assert species_id_table == {}
+    assert not table_path.exists()
+
+
+def crawl(scraper, species_names: list, table_path, archive=None):
+    """Crawl the species like the crawl stage, with a fresh manifest."""
+    manifest = scraper.CrawlManifest(table_path.parent / "crawl_manifest.sqlite")
+    manifest.add_species(list(enumerate(species_names)))
+    manifest.set_resolved(scraper.load_species_id_table(table_path))
+    with scraper.AssessmentDatasetWriter(
+        scraper.path_data_assessments, manifest=manifest
+    ) as writer:
+        for species_item in manifest.unfinished():
+            scraper.process_species(species_item, manifest, writer, archive)
+    scraper.store_manifest_species_ids(manifest, table_path)
+    return manifest
+
+
+def test_refresh_species_removed_and_resolved_one_by_one(
+    scraper, mock_server, data_paths, monkeypatch
+):
+    mock_server()
+    table_path = data_paths / "species_id_table.csv"
+    scraper.resolve_species_ids(["Panthera leo", "Lynx lynx"], table_path=table_path)
+    # "Panthera tigris" is not in the table, like after a failed batch
+    species_names = ["Panthera leo", "Lynx lynx", "Panthera tigris"]
+    manifest = crawl(scraper, species_names, table_path)
+    assert manifest.summary() == {"written": 3}
+    assert "Panthera tigris" in scraper.load_species_id_table(table_path)
+
+    # "Lynx lynx" leaves the red list in the new release
+    get_species_hits = mock_iucn_server.get_species_hits
+
+    def get_new_species_hits(species_name: str, size: int = 1):
+        if species_name == "Lynx lynx":
+            return []
+        return get_species_hits(species_name, size)
+
+    monkeypatch.setattr(mock_iucn_server, "get_species_hits", get_new_species_hits)
+    changeset = scraper.refresh_species(species_names, red_list_version="v.test")
+
+    assert changeset[["scientific_name", "change"]].values.tolist() == [
+        ["Lynx lynx", "removed"]
+    ]
+    assessments = scraper.read_assessment_dataset()
+    assert set(assessments["scientific_name"]) == {"Panthera leo", "Panthera tigris"}
+    assert assessments["year"].dtype == "int32"
+
+
+def test_extract_archive_keeps_removed_species_out(
+    scraper, mock_server, data_paths, monkeypatch
+):
+    mock_server()
+    table_path = data_paths / "species_id_table.csv"
+    species_names = ["Panthera leo", "Lynx lynx"]
+    archive = scraper.RawResponseArchive(scraper.path_data_archive)
+    crawl(scraper, species_names, table_path, archive)
+    archive.close()
+
+    get_species_hits = mock_iucn_server.get_species_hits
+    monkeypatch.setattr(
+        mock_iucn_server,
+        "get_species_hits",
+        lambda species_name, size=1: (
+            [] if species_name == "Lynx lynx" else get_species_hits(species_name, size)
+        ),
+    )
+    archive = scraper.RawResponseArchive(scraper.path_data_archive)
+    scraper.refresh_species(species_names, red_list_version="v.test", archive=archive)
+    archive.close()
+
+    n_species = scraper.extract_archive(processes=1)
+
+    assert n_species == 1
+    assessments = scraper.read_assessment_dataset()
+    assert set(assessments["scientific_name"]) == {"Panthera leo"}
+
+
+def test_crawl_species_records_failures(scraper, mock_server, data_paths):
+    mock_server(error_rate=1.0)
+    species_names = ["Panthera leo", "Unknown species"]
+
+    # without a manifest, the failed species are returned
+    failed_species = scraper.crawl_species(list(enumerate(species_names)))
+    assert failed_species == species_names
+
+    # with a manifest, they are marked failed to be retried, not as not found
+    manifest = scraper.CrawlManifest(data_paths / "crawl_manifest.sqlite")
+    manifest.add_species(list(enumerate(species_names)))
+    with scraper.AssessmentDatasetWriter(
+        scraper.path_data_assessments, manifest=manifest
+    ) as writer:
+        failed_species = scraper.crawl_species(
+            manifest.unfinished(), manifest=manifest, writer=writer
+        )
+    assert failed_species == []
+    assert manifest.summary() == {"failed": 2}
+
+
+def test_metrics_of_a_stage_keep_the_other_stages(scraper, data_paths):
+    crawl_metrics = scraper.Metrics()
+    crawl_metrics.count("species_done", 3)
+    crawl_metrics.report(scraper.get_metrics_path("crawl"))
+
+    scraper.Metrics().report(scraper.get_metrics_path("combine"))
+
+    summary = json.loads(scraper.get_metrics_path("crawl").read_text(encoding="utf-8"))
+    assert summary["counters"] == {"species_done": 3}
+    assert scraper.get_metrics_path("combine").exists()
+
+
+def test_get_species_info_reads_the_cache(scraper, mock_server, data_paths):
+    server = mock_server()
+    species_id, _ = mock_iucn_server.get_species_ids("Panthera leo")
+
+    species_info = scraper.get_species_info(species_id)
+    n_requests = server.requests
+
+    assert species_info == mock_iucn_server.get_species_response(species_id)
+    assert scraper.get_species_info(species_id) == species_info
+    assert server.requests == n_requests
+
+
+def test_response_cache_evicts_least_recently_used(scraper, tmp_path):
+    cache = scraper.ResponseCache(tmp_path / "cache")
+    for k in range(4):
+        cache.put(f"species/{k}", {"id": k})
+        os.utime(cache._file(f"species/{k}"), (k, k))
+    entry_bytes = cache._file("species/0").stat().st_size
+    # "species/0" is the oldest write, but the most recently read
+    assert cache.get("species/0") == {"id": 0}
+
+    cache.max_bytes = int(3.5 * entry_bytes)
+    cache.put("species/4", {"id": 4})
+
+    # the cache shrinks under low_water * max_bytes, i.e. to 3 entries
+    assert [cache.get(f"species/{k}") is not None for k in range(5)] == [
+        True,
+        False,
+        False,
+        True,
+        True,
+    ]
+    cache_bytes = sum(f.stat().st_size for f in cache.path.glob("*/*.json.gz"))
+    assert cache_bytes == 3 * entry_bytes == cache._size
+
+
+def test_response_cache_evicts_expired_entries(scraper, tmp_path):
+    cache = scraper.ResponseCache(tmp_path / "cache", max_age=60)
+    cache.put("species/1", {"id": 1})
+    cache.put("species/2", {"id": 2})
+    expired = time.time() - 120
+    os.utime(cache._file("species/1"), (expired, expired))
+
+    cache.evict()
+
+    assert cache.get("species/1") is None
+    assert cache.get("species/2") == {"id": 2}
+
+
+def test_crawl_manifest_resumes_and_backs_off_failed_species(scraper, tmp_path):
+    db_path = tmp_path / "crawl_manifest.sqlite"
+    manifest = scraper.CrawlManifest(db_path, backoff_base=0)
+    manifest.add_species([(0, "Panthera leo"), (1, "Unknown species"), (2, "Lynx")])
+    manifest.set_resolved(
+        {"Panthera leo": ("10", "1"), "Unknown species": (None, None)}
+    )
+    assert manifest.unfinished() == [(0, "Panthera leo", "10", "1"), (2, "Lynx")]
+
+    manifest.mark("Panthera leo", "written", n_assessments=3)
+    manifest.fail("Lynx", "timeout")
+    assert manifest.unfinished() == [(2, "Lynx")]
+    assert manifest.unfinished(max_attempts=1) == []
+
+    # a new run keeps the states, and only adds the new species
+    manifest = scraper.CrawlManifest(db_path, backoff_base=60)
+    manifest.add_species([(0, "Panthera leo"), (2, "Lynx"), (3, "Panthera tigris")])
+    assert manifest.summary() == {
+        "written": 1,
+        "not_found": 1,
+        "failed": 1,
+        "pending": 1,
+    }
+    start = time.time()
+    manifest.fail("Lynx", "timeout")
+    # the second failure waits twice the backoff base
+    assert manifest.unfinished() == [(3, "Panthera tigris")]
+    assert start + 120 <= manifest.next_retry_at() <= time.time() + 120
+    assert manifest.species_ids() == {
+        "Panthera leo": ("10", "1"),
+        "Unknown species": (None, None),
+    }
+
+
+def test_parse_retry_after(scraper):
+    retry_date = email.utils.formatdate(time.time() + 30, usegmt=True)
+
+    assert scraper.parse_retry_after("3") == 3.0
+    assert scraper.parse_retry_after("-1") == 0.0
+    assert scraper.parse_retry_after(None) is None
+    assert scraper.parse_retry_after("soon") is None
+    assert 25 < scraper.parse_retry_after(retry_date) <= 30
+
+
+def test_fetch_retries_server_errors(scraper, mock_server, monkeypatch):
+    server = mock_server(error_rate=1.0)
+    monkeypatch.setattr(scraper, "MAX_RETRIES", 2)
+
+    response = scraper.fetch("GET", f"{server.url}/api/v4/species/10")
+
+    assert response.status_code == 500
+    assert server.requests == 3
+
+
+def test_fetch_throttled_without_retry_budget(scraper, mock_server, monkeypatch):
+    server = mock_server(throttle_rate=1.0, retry_after=0)
+    monkeypatch.setattr(scraper, "MAX_RETRIES", 0)
+    monkeypatch.setattr(scraper, "MAX_THROTTLED", 3)
+
+    response = scraper.fetch("GET", f"{server.url}/api/v4/species/10")
+
+    # a 429 is retried until MAX_THROTTLED, even without retries left, and
+    # every retried 429 halves the rate of the host
+    assert response.status_code == 429
+    assert server.requests == 4
+    bucket = scraper.get_host_bucket(server.url)
+    assert bucket.rate == bucket.target_rate / 8
+
+
+def test_token_bucket_pauses_for_retry_after(scraper):
+    bucket = scraper.TokenBucket(1000)
+
+    bucket.throttle(0.2)
+    start = time.monotonic()
+    bucket.acquire()
+
+    assert time.monotonic() - start >= 0.2
+    assert bucket.rate == 500
+    bucket.recover()
+    assert bucket.rate == 510
+
+
+def get_assessment_row(species_name: str, year: int, code: str):
+    return {
+        "scientific_name": species_name,
+        "species_sis_id": "1",
+        "year": year,
+        "red_list_category_code": code,
+        "threats": [],
+    }
+
+
+def test_assessment_dataset_keeps_last_write_and_drops_tombstones(scraper, tmp_path):
+    path = tmp_path / "assessments"
+    with scraper.AssessmentDatasetWriter(path) as writer:
+        writer.write(
+            "Panthera leo",
+            [
+                get_assessment_row("Panthera leo", 2010, "LC"),
+                get_assessment_row("Panthera leo", 2020, "NT"),
+            ],
+        )
+        writer.write("Lynx lynx", [get_assessment_row("Lynx lynx", 2015, "VU")])
+        writer.flush()
+        # a second write replaces all the rows, a repeated year keeps the last
+        writer.write(
+            "Panthera leo",
+            [
+                get_assessment_row("Panthera leo", 2020, "EN"),
+                get_assessment_row("Panthera leo", 2020, "CR"),
+            ],
+        )
+        writer.write("Lynx lynx", [scraper.get_tombstone_row("Lynx lynx")])
+        writer.flush()
+        writer.write(
+            "Panthera tigris", [get_assessment_row("Panthera tigris", 2012, "LC")]
+        )
+    assert len(list(path.glob("*.parquet"))) == 3
+
+    assessments = scraper.read_assessment_dataset(
+        path, columns=["scientific_name", "year", "red_list_category_code"]
+    )
+
+    assert assessments.values.tolist() == [
+        ["Panthera leo", 2020, "CR"],
+        ["Panthera tigris", 2012, "LC"],
+    ]
+    assert assessments["year"].dtype == "int32"
+
+
+def test_extract_archive_rebuilds_the_crawled_dataset(
+    scraper, mock_server, data_paths
+):
+    mock_server()
+    table_path = data_paths / "species_id_table.csv"
+    species_names = ["Panthera leo", "Lynx lynx", "Panthera tigris"]
+    archive = scraper.RawResponseArchive(scraper.path_data_archive, records_per_frame=2)
+    crawl(scraper, species_names, table_path, archive)
+    archive.close()
+    crawled = scraper.read_assessment_dataset().drop(columns="written_at")
+
+    dataset_path = data_paths / "extracted"
+    n_species = scraper.extract_archive(dataset_path=dataset_path, processes=1)
+
+    assert n_species == 3
+    extracted = scraper.read_assessment_dataset(dataset_path)
+    pd.testing.assert_frame_equal(
+        extracted.drop(columns="written_at")
+        .sort_values(["scientific_name", "year"])
+        .reset_index(drop=True),
+        crawled.sort_values(["scientific_name", "year"]).reset_index(drop=True),
+    )
+
+    # a shard cut by a crash keeps the species of its complete frames
+    (shard_file,) = scraper.path_data_archive.glob("*.jsonl.zst")
+    shard_file.write_bytes(shard_file.read_bytes()[:-5])
+    dataset_path = data_paths / "extracted_truncated"
+    assert scraper.extract_archive(dataset_path=dataset_path, processes=1) == 2
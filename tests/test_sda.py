@@ -0,0 +1,101 @@
+"""
+Created: Sunday 18 October 2026
+Description: Tests of the structural decomposition on small synthetic tables
+Scope: biodiversity threat project of Ling Zhang
+"""
+
+import importlib
+import itertools
+
+import numpy as np
+
+mrio_calculation = importlib.import_module("1_3_MRIO_calculation")
+sda_analysis = importlib.import_module("1_4_SDA_analysis")
+
+N_COUNTRIES, N_SECTORS = 3, 2
+
+
+def get_period(rng):
+    """Get F, A, S and P of one period of a productive table."""
+    n = N_COUNTRIES * N_SECTORS
+    A = rng.random((n, n))
+    A *= 0.5 / A.sum(axis=0)
+    F = rng.random((2, n))  # two species classes
+    S = rng.random((n, N_COUNTRIES))
+    P = rng.random(N_COUNTRIES) + 1
+    return F, A, S, P
+
+
+def get_footprint(F, A, S, P):
+    return F @ np.linalg.inv(np.eye(len(A)) - A) @ (S * P[None, :])
+
+
+def get_periods(n_periods: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    periods = [get_period(rng) for _ in range(n_periods)]
+    F, A, S, P = (list(driver) for driver in zip(*periods))
+    leontief = [mrio_calculation.LeontiefOperator(A_) for A_ in A]
+    return F, A, S, P, leontief
+
+
+def test_structural_decomposition_terms_sum_to_total_change():
+    F, A, S, P, leontief = get_periods(2)
+
+    decomposition = sda_analysis.structural_decomposition(F, leontief, S, P)
+
+    T0 = get_footprint(F[0], A[0], S[0], P[0])
+    T1 = get_footprint(F[1], A[1], S[1], P[1])
+    np.testing.assert_allclose(decomposition["T0"], T0)
+    np.testing.assert_allclose(decomposition["T1"], T1)
+    effects = sum(decomposition[f"E_{driver}"] for driver in sda_analysis.DRIVERS)
+    np.testing.assert_allclose(effects, T1 - T0)
+    np.testing.assert_allclose(decomposition["E_total"], T1 - T0)
+    assert np.abs(decomposition["closure_error"]).max() < 1e-12 * np.abs(T1).max()
+
+
+def test_structural_decomposition_averages_all_orderings():
+    F, A, S, P, _ = get_periods(2)
+    drivers = {"F": F, "L": A, "S": S, "P": P}
+    expected = {driver: 0 for driver in sda_analysis.DRIVERS}
+    orderings = list(itertools.permutations(sda_analysis.DRIVERS))
+    for ordering in orderings:
+        periods = dict.fromkeys(sda_analysis.DRIVERS, 0)
+        for driver in ordering:
+            before = get_footprint(*(drivers[d][periods[d]] for d in drivers))
+            periods[driver] = 1
+            after = get_footprint(*(drivers[d][periods[d]] for d in drivers))
+            expected[driver] = expected[driver] + (after - before) / len(orderings)
+
+    decomposition = sda_analysis.structural_decomposition(
+        F, [mrio_calculation.LeontiefOperator(A_) for A_ in A], S, P
+    )
+
+    for driver in sda_analysis.DRIVERS:
+        np.testing.assert_allclose(decomposition[f"E_{driver}"], expected[driver])
+
+
+def test_structural_decomposition_single_driver_change():
+    F, A, S, P, leontief = get_periods(2)
+    # only the population changes
+    F, leontief, S = [F[0]] * 2, [leontief[0]] * 2, [S[0]] * 2
+
+    decomposition = sda_analysis.structural_decomposition(F, leontief, S, P)
+
+    change = decomposition["T1"] - decomposition["T0"]
+    np.testing.assert_allclose(decomposition["E_P"], change)
+    for driver in ["F", "L", "S"]:
+        np.testing.assert_allclose(decomposition[f"E_{driver}"], 0, atol=1e-14)
+
+
+def test_chained_decomposition_matches_pairwise_decompositions():
+    F, _, S, P, leontief = get_periods(3)
+
+    decompositions = sda_analysis.chained_decomposition(F, leontief, S, P)
+
+    assert len(decompositions) == 2
+    for t, decomposition in enumerate(decompositions):
+        expected = sda_analysis.structural_decomposition(
+            F[t : t + 2], leontief[t : t + 2], S[t : t + 2], P[t : t + 2]
+        )
+        for name, value in expected.items():
+            np.testing.assert_allclose(decomposition[name], value, atol=1e-14)
@@ -0,0 +1,61 @@
+"""
+Created: Sunday 18 October 2026
+Description: Tests of the country weights of species by grouped normalization
+Scope: biodiversity threat project of Ling Zhang
+"""
+
+import importlib
+
+import numpy as np
+import pandas as pd
+
+weighted_threats = importlib.import_module("1_2_weighted_threats_calculation")
+
+
+def test_get_group_shares_with_zero_total_group():
+    values = np.array([1.0, 3.0, 0.0, 0.0, 2.0])
+    groups = np.array([0, 0, 1, 1, 2])
+
+    shares = weighted_threats.get_group_shares(values, groups)
+
+    np.testing.assert_array_equal(shares, [0.25, 0.75, 0, 0, 1])
+
+
+def test_compute_species_country_weights_matches_demo():
+    # species A of demo_mapping.md in X, Y and Z, where Y has two shapes,
+    # and species B without human footprint
+    country_ids = pd.DataFrame(
+        {"shp_country": ["X", "Y1", "Y2", "Z", "B1"], "IO_id": [1, 2, 2, 3, 4]}
+    )
+    land_area = pd.DataFrame(
+        {
+            "sci_name": ["A", "A", "A", "A", "A", "B"],
+            "country": ["X", "Y1", "Y2", "Z", "Atlantis", "B1"],
+            "land_pre_2010": [100, 200, 300, 400, 900, 1],
+            "land_post_2010": [100, 500, 0, 400, 900, 1],
+        }
+    )
+    human_footprint = pd.DataFrame(
+        {
+            "sci_name": ["A", "A", "A", "B"],
+            "country": ["X", "Y1", "Z", "B1"],
+            "hf_pre_2010": [5, 15, 30, 0],
+            "hf_post_2010": [5, 15, np.nan, 0],
+        }
+    )
+    species_ids = pd.DataFrame({"scientific_name": ["A"], "species_sis_id": [42]})
+
+    species_weights = weighted_threats.compute_species_country_weights(
+        human_footprint, land_area, country_ids, species_ids
+    ).set_index(["scientific_name", "period", "country_io_id"])
+
+    weights = species_weights.loc[("A", "pre_2010")]
+    np.testing.assert_allclose(weights["alpha"], [0.1, 0.5, 0.4])
+    np.testing.assert_allclose(weights["beta"], [0.1, 0.3, 0.6])
+    np.testing.assert_allclose(weights["eta"], [0.025, 0.375, 0.6])
+    # a missing human footprint counts as 0
+    weights = species_weights.loc[("A", "post_2010")]
+    np.testing.assert_allclose(weights["eta"], [0.0625, 0.9375, 0])
+    assert (species_weights.loc["B", "eta"] == 0).all()
+    assert species_weights.loc["A", "species_sis_id"].eq(42).all()
+    assert species_weights.loc["B", "species_sis_id"].isna().all()